@@ -9,8 +9,10 @@ from flask_wtf.csrf import CSRFProtect
 from flask_cors import CORS
 
 from sqlalchemy_utils import database_exists, create_database
+from alembic import command as alembic_command
 
 import atexit
+import os
 from apscheduler.schedulers.background import BackgroundScheduler
 import sys
 from twilio.rest import Client
@@ -30,7 +32,9 @@ CSRFProtect(flaskapp)
 CORS(flaskapp)
 
 db = SQLAlchemy(flaskapp)
-migrate = Migrate(flaskapp, db, render_as_batch=True)
+migrate = Migrate(flaskapp, db, render_as_batch=True,
+    directory=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "migrations"))
 
 # Twilio is disabled for pytest
 if appconfig["USE_TWILIO"]:
@@ -52,8 +56,27 @@ from app.models import *
 with flaskapp.app_context():
     if not database_exists(db.engine.url):
         create_database(db.engine.url)
-    db.metadata.create_all(db.engine)
-    db.create_all()
+    # new databases are built by running every migration, existing
+    # ones are only changed by "flask db upgrade"
+    if not db.inspect(db.engine).get_table_names():
+        migrate_config = migrate.get_config()
+        migrate_config.attributes["configure_logger"] = False
+        alembic_command.upgrade(migrate_config, "head")
+
+from app.event_server import EventServer
+eventserver = EventServer(
+    appconfig["EVENT_SERVER_HOST"],
+    appconfig["EVENT_SERVER_PORT"]
+)
+
+from app.block_cache import BlockCache
+blockcache = BlockCache()
+
+from app.feed_snapshot import FeedSnapshot
+feedsnapshot = FeedSnapshot()
+
+from app.song_catalog import SongCatalog
+songcatalog = SongCatalog()
 
 from app.radio_controller import RadioController
 radiocontroller = RadioController()
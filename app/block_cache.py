@@ -0,0 +1,97 @@
+"""
+In-memory cache of each User's block set: the IDs of the Users they
+    blocked or were blocked by, whose Wisps they can't see. Replaces
+    loading both block relationships on every feed and Heart request.
+    Entries are dropped whenever one of the User's blocks changes,
+    i.e. on blocks, bans and account deletions, and when the User
+    logs in. Other processes (e.g. the test server) drop their whole
+    cache, through a generation shared with processes forked after
+    the cache was created. Entries also expire after BLOCK_CACHE_TTL.
+"""
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+
+from app import db, appconfig
+from app.models import block_association_table
+
+class BlockCache():
+    """
+    Object holding up to BLOCK_CACHE_SIZE block sets, least recently
+        used first.
+    """
+    def __init__(self):
+        """
+        Initialization actions.
+        """
+        # user_id: (monotonic load time, frozenset of user_ids)
+        self.block_sets = OrderedDict()
+        self.lock = threading.Lock()
+        # bumped by every invalidation, in any process, so that a
+        # block set loaded while one happens isn't cached
+        self.generation = multiprocessing.Value("Q", 0)
+        # generation the cached block sets are up to date with
+        self.block_sets_generation = 0
+
+    def load(self, user_id: str) -> frozenset:
+        """
+        Helper method, query a User's block set.
+        :param user_id: ID of the User
+        :return: frozenset of IDs of Users blocked by or blocking them
+        """
+        blocks = block_association_table.c
+        return frozenset(
+            blocked_id if blocker_id == user_id else blocker_id
+            for blocker_id, blocked_id in db.session.execute(
+                db.select(blocks.blocker_id, blocks.blocked_id).filter(
+                    db.or_(
+                        blocks.blocker_id == user_id,
+                        blocks.blocked_id == user_id
+                    )
+                )
+            )
+        )
+
+    def get(self, user_id: str) -> frozenset:
+        """
+        Get a User's block set, querying it if it isn't cached.
+        :param user_id: ID of the User
+        :return: frozenset of IDs of Users blocked by or blocking them
+        """
+        with self.lock:
+            generation = self.generation.value
+            if generation != self.block_sets_generation:
+                # invalidated by another process
+                self.block_sets.clear()
+                self.block_sets_generation = generation
+            cached = self.block_sets.get(user_id)
+            if (cached and time.monotonic() - cached[0] <
+                    appconfig["BLOCK_CACHE_TTL"]):
+                self.block_sets.move_to_end(user_id)
+                return cached[1]
+        block_set = self.load(user_id)
+        with self.lock:
+            if generation == self.generation.value:
+                self.block_sets[user_id] = (time.monotonic(), block_set)
+                self.block_sets.move_to_end(user_id)
+                if len(self.block_sets) > appconfig["BLOCK_CACHE_SIZE"]:
+                    self.block_sets.popitem(last=False)
+        return block_set
+
+    def invalidate(self, *user_ids: str):
+        """
+        Drop the cached block sets of Users whose blocks changed.
+            Should be called once the change is committed.
+        :param user_ids: IDs of the Users
+        """
+        with self.lock:
+            with self.generation.get_lock():
+                self.generation.value += 1
+                generation = self.generation.value
+            for user_id in user_ids:
+                self.block_sets.pop(user_id, None)
+            # the rest is still current, unless another process
+            # invalidated too
+            if self.block_sets_generation == generation - 1:
+                self.block_sets_generation = generation
@@ -0,0 +1,141 @@
+"""
+Conditional GET support for read-only endpoints. Responses get a
+    strong ETag built from version counters which are bumped whenever
+    their content could change, so a client polling with
+    "If-None-Match" is answered with a 304 before any query runs.
+
+Feed responses use the feed snapshot's version, which is bumped by
+    posts, purges, Hearts, blocks, bans, account deletions and
+    username/profile changes, along with the block cache's generation
+    and the session's login ID, since each User's feed is filtered by
+    their block set. The versions are shared with
+    processes forked after they're created (e.g. the test server).
+    They start over on every server start, so tags also include a
+    random ID of the start.
+"""
+import functools
+import hashlib
+import multiprocessing
+import os
+import uuid
+
+from flask import request, session
+from flask.wrappers import Response
+from werkzeug.utils import secure_filename
+
+from app import flaskapp, appconfig, feedsnapshot, blockcache
+
+# bumped by every UIConfig change, in any process
+ui_version = multiprocessing.Value("Q", 0)
+# part of every tag, so that tags from before a restart never match
+# the restarted versions
+boot_id = uuid.uuid4().hex
+
+def ui_changed():
+    """
+    Bump the UIConfig version. Should be called once the change is
+        committed.
+    """
+    with ui_version.get_lock():
+        ui_version.value += 1
+
+def session_login_id() -> str:
+    """
+    Helper method, the login ID of the session's User, read without
+        loading the User.
+    :return: login ID, "" if the session is anonymous, or None if it
+        can't be told without loading the User (a "remember me" cookie
+        not yet turned into a session)
+    """
+    login_id = session.get("_user_id")
+    if login_id is None and request.cookies.get(
+            appconfig.get("REMEMBER_COOKIE_NAME", "remember_token")):
+        return None
+    return login_id or ""
+
+def feed_version() -> tuple:
+    """
+    Version of a feed response: the feed's version, the version of
+        the block sets it's filtered by, and whose feed it is.
+    :return: version tuple, or None if it can't be told
+    """
+    login_id = session_login_id()
+    if login_id is None:
+        return None
+    return (feedsnapshot.version.value, blockcache.generation.value,
+        login_id)
+
+def user_feed_version() -> tuple:
+    """
+    Version of a feed response which requires a login. Anonymous
+        requests get none, so that they reach the login check.
+    :return: version tuple, or None
+    """
+    version = feed_version()
+    return version if version and version[-1] else None
+
+def ui_config_version() -> tuple:
+    """
+    Version of the UIConfig response.
+    :return: version tuple
+    """
+    return (ui_version.value,)
+
+def profiles_version() -> tuple:
+    """
+    Version of a profile listing: the modification time of the listed
+        folder. Requires a login, like "user_feed_version".
+    :return: version tuple, or None
+    """
+    if not session_login_id():
+        return None
+    folder_path = os.path.join(appconfig["PROFILE_PATH"],
+        secure_filename(request.args.get("folder", "")))
+    try:
+        return (os.stat(folder_path).st_mtime_ns,)
+    except OSError:
+        return None
+
+def make_etag(version: tuple) -> str:
+    """
+    Helper method, ETag of a version of the requested resource.
+    :param version: version tuple
+    :return: unquoted ETag
+    """
+    return hashlib.sha1("|".join(
+        [request.endpoint, request.query_string.decode(), boot_id] +
+        [str(part) for part in version]
+    ).encode()).hexdigest()
+
+def conditional_get(get_version):
+    """
+    View decorator answering "If-None-Match" requests with a 304 when
+        the resource's version is unchanged, and tagging successful
+        responses with their version's ETag. Should be applied
+        outside of "login_required", since that loads the User.
+    :param get_version: function returning the version tuple of the
+        requested resource, without querying the database, or None
+        to run the view unconditionally
+    :return: decorator
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def conditional_view(*args, **kwargs):
+            version = get_version()
+            if version is None:
+                return view(*args, **kwargs)
+            # computed before the view runs, so a change committed
+            # while it does makes the next request miss
+            etag = make_etag(version)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = flaskapp.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return conditional_view
+    return decorator
@@ -6,43 +6,143 @@ Core functionality invoked by MVC pieces and scheduled as
 from app import db, appconfig, constants
 from app.models import *
 
-def promote_or_remove_wisp(wisp: Wisp):
+# most IDs bound in one "IN" clause. Some statements bind them twice,
+# which stays under the 999 variables older SQLite versions allow
+MAX_BOUND_IDS = 400
+
+def chunked(ids: list) -> list:
     """
-    Helper method to either promote the given Wisp to a Remembrance,
-        if there are fewer than the maximum number of Remembrances
-        or it has more Hearts than the lowest of them, or to remove it.
-    :param wisp: wisp to promote or remove
+    Helper method, split a list of IDs into lists of at most
+        MAX_BOUND_IDS.
+    :param ids: list of IDs
+    :return: list of lists of IDs
     """
-    remembrances = sorted(db.session.scalars(
-        db.select(Wisp).filter_by(
-            status=constants.REMEMBRANCE_WISP
-        )).all(),
-        key=lambda wisp: len(wisp.hearted_users)
+    return [ids[i:i + MAX_BOUND_IDS] 
+        for i in range(0, len(ids), MAX_BOUND_IDS)]
+
+def subtract_heartscores(entity_id, hearts, entity_ids: list):
+    """
+    Helper method to take the Hearts of a batch of Wisps or Songs off
+        their posters' HeartScores, in one UPDATE. Its subquery sums
+        them as the row is written, so Hearts committed in the 
+        meantime are counted.
+    :param entity_id: ID column, Wisp.wisp_id or Song.song_id
+    :param hearts: SQL expression of the Hearts to subtract per row
+    :param entity_ids: IDs of the Wisps or Songs, at most 
+        MAX_BOUND_IDS
+    """
+    model = entity_id.class_
+    hearts_sum = db.select(
+        db.func.coalesce(db.func.sum(hearts), 0)
+    ).where(
+        model.user_id == User.user_id,
+        entity_id.in_(entity_ids)
+    ).scalar_subquery()
+    db.session.execute(
+        db.update(User).where(
+            User.user_id.in_(
+                db.select(model.user_id).where(entity_id.in_(entity_ids))
+            )
+        ).values(heartscore=User.heartscore - hearts_sum)
     )
-    
-    # doesn't actually change length of 'hearted_users'
-    wisp.remove_hearts()
-    if (len(remembrances) < appconfig["MAX_REMEMBRANCES"] or
-            (len(remembrances) and len(wisp.hearted_users) > 
-            len(remembrances[0].hearted_users))):
-        wisp.status = constants.REMEMBRANCE_WISP
-        if len(remembrances) == appconfig["MAX_REMEMBRANCES"]:
-            db.session.delete(remembrances[0])
-    else:
-        db.session.delete(wisp)
 
-def expire_song(song: Song):
+def promote_or_remove_wisps(wisp_ids: list) -> set:
+    """
+    Helper method to expire a batch of live Wisps: the most Hearted
+        of them are promoted to Remembrances, replacing less Hearted
+        Remembrances once there are the maximum number of them, and
+        the rest are removed. Ties keep current Remembrances, then
+        newer Wisps. The Remembrances are read once for the whole
+        batch, and the changes made with bulk statements.
+    :param wisp_ids: IDs of the live Wisps to expire
+    :return: set of IDs of the Users whose HeartScore changed
+    """
+    if not wisp_ids:
+        return set()
+    columns = (Wisp.wisp_id, Wisp.user_id, Wisp.heart_count,
+        Wisp.created_time, Wisp.status)
+    remembrances = db.session.execute(
+        db.select(*columns).filter_by(
+            status=constants.REMEMBRANCE_WISP
+        )).all()
+    expired = []
+    for chunk in chunked(wisp_ids):
+        expired += db.session.execute(
+            db.select(*columns).filter(
+                Wisp.wisp_id.in_(chunk)
+            )).all()
+
+    # merge the floor with the batch, most Hearted first. The sorts 
+    # are stable, so ties are kept newest first, Remembrances first
+    ranked = sorted(remembrances + expired,
+        key=lambda row: row.created_time, reverse=True)
+    ranked.sort(key=lambda row: (-row.heart_count,
+        row.status != constants.REMEMBRANCE_WISP))
+    kept = ranked[:appconfig["MAX_REMEMBRANCES"]]
+    promoted_ids = [row.wisp_id for row in kept 
+        if row.status == constants.LIVE_WISP]
+    removed_ids = [row.wisp_id 
+        for row in ranked[appconfig["MAX_REMEMBRANCES"]:]]
+
+    # Hearts of expired Wisps leave their posters' HeartScores, 
+    # including promoted ones
+    for chunk in chunked(wisp_ids):
+        subtract_heartscores(Wisp.wisp_id, Wisp.heart_count, chunk)
+
+    for chunk in chunked(promoted_ids):
+        db.session.execute(
+            db.update(Wisp).filter(
+                Wisp.wisp_id.in_(chunk)
+            ).values(status=constants.REMEMBRANCE_WISP)
+        )
+    hearts = wisp_heart_association_table
+    for chunk in chunked(removed_ids):
+        db.session.execute(
+            db.delete(hearts).where(hearts.c.hearted_wisp_id.in_(chunk))
+        )
+        db.session.execute(
+            db.delete(Wisp).filter(Wisp.wisp_id.in_(chunk))
+        )
+    return {row.user_id for row in expired if row.heart_count}
+
+def remove_songs(song_ids: list) -> set:
     """
-    Helper method to expire the given song
-    :param song: Song object to expire
+    Helper method to delete a batch of Songs along with their votes,
+        taking their Hearts and BrokenHearts off their queuers'
+        HeartScores, with bulk statements.
+    :param song_ids: IDs of the Songs to delete
+    :return: set of IDs of the Users whose HeartScore changed
     """
-    song.remove_hearts()
-    db.session.delete(song)
+    queuer_ids = set()
+    hearts = song_heart_association_table
+    brokenhearts = song_broken_heart_association_table
+    for chunk in chunked(song_ids):
+        queuer_ids.update(db.session.scalars(
+            db.select(Song.user_id).filter(
+                Song.song_id.in_(chunk),
+                Song.heart_count != Song.brokenheart_count
+            )))
+        subtract_heartscores(Song.song_id,
+            Song.heart_count - Song.brokenheart_count, chunk)
+        db.session.execute(
+            db.delete(hearts).where(hearts.c.hearted_song_id.in_(chunk))
+        )
+        db.session.execute(
+            db.delete(brokenhearts).where(
+                brokenhearts.c.broken_hearted_song_id.in_(chunk))
+        )
+        db.session.execute(
+            db.delete(Song).filter(Song.song_id.in_(chunk))
+        )
+    queuer_ids.discard(None)
+    return queuer_ids
 
-def remove_excess_wisps():
+def remove_excess_wisps() -> tuple:
     """
     Helper method to promote or delete as many old Wisps as 
         necessary to keep total number below maximum set in config.
+    :return: (list of IDs of the Wisps which are no longer live, set 
+        of IDs of the Users whose HeartScore changed) tuple
     """
     
     excess = db.session.execute(
@@ -52,15 +152,29 @@ def remove_excess_wisps():
     ))).scalar() - appconfig["MAX_WISPS"]
 
     if excess > 0:
-        excess_wisps = db.session.scalars(
-            db.select(Wisp).filter_by(
+        excess_wisp_ids = db.session.scalars(
+            db.select(Wisp.wisp_id).filter_by(
                 status=constants.LIVE_WISP
             ).order_by(
                 Wisp.created_time.asc()
             ).limit(excess)
         ).all()
-        for wisp in excess_wisps:
-            promote_or_remove_wisp(wisp)
+        return excess_wisp_ids, promote_or_remove_wisps(excess_wisp_ids)
+    return [], set()
+
+def remove_user_votes(user: User):
+    """
+    Helper method to take a deleted User's Hearts and BrokenHearts
+        off the counts of the Wisps and Songs they voted on. The
+        votes themselves are deleted along with the User.
+    :param user: User being deleted
+    """
+    for wisp in user.hearted_wisps:
+        wisp.count_hearts(-1)
+    for song in user.hearted_songs:
+        song.count_hearts(hearts=-1)
+    for song in user.broken_hearted_songs:
+        song.count_hearts(brokenhearts=-1)
 
 def delete_user_content(user: User):
     """
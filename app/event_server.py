@@ -0,0 +1,403 @@
+"""
+Server-Sent Events broadcaster, pushing radio (and other) events to
+    listeners as they happen instead of having them poll. Runs its own
+    small HTTP server on EVENT_SERVER_HOST:EVENT_SERVER_PORT, with a
+    single "selectors" thread serving every listener, so an idle
+    listener costs an open socket rather than a Flask worker thread.
+
+Events can be published from any process forked after the server was
+    created (e.g. the test server) through a pipe, and each event is
+    serialized once however many listeners it goes to.
+"""
+import json
+import os
+import select
+import selectors
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+from app import flaskapp, appconfig
+
+# largest request head accepted from a listener, in bytes
+MAX_REQUEST_SIZE = 8192
+# size of reads from the publish pipe and from listeners
+READ_SIZE = 65536
+
+# comment sent to every listener each EVENT_HEARTBEAT_INTERVAL, so
+# proxies don't time out quiet connections and dead ones are noticed
+HEARTBEAT = b": heartbeat\n\n"
+RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n" +
+    b"Content-Type: text/event-stream\r\n" +
+    b"Cache-Control: no-cache\r\n" +
+    b"Connection: keep-alive\r\n" +
+    b"Access-Control-Allow-Origin: *\r\n" +
+    b"\r\n"
+)
+NOT_FOUND = (
+    b"HTTP/1.1 404 Not Found\r\n" +
+    b"Content-Length: 0\r\n" +
+    b"Connection: close\r\n" +
+    b"\r\n"
+)
+
+def encode_event(event: str, data) -> bytes:
+    """
+    Helper method, serialize an event in the SSE wire format.
+    :param event: event name
+    :param data: JSON-serializable event data
+    :return: encoded event
+    """
+    return (f"event: {event}\n" +
+        f"data: {json.dumps(data, separators=(',', ':'))}\n\n").encode()
+
+class Listener():
+    """
+    Object holding a listener's connection, and the events waiting to
+        be sent to it.
+    """
+    def __init__(self, sock: socket.socket):
+        """
+        Initialization actions.
+        :param sock: non-blocking accepted socket
+        """
+        self.sock = sock
+        self.connected_time = time.monotonic()
+        # request head read so far, until it's complete
+        self.request = b""
+        self.subscribed = False
+        # channels subscribed to, None for every channel
+        self.channels = None
+        # bytes the socket couldn't take yet
+        self.backlog = bytearray()
+        self.closed = False
+
+    def wants(self, channel: str) -> bool:
+        """
+        Check whether the listener is subscribed to a channel.
+        :param channel: channel name, None for messages to everyone
+        :return: True if the listener should get the channel's events
+        """
+        return self.subscribed and (channel is None or
+            self.channels is None or channel in self.channels)
+
+class EventServer():
+    """
+    Object serving the SSE endpoint and broadcasting published events.
+        "startup" and "shutdown" should be called by the server at
+        startup and shutdown.
+
+    Listeners connect with "GET EVENT_SERVER_PATH?channels=a,b" (every
+        channel if "channels" is omitted). Events published with
+        "retain" are state, e.g. the playing song: the latest of each
+        is sent to listeners as soon as they connect, and a burst of
+        them is collapsed into its latest one.
+    """
+    def __init__(self, host: str, port: int):
+        """
+        Initialization actions. Create the publish pipe, so that
+            processes forked from this one can publish too.
+        :param host: address to listen on
+        :param port: port to listen on, 0 for any free port
+        """
+        self.host = host
+        self.port = port
+        self.kill_signal = threading.Event()
+        self.serve_thread = None
+        self.selector = None
+        self.server_sock = None
+        self.listeners = set()
+
+        # latest retained event of each channel, by event name
+        self.retained = {}
+
+        # publishers write one JSON line per event. Writes up to
+        # PIPE_BUF bytes are atomic, so lines from several threads and
+        # processes never interleave, and they never block: events are
+        # dropped if the server falls that far behind
+        self.publish_read, self.publish_write = os.pipe()
+        os.set_blocking(self.publish_read, False)
+        os.set_blocking(self.publish_write, False)
+        self.pipe_buffer = b""
+
+    def startup(self):
+        """
+        Startup actions. Open the listening socket and start the
+            "serve" thread.
+        """
+        self.selector = selectors.DefaultSelector()
+        self.server_sock = socket.create_server((self.host, self.port))
+        self.server_sock.setblocking(False)
+        self.port = self.server_sock.getsockname()[1]
+        self.selector.register(self.server_sock, selectors.EVENT_READ)
+        self.selector.register(self.publish_read, selectors.EVENT_READ)
+        flaskapp.logger.info(f"Starting event server on port {self.port}")
+        self.serve_thread = threading.Thread(target=self.serve)
+        self.serve_thread.start()
+
+    def shutdown(self):
+        """
+        Shutdown actions. Stops the "serve" thread, which closes every
+            connection.
+        """
+        self.kill_signal.set()
+        if self.serve_thread:
+            self.wake()
+            self.serve_thread.join()
+
+    def wake(self):
+        """
+        Helper method, wake the "serve" thread with an empty line.
+        """
+        try:
+            os.write(self.publish_write, b"\n")
+        except BlockingIOError:
+            # already has plenty to wake up to
+            pass
+
+    def publish(self, channel: str, event: str, data,
+                retain: bool = False):
+        """
+        Publish an event to every listener subscribed to a channel.
+            Never blocks, safe to call from any thread or process.
+        :param channel: channel name, e.g. "radio"
+        :param event: event name, e.g. "song"
+        :param data: JSON-serializable event data, small enough to
+            fit in PIPE_BUF once serialized
+        :param retain: whether the event is the channel's current
+            state, to be sent to new listeners
+        """
+        message = (json.dumps([channel, event, data, retain],
+            separators=(",", ":")) + "\n").encode()
+        if len(message) > select.PIPE_BUF:
+            flaskapp.logger.error(f"Event {channel}/{event} is too " +
+                f"large to publish ({len(message)} bytes)")
+            return
+        try:
+            os.write(self.publish_write, message)
+        except BlockingIOError:
+            flaskapp.logger.warning(f"Dropped event {channel}/{event}, " +
+                "event server isn't keeping up")
+
+    def serve(self):
+        """
+        Thread accepting listeners, reading their requests, and
+            relaying published events to them. Sends a heartbeat every
+            EVENT_HEARTBEAT_INTERVAL, and closes connections which
+            haven't sent a complete request by then.
+        """
+        interval = appconfig["EVENT_HEARTBEAT_INTERVAL"]
+        next_heartbeat = time.monotonic() + interval
+        try:
+            while not self.kill_signal.is_set():
+                events = self.selector.select(
+                    max(next_heartbeat - time.monotonic(), 0))
+                for key, mask in events:
+                    if key.fileobj is self.server_sock:
+                        self.accept()
+                    elif key.fileobj == self.publish_read:
+                        self.read_events()
+                    elif not key.data.closed:
+                        if mask & selectors.EVENT_READ:
+                            self.read_listener(key.data)
+                        if (mask & selectors.EVENT_WRITE and
+                                not key.data.closed):
+                            self.flush(key.data)
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + interval
+                    for listener in list(self.listeners):
+                        if listener.subscribed:
+                            self.send(listener, HEARTBEAT)
+                        elif now - listener.connected_time > interval:
+                            self.drop(listener)
+        except Exception as err:
+            flaskapp.logger.error(f"Error in event server: " +
+                f"{type(err).__name__}: {str(err)}")
+        finally:
+            for listener in list(self.listeners):
+                self.drop(listener)
+            self.selector.close()
+            self.server_sock.close()
+
+    def accept(self):
+        """
+        Helper method, accept every pending connection.
+        """
+        while True:
+            try:
+                sock, _ = self.server_sock.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # e.g. out of file descriptors, retried on next select
+                flaskapp.logger.error(f"Unable to accept listener: " +
+                    f"{str(e)}")
+                return
+            sock.setblocking(False)
+            listener = Listener(sock)
+            self.listeners.add(listener)
+            self.selector.register(sock, selectors.EVENT_READ, listener)
+
+    def read_listener(self, listener: Listener):
+        """
+        Helper method, read from a listener. Subscribes it once its
+            request is complete, anything it sends afterwards is
+            ignored. Drops it once it disconnects.
+        :param listener: listener with data to read
+        """
+        try:
+            data = listener.sock.recv(READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(listener)
+            return
+        if listener.subscribed:
+            return
+        listener.request += data
+        if b"\r\n\r\n" not in listener.request:
+            if len(listener.request) > MAX_REQUEST_SIZE:
+                self.drop(listener)
+            return
+        self.subscribe(listener)
+
+    def subscribe(self, listener: Listener):
+        """
+        Helper method, answer a listener's request, and send it the
+            retained events of its channels.
+        :param listener: listener which sent a complete request head
+        """
+        request_line = listener.request.split(b"\r\n", 1)[0].decode(
+            "latin-1").split()
+        listener.request = b""
+        url = urlsplit(request_line[1]) if len(request_line) == 3 else None
+        if not (url and request_line[0] == "GET" and
+                url.path == appconfig["EVENT_SERVER_PATH"]):
+            try:
+                listener.sock.send(NOT_FOUND)
+            except OSError:
+                pass
+            self.drop(listener)
+            return
+
+        channels = {channel for param in
+            parse_qs(url.query).get("channels", [])
+            for channel in param.split(",") if channel}
+        listener.channels = channels or None
+        listener.subscribed = True
+        message = bytearray(RESPONSE_HEAD)
+        message += f"retry: {appconfig['EVENT_RETRY']}\n\n".encode()
+        for channel, retained in self.retained.items():
+            if listener.wants(channel):
+                for event_message in retained.values():
+                    message += event_message
+        self.send(listener, bytes(message))
+
+    def read_events(self):
+        """
+        Helper method, drain the publish pipe and broadcast the events
+            published, in order. Only the latest of each retained
+            event is broadcast, e.g. one vote tally for a burst of
+            votes.
+        """
+        data = bytearray(self.pipe_buffer)
+        while True:
+            try:
+                chunk = os.read(self.publish_read, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        lines = bytes(data).split(b"\n")
+        self.pipe_buffer = lines.pop()
+
+        published = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                published.append(tuple(json.loads(line)))
+            except ValueError:
+                flaskapp.logger.error(f"Malformed event: {line}")
+        latest = {(channel, event): index for index,
+            (channel, event, _, retain) in enumerate(published) if retain}
+        for index, (channel, event, data, retain) in enumerate(published):
+            if retain and latest[(channel, event)] != index:
+                continue
+            message = encode_event(event, data)
+            if retain:
+                self.retained.setdefault(channel, {})[event] = message
+            self.broadcast(channel, message)
+
+    def broadcast(self, channel: str, message: bytes):
+        """
+        Helper method, send an encoded event to every listener
+            subscribed to a channel.
+        :param channel: channel name
+        :param message: encoded event
+        """
+        for listener in list(self.listeners):
+            if listener.wants(channel):
+                self.send(listener, message)
+
+    def send(self, listener: Listener, message: bytes):
+        """
+        Helper method, send data to a listener, or add it to the
+            listener's backlog if the socket can't take it yet.
+            Listeners whose backlog grows past EVENT_MAX_BACKLOG are
+            too slow to keep, and are dropped.
+        :param listener: subscribed listener
+        :param message: bytes to send
+        """
+        if listener.backlog:
+            listener.backlog += message
+            if len(listener.backlog) > appconfig["EVENT_MAX_BACKLOG"]:
+                self.drop(listener)
+            return
+        try:
+            sent = listener.sock.send(message)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(listener)
+            return
+        if sent < len(message):
+            listener.backlog += message[sent:]
+            self.selector.modify(listener.sock,
+                selectors.EVENT_READ | selectors.EVENT_WRITE, listener)
+
+    def flush(self, listener: Listener):
+        """
+        Helper method, send as much of a listener's backlog as the
+            socket will take.
+        :param listener: listener with a backlog
+        """
+        try:
+            sent = listener.sock.send(listener.backlog)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.drop(listener)
+            return
+        del listener.backlog[:sent]
+        if not listener.backlog:
+            self.selector.modify(listener.sock, selectors.EVENT_READ,
+                listener)
+
+    def drop(self, listener: Listener):
+        """
+        Helper method, close a listener's connection.
+        :param listener: listener to drop
+        """
+        if listener.closed:
+            return
+        listener.closed = True
+        self.listeners.discard(listener)
+        self.selector.unregister(listener.sock)
+        listener.sock.close()
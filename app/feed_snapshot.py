@@ -0,0 +1,256 @@
+"""
+Shared snapshot of the newest live Wisps, serialized once and served
+    from memory to every reader of the feed. Block filtering is applied
+    to it per reader, using their cached block set. The snapshot is
+    updated in place by posts, purges, account deletions, bans and
+    HeartScore changes, once they're committed. New and removed Wisps
+    are also pushed to the event server's "wisps" channel, so readers
+    learn of them without polling.
+
+Every update bumps a version shared with processes forked after the
+    snapshot was created (e.g. the test server), and a process whose
+    snapshot falls behind the shared version reloads it with one query.
+    Code writing Wisps to the database any other way should call
+    "invalidate".
+"""
+import base64
+import multiprocessing
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from app import db, appconfig, constants, blockcache, eventserver
+from app.models import Wisp, User
+
+# event server channel of new and removed Wisps
+WISPS_CHANNEL = "wisps"
+# most Wisp IDs in one "removed" event, to fit in PIPE_BUF
+REMOVED_EVENT_SIZE = 64
+
+# position: (created_time, wisp_id) of the Wisp in the feed order,
+# wisp_dict: "wisp_page_dict" of the Wisp, never modified once shared
+FeedEntry = namedtuple("FeedEntry", ["position", "user_id", "wisp_dict"])
+
+def encode_cursor(wisp: Wisp) -> str:
+    """
+    Helper method to get the pagination cursor of a Wisp, an opaque
+        token of its place in the feed's (created_time, wisp_id) order.
+    :param wisp: Wisp to get the cursor of
+    :return: URL-safe cursor string
+    """
+    return base64.urlsafe_b64encode(
+        f"{wisp.created_time.isoformat()}|{wisp.wisp_id}".encode()
+    ).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Helper method to get the feed position encoded in a cursor.
+    :param cursor: cursor string from "encode_cursor"
+    :return: (created_time, wisp_id) tuple, or None if the cursor is
+        malformed
+    """
+    try:
+        created_time, wisp_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split("|")
+        created_time = datetime.fromisoformat(created_time)
+    except ValueError:
+        return None
+    # created times are stored without a time zone
+    if created_time.tzinfo:
+        return None
+    return created_time, wisp_id
+
+def wisp_page_dict(wisp: Wisp) -> dict:
+    """
+    Helper method, dictionary representation of a Wisp in a page of
+        the feed, along with its cursor.
+    :param wisp: Wisp to convert
+    :return: Wisp.to_dict() dictionary, plus "cursor"
+    """
+    wisp_dict = wisp.to_dict()
+    wisp_dict["cursor"] = encode_cursor(wisp)
+    return wisp_dict
+
+def to_entry(wisp: Wisp) -> FeedEntry:
+    """
+    Helper method, snapshot entry of a Wisp.
+    :param wisp: live Wisp
+    :return: FeedEntry
+    """
+    return FeedEntry((wisp.created_time, wisp.wisp_id), wisp.user_id,
+        wisp_page_dict(wisp))
+
+class FeedSnapshot():
+    """
+    Object holding the newest FEED_SNAPSHOT_SIZE live Wisps, newest
+        first. Updates replace the list of entries rather than
+        modifying it, so readers can use it without holding the lock.
+    """
+    def __init__(self):
+        """
+        Initialization actions.
+        """
+        self.lock = threading.Lock()
+        # bumped by every update, in any process
+        self.version = multiprocessing.Value("Q", 0)
+        # list of FeedEntry, None until loaded, and the version it's
+        # up to date with
+        self.entries = None
+        self.entries_version = None
+        # whether the entries are every live Wisp, rather than only
+        # the newest
+        self.complete = False
+
+    def load(self) -> tuple:
+        """
+        Helper method, query the newest live Wisps.
+        :return: (list of FeedEntry, complete) tuple
+        """
+        wisps = db.session.scalars(
+            db.select(Wisp).options(
+                db.joinedload(Wisp.user, innerjoin=True)
+            ).filter_by(
+                status=constants.LIVE_WISP
+            ).order_by(
+                Wisp.created_time.desc(),
+                Wisp.wisp_id.desc()
+            ).limit(appconfig["FEED_SNAPSHOT_SIZE"])
+        ).all()
+        return ([to_entry(wisp) for wisp in wisps],
+            len(wisps) < appconfig["FEED_SNAPSHOT_SIZE"])
+
+    def read(self) -> tuple:
+        """
+        Get the current entries, reloading them if they're behind.
+        :return: (list of FeedEntry, complete) tuple
+        """
+        with self.lock:
+            version = self.version.value
+            if self.entries is not None and self.entries_version == version:
+                return self.entries, self.complete
+        entries, complete = self.load()
+        with self.lock:
+            # only kept if nothing changed while loading
+            if self.version.value == version:
+                self.entries = entries
+                self.entries_version = version
+                self.complete = complete
+        return entries, complete
+
+    def update(self, change):
+        """
+        Helper method, bump the version, and apply a change to the
+            entries if they were up to date. Otherwise they're
+            reloaded by the next read.
+        :param change: function taking the list of entries and
+            returning a new one, or None to reload
+        """
+        with self.lock:
+            with self.version.get_lock():
+                up_to_date = (self.entries is not None and
+                    self.entries_version == self.version.value)
+                self.version.value += 1
+                version = self.version.value
+            entries = change(self.entries) if up_to_date else None
+            self.entries = entries
+            self.entries_version = version if entries is not None else None
+
+    def invalidate(self):
+        """
+        Reload the snapshot on the next read, in every process.
+        """
+        self.update(lambda entries: None)
+
+    def posted(self, wisp: Wisp):
+        """
+        Add a newly posted Wisp, and publish its cursor as the
+            channel's newest. The event is retained, so it carries no
+            count of new Wisps, which would depend on what each reader
+            has: a reader whose newest cursor differs fetches
+            "newer_than" that cursor instead.
+        :param wisp: committed live Wisp
+        """
+        entry = to_entry(wisp)
+        def change(entries: list) -> list:
+            index = next((index for index, other in enumerate(entries)
+                if other.position < entry.position), len(entries))
+            if index == len(entries) and not self.complete:
+                # older than the snapshot
+                return entries
+            entries = entries[:index] + [entry] + entries[index:]
+            if len(entries) > appconfig["FEED_SNAPSHOT_SIZE"]:
+                self.complete = False
+                entries.pop()
+            return entries
+        self.update(change)
+        eventserver.publish(WISPS_CHANNEL, "new", {
+            "cursor": entry.wisp_dict["cursor"]
+        }, retain=True)
+
+    def removed(self, wisp_ids: list):
+        """
+        Drop Wisps which were deleted or are no longer live, and
+            publish their IDs.
+        :param wisp_ids: IDs of the Wisps
+        """
+        if not wisp_ids:
+            return
+        wisp_ids = list(wisp_ids)
+        removed_ids = set(wisp_ids)
+        self.update(lambda entries: [entry for entry in entries
+            if entry.position[1] not in removed_ids])
+        for i in range(0, len(wisp_ids), REMOVED_EVENT_SIZE):
+            eventserver.publish(WISPS_CHANNEL, "removed", {
+                "wisp_ids": wisp_ids[i:i + REMOVED_EVENT_SIZE]
+            })
+
+    def removed_user(self, user_id: str):
+        """
+        Drop the Wisps of a deleted or banned User.
+        :param user_id: ID of the User
+        """
+        self.update(lambda entries: [entry for entry in entries
+            if entry.user_id != user_id])
+
+    def updated_user(self, user: User):
+        """
+        Refresh the username, profile and HeartScore shown on a
+            User's Wisps.
+        :param user: User with committed changes
+        """
+        fields = {
+            "user_username":    user.username,
+            "user_profile_uri": user.profile_uri,
+            "user_heartscore":  user.heartscore
+        }
+        self.update(lambda entries: [
+            entry._replace(wisp_dict={**entry.wisp_dict, **fields})
+            if entry.user_id == user.user_id else entry
+            for entry in entries
+        ])
+
+    def page(self, user, position: tuple = None) -> list:
+        """
+        Get the newest page of Wisps visible to a User, optionally
+            only ones newer than a position, if the snapshot covers
+            it.
+        :param user: User object for which to get Wisps. Can be
+            AnonymousUserMixin for anonymous access
+        :param position: (created_time, wisp_id) of the newest Wisp
+            already seen
+        :return: list of up to WISPS_PER_PAGE Wisp dicts, or None if
+            the page reaches past the snapshot, and has to be queried
+        """
+        entries, complete = self.read()
+        block_set = (blockcache.get(user.user_id)
+            if isinstance(user, User) else frozenset())
+        page = []
+        for entry in entries:
+            if position and entry.position <= position:
+                # every live Wisp newer than this one is in the snapshot
+                return page
+            if entry.user_id not in block_set:
+                page.append(entry.wisp_dict)
+                if len(page) == appconfig["WISPS_PER_PAGE"]:
+                    return page
+        return page if complete else None
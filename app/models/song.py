@@ -2,6 +2,7 @@
 Python SQLAlchemy file defining Song.
 """
 from sqlalchemy.sql import func 
+from sqlalchemy.orm import object_session
 from datetime import datetime
 
 from app import db, constants
@@ -16,7 +17,9 @@ song_heart_association_table = db.Table(
     db.Column(
         "hearted_song_id", db.String(32),
         db.ForeignKey("song.song_id")
-    )
+    ),
+    # Hearts are counted per Song when reconciling "heart_count"
+    db.Index("ix_song_heart_hearted_song_id", "hearted_song_id")
 )
 
 song_broken_heart_association_table = db.Table(
@@ -29,13 +32,22 @@ song_broken_heart_association_table = db.Table(
     db.Column(
         "broken_hearted_song_id", db.String(32),
         db.ForeignKey("song.song_id")
-    )
+    ),
+    db.Index("ix_song_broken_heart_broken_hearted_song_id",
+        "broken_hearted_song_id")
 )
 
 class Song(db.Model):
     """
     Definition of Song (queued, playing, or past) data model
     """
+    __table_args__ = (
+        # the queue, and the playing Song, are looked up by status and
+        # ordered by status_updated_time
+        db.Index("ix_song_status_updated_time", 
+            "status", "status_updated_time"),
+    )
+
     song_id = db.Column(db.String(32), unique=True, primary_key=True)
     # user who queued song, can be anonymous for Otto-queued songs
     user_id = db.Column(db.String(32), db.ForeignKey("user.user_id"),
@@ -64,15 +76,46 @@ class Song(db.Model):
         lazy=True,
         backref="broken_hearted_songs"
     )
+    # len(hearted_users) and len(broken_hearted_users), kept by the 
+    # User Heart helpers and reconciled by a scheduled task
+    heart_count = db.Column(db.Integer, default=0, server_default="0",
+        nullable=False)
+    brokenheart_count = db.Column(db.Integer, default=0, 
+        server_default="0", nullable=False)
+
+    def count_hearts(self, hearts: int = 0, brokenhearts: int = 0):
+        """
+        Helper method, add to the Song's Heart and BrokenHeart counts.
+            Applied as increments in SQL, so that concurrent votes
+            aren't lost.
+        :param hearts: number of Hearts added, negative if removed
+        :param brokenhearts: number of BrokenHearts added, negative if
+            removed
+        """
+        for column, delta in ((Song.heart_count, hearts),
+                              (Song.brokenheart_count, brokenhearts)):
+            if not delta:
+                continue
+            # the loaded count, or an increment not flushed yet
+            count = getattr(self, column.key)
+            if count is None:
+                count = 0
+            elif isinstance(count, int):
+                count = column
+            setattr(self, column.key, count + delta)
 
     def remove_hearts(self):
         """
         Deinitilization actions on Song. Does not remove self from
             database, but subtracts Hearts from poster's HeartScore
         """
+        if not (isinstance(self.heart_count, int) and
+                isinstance(self.brokenheart_count, int)):
+            # flush pending increments, so the counts can be read
+            object_session(self).flush()
         if self.user:
-            self.user.heartscore -= len(self.hearted_users)
-            self.user.heartscore += len(self.broken_hearted_users)
+            self.user.heartscore -= self.heart_count
+            self.user.heartscore += self.brokenheart_count
 
     def __repr__(self):
         return "\n".join(
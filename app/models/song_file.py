@@ -0,0 +1,32 @@
+"""
+Python SQLAlchemy file defining SongFile, the catalog entry for a
+    file in the songs directory.
+"""
+from app import db
+
+class SongFile(db.Model):
+    """
+    Definition of SongFile data model. Mirrors a file in SONG_PATH,
+        and is refreshed whenever its size or mtime changes.
+    """
+    # file name, i.e. Song URI
+    uri = db.Column(db.UnicodeText, primary_key=True)
+    # duration in milliseconds and average bitrate in kbps, 0 if
+    # the file isn't a readable MP3
+    duration = db.Column(db.Integer, default=0, nullable=False)
+    bitrate = db.Column(db.Integer, default=0, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)
+    # SHA-256 of the file contents
+    sha = db.Column(db.String(64), nullable=False)
+    # gain to reach SONG_TARGET_LOUDNESS in dB, and the silence at
+    # either end in milliseconds. gain is None until the file has
+    # been analyzed
+    gain = db.Column(db.Float)
+    lead_silence = db.Column(db.Integer, default=0, nullable=False)
+    trail_silence = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return "\n".join(
+                f"{k}:\t{v}" for k, v in self.__dict__.items()
+            )
@@ -18,7 +18,12 @@ block_association_table = db.Table(
     db.Column(
         "blocker_id", db.String(32), db.ForeignKey("user.user_id")),
     db.Column(
-        "blocked_id", db.String(32), db.ForeignKey("user.user_id"))
+        "blocked_id", db.String(32), db.ForeignKey("user.user_id")),
+    # block sets are looked up in both directions
+    db.Index("ix_block_blocker_id_blocked_id", 
+        "blocker_id", "blocked_id"),
+    db.Index("ix_block_blocked_id_blocker_id", 
+        "blocked_id", "blocker_id")
 )
 
 class User(UserMixin, db.Model):
@@ -149,6 +154,7 @@ class User(UserMixin, db.Model):
         if (wisp.user != self and wisp not in self.hearted_wisps
                 and wisp.status == constants.LIVE_WISP):
             self.hearted_wisps.append(wisp)
+            wisp.count_hearts(1)
             wisp.user.heartscore += 1
 
     def unheart_wisp(self, wisp):
@@ -160,6 +166,7 @@ class User(UserMixin, db.Model):
         if (wisp.user != self and wisp in self.hearted_wisps
                 and wisp.status == constants.LIVE_WISP):
             self.hearted_wisps.remove(wisp)
+            wisp.count_hearts(-1)
             wisp.user.heartscore -= 1
 
     def heart_song(self, song):
@@ -167,57 +174,72 @@ class User(UserMixin, db.Model):
         Helper method for Hearting the provided Song. Can be
             an autoplay song.
         :param song: Song to Heart
+        :return: (hearts, brokenhearts) tuple of the changes in the
+            Song's votes, for the radio once they're committed
         """
         if (song.user != self and song not in self.hearted_songs
                 and song.status == constants.PLAYING_SONG):
-            if song in self.broken_hearted_songs:
-                self.unbrokenheart_song(song)
+            _, brokenhearts = self.unbrokenheart_song(song)
             self.hearted_songs.append(song)
+            song.count_hearts(hearts=1)
             if song.user:
                 song.user.heartscore += 1
+            return 1, brokenhearts
+        return 0, 0
 
     def unheart_song(self, song):
         """
         Helper method for UnHearting the provided Song. Can be an
-            autplay song. Checks to see if skip threshold reached.
+            autplay song. The radio checks whether the skip threshold
+            is reached.
         :param song: Song to UnHeart
+        :return: (hearts, brokenhearts) tuple of the changes in the
+            Song's votes
         """
         if (song.user != self and song in self.hearted_songs
                 and song.status == constants.PLAYING_SONG):
             self.hearted_songs.remove(song)
+            song.count_hearts(hearts=-1)
             if song.user:
                 song.user.heartscore -= 1
-            if (len(song.broken_hearted_users) - 
-                    len(song.hearted_users) >=
-                    appconfig["BROKENHEARTS_TO_SKIP"]):
-                flaskapp.logger.error("Skipping song...")
-                radiocontroller.skip_song()
+            return -1, 0
+        return 0, 0
     
     def brokenheart_song(self, song):
         """
         Helper method for BrokenHearting the provided Song. Can be
-            an autoplay song.
+            an autoplay song. The radio checks whether the skip
+            threshold is reached.
         :param song: Song to BrokenHeart
+        :return: (hearts, brokenhearts) tuple of the changes in the
+            Song's votes
         """
         if (song.user != self and song not in self.broken_hearted_songs
                 and song.status == constants.PLAYING_SONG):
-            if song in self.hearted_songs:
-                self.unheart_song(song)
+            hearts, _ = self.unheart_song(song)
             self.broken_hearted_songs.append(song)
+            song.count_hearts(brokenhearts=1)
             if song.user:
                 song.user.heartscore -= 1
+            return hearts, 1
+        return 0, 0
 
     def unbrokenheart_song(self, song):
         """
         Helper method for UnBrokenHearting the provided Song. Can be an
-            autplay song. Checks to see if skip threshold reached.
+            autplay song.
         :param song: Song to UnBrokenHeart
+        :return: (hearts, brokenhearts) tuple of the changes in the
+            Song's votes
         """
         if (song.user != self and song in self.broken_hearted_songs
                 and song.status == constants.PLAYING_SONG):
             self.broken_hearted_songs.remove(song)
+            song.count_hearts(brokenhearts=-1)
             if song.user:
                 song.user.heartscore += 1
+            return 0, -1
+        return 0, 0
     
     def __repr__(self):
         return "\n".join(
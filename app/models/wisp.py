@@ -2,6 +2,7 @@
 Python SQLAlchemy model file defining Wisp.
 """
 from sqlalchemy.sql import func 
+from sqlalchemy.orm import object_session
 from datetime import datetime
 import json
 
@@ -17,7 +18,9 @@ wisp_heart_association_table = db.Table(
     db.Column(
         "hearted_wisp_id", db.String(32),
         db.ForeignKey("wisp.wisp_id")
-    )
+    ),
+    # Hearts are counted per Wisp when reconciling "heart_count"
+    db.Index("ix_wisp_heart_hearted_wisp_id", "hearted_wisp_id")
 )
 
 class Wisp(db.Model):
@@ -25,6 +28,15 @@ class Wisp(db.Model):
     Definition of Wisp data model. A wisp can have text and/or a 
         GIF attachment
     """
+    __table_args__ = (
+        # the feed, purges and excess Wisp removal filter on status 
+        # and sort by created_time, with wisp_id breaking ties
+        db.Index("ix_wisp_status_created_time", 
+            "status", "created_time", "wisp_id"),
+        # a User's live Wisps, counted when posting
+        db.Index("ix_wisp_user_id_status", "user_id", "status")
+    )
+
     # All IDs consist of randomly-generated 32-character
     # hexadecimal UUIDs
     wisp_id = db.Column(db.String(32), unique=True, primary_key=True)
@@ -46,13 +58,34 @@ class Wisp(db.Model):
         lazy=True,
         backref="hearted_wisps"
     )
+    # len(hearted_users), kept by the User Heart helpers and 
+    # reconciled by a scheduled task
+    heart_count = db.Column(db.Integer, default=0, server_default="0",
+        nullable=False)
+
+    def count_hearts(self, hearts: int):
+        """
+        Helper method, add to the Wisp's Heart count. Applied as an
+            increment in SQL, so that concurrent Hearts aren't lost.
+        :param hearts: number of Hearts added, negative if removed
+        """
+        # the loaded count, or an increment not flushed yet
+        count = self.heart_count
+        if count is None:
+            count = 0
+        elif isinstance(count, int):
+            count = Wisp.heart_count
+        self.heart_count = count + hearts
 
     def remove_hearts(self):
         """
         Deinitialization actions on Wisp. Does not remove self from
             database, but subtracts Hearts from poster's HeartScore
         """
-        self.user.heartscore -= len(self.hearted_users)
+        if not isinstance(self.heart_count, int):
+            # flush a pending increment, so the count can be read
+            object_session(self).flush()
+        self.user.heartscore -= self.heart_count
 
     def __repr__(self):
         return "\n".join(
@@ -0,0 +1,290 @@
+"""
+MPEG audio frame parsing. Lets the radio find MP3 frame boundaries,
+    durations and bit reservoir dependencies without decoding, so that
+    untouched frames can be passed straight through to the stream.
+    Only Layer III (i.e. MP3) is supported.
+"""
+from collections import namedtuple
+
+# values of the two "version" bits of a frame header
+MPEG25 = 0
+MPEG2 = 2
+MPEG1 = 3
+
+# Layer III bitrates in kbps, by bitrate index. Index 0 is the
+# unsupported "free" bitrate and 15 is invalid
+BITRATES = {
+    MPEG1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224,
+        256, 320),
+    MPEG2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144,
+        160)
+}
+BITRATES[MPEG25] = BITRATES[MPEG2]
+
+SAMPLE_RATES = {
+    MPEG1: (44100, 48000, 32000),
+    MPEG2: (22050, 24000, 16000),
+    MPEG25: (11025, 12000, 8000)
+}
+
+HEADER_SIZE = 4
+ID3V2_HEADER_SIZE = 10
+READ_SIZE = 65536
+
+FrameHeader = namedtuple("FrameHeader", [
+    "version", "bitrate", "sample_rate", "channels", "samples",
+    "length", "protected"
+])
+
+def parse_header(data: bytes) -> FrameHeader:
+    """
+    Parse the four-byte header at the start of the given data.
+    :param data: bytes starting at a candidate frame boundary
+    :return: FrameHeader, or None if the data doesn't start with a
+        valid Layer III frame header
+    """
+    if (len(data) < HEADER_SIZE or data[0] != 0xFF or
+            data[1] & 0xE0 != 0xE0):
+        return None
+    version = (data[1] >> 3) & 0b11
+    layer = (data[1] >> 1) & 0b11
+    bitrate_index = data[2] >> 4
+    sample_rate_index = (data[2] >> 2) & 0b11
+    # reserved version, non-Layer III, free/bad bitrate, reserved rate
+    if (version == 1 or layer != 1 or bitrate_index in (0, 15) or
+            sample_rate_index == 3):
+        return None
+    bitrate = BITRATES[version][bitrate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    samples = 1152 if version == MPEG1 else 576
+    padding = (data[2] >> 1) & 1
+    return FrameHeader(
+        version=version,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        # channel mode 3 is mono, everything else is two channels
+        channels=1 if data[3] >> 6 == 3 else 2,
+        samples=samples,
+        length=samples // 8 * bitrate * 1000 // sample_rate + padding,
+        protected=not data[1] & 1
+    )
+
+def side_info_offset(header: FrameHeader) -> int:
+    """
+    Offset of the side information within a frame, after the header
+        and optional CRC.
+    :param header: parsed header of the frame
+    :return: byte offset
+    """
+    return HEADER_SIZE + (2 if header.protected else 0)
+
+def side_info_size(header: FrameHeader) -> int:
+    """
+    Size of the side information of a frame.
+    :param header: parsed header of the frame
+    :return: size in bytes
+    """
+    if header.version == MPEG1:
+        return 17 if header.channels == 1 else 32
+    return 9 if header.channels == 1 else 17
+
+def main_data_begin(frame: bytes, header: FrameHeader) -> int:
+    """
+    Get the number of bytes of bit reservoir borrowed from previous
+        frames. A frame with a value of 0 decodes on its own, so it
+        is safe to splice just before it.
+    :param frame: complete frame bytes
+    :param header: parsed header of the frame
+    :return: main_data_begin backpointer, in bytes
+    """
+    offset = side_info_offset(header)
+    if header.version == MPEG1:
+        return (frame[offset] << 1) | (frame[offset + 1] >> 7)
+    return frame[offset]
+
+def is_info_frame(frame: bytes, header: FrameHeader) -> bool:
+    """
+    Check whether a frame is a Xing/Info/VBRI metadata frame, which
+        carries no audio and only describes the file it started.
+    :param frame: complete frame bytes
+    :param header: parsed header of the frame
+    :return: True if the frame is a metadata frame
+    """
+    offset = side_info_offset(header) + side_info_size(header)
+    return (frame[offset:offset + 4] in (b"Xing", b"Info") or
+        frame[36:40] == b"VBRI")
+
+def is_vbr(fp) -> bool:
+    """
+    Check whether an MP3 file starts with a Xing or VBRI frame, which
+        VBR encoders write to describe a file whose frames change
+        bitrate. CBR files may start with an "Info" frame instead.
+    :param fp: binary file object positioned at the start of the file
+    :return: True if the file is tagged as VBR
+    """
+    data = skip_id3v2(fp)
+    data += fp.read(READ_SIZE - len(data))
+    header = parse_header(data[:HEADER_SIZE])
+    if header is None or len(data) < header.length:
+        return False
+    offset = side_info_offset(header) + side_info_size(header)
+    return (data[offset:offset + 4] == b"Xing" or
+        data[36:40] == b"VBRI")
+
+def skip_id3v2(fp) -> bytes:
+    """
+    Skip an ID3v2 tag at the current position of the file, if there
+        is one.
+    :param fp: binary file object
+    :return: bytes read past the tag that belong to the audio
+    """
+    data = fp.read(ID3V2_HEADER_SIZE)
+    if len(data) < ID3V2_HEADER_SIZE or data[:3] != b"ID3":
+        return data
+    # tag size is a 28-bit "syncsafe" integer, excluding the header
+    # and the optional footer
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    if data[5] & 0x10:
+        size += ID3V2_HEADER_SIZE
+    fp.read(size)
+    return b""
+
+def iter_frames(fp):
+    """
+    Generator over the audio frames of an MP3 file, in order. Skips
+        ID3 tags, Xing/Info headers and any junk between frames.
+    :param fp: binary file object positioned at the start of the file
+    :return: iterator of (FrameHeader, frame bytes) tuples
+    """
+    buffer = skip_id3v2(fp)
+    offset = 0
+    first = True
+    while True:
+        header = parse_header(buffer[offset:offset + HEADER_SIZE])
+        if header and len(buffer) - offset >= header.length:
+            frame = buffer[offset:offset + header.length]
+            offset += header.length
+            if not (first and is_info_frame(frame, header)):
+                yield header, frame
+            first = False
+            continue
+        if header is None and len(buffer) - offset >= HEADER_SIZE:
+            # lost sync, move on to the next candidate sync byte
+            next_sync = buffer.find(b"\xff", offset + 1)
+            offset = len(buffer) if next_sync == -1 else next_sync
+            continue
+        data = fp.read(READ_SIZE)
+        if not data:
+            # drop any truncated final frame
+            return
+        buffer = buffer[offset:] + data
+        offset = 0
+
+class FrameSplitter():
+    """
+    Incremental counterpart of "iter_frames", for MP3 data arriving in
+        chunks which don't line up with frame boundaries. Partial
+        frames are kept until the rest of them is fed in.
+    """
+    def __init__(self):
+        """
+        Initialization actions.
+        """
+        self.buffer = b""
+
+    def reset(self):
+        """
+        Drop any partial frame, e.g. when the data it belonged to was
+            skipped.
+        """
+        self.buffer = b""
+
+    def feed(self, data: bytes) -> list:
+        """
+        Add data, and split off every frame it completes.
+        :param data: next chunk of MP3 data
+        :return: list of (FrameHeader, frame bytes) tuples, in order
+        """
+        buffer = self.buffer + data
+        offset = 0
+        frames = []
+        while True:
+            header = parse_header(buffer[offset:offset + HEADER_SIZE])
+            if header and len(buffer) - offset >= header.length:
+                frames.append(
+                    (header, buffer[offset:offset + header.length]))
+                offset += header.length
+            elif header is None and len(buffer) - offset >= HEADER_SIZE:
+                # lost sync, move on to the next candidate sync byte
+                next_sync = buffer.find(b"\xff", offset + 1)
+                offset = len(buffer) if next_sync == -1 else next_sync
+            else:
+                break
+        self.buffer = buffer[offset:]
+        return frames
+
+# One step of a granule's "global_gain" scales its amplitude by 2^(1/4)
+GAIN_STEP_DB = 1.5
+
+def write_bits(frame: bytearray, position: int, length: int, value: int):
+    """
+    Helper method, overwrite a big-endian bit field in a frame.
+    :param frame: mutable frame bytes
+    :param position: offset of the field, in bits
+    :param length: size of the field, in bits
+    :param value: new value of the field
+    """
+    for bit in range(length):
+        byte, shift = divmod(position + bit, 8)
+        mask = 0x80 >> shift
+        if value >> (length - 1 - bit) & 1:
+            frame[byte] |= mask
+        else:
+            frame[byte] &= ~mask & 0xFF
+
+def read_bits(frame: bytes, position: int, length: int) -> int:
+    """
+    Helper method, read a big-endian bit field from a frame.
+    :param frame: frame bytes
+    :param position: offset of the field, in bits
+    :param length: size of the field, in bits
+    :return: value of the field
+    """
+    value = 0
+    for bit in range(length):
+        byte, shift = divmod(position + bit, 8)
+        value = (value << 1) | (frame[byte] >> (7 - shift) & 1)
+    return value
+
+def apply_gain(frame: bytes, header: FrameHeader, steps: int) -> bytes:
+    """
+    Losslessly change the volume of a frame by adjusting the
+        "global_gain" of each granule and channel, in GAIN_STEP_DB
+        steps, like mp3gain does. Frames with a CRC are returned
+        unchanged, since the CRC covers the side information.
+    :param frame: complete frame bytes
+    :param header: parsed header of the frame
+    :param steps: number of GAIN_STEP_DB steps to add (or remove)
+    :return: adjusted frame bytes
+    """
+    if not steps or header.protected:
+        return frame
+    if header.version == MPEG1:
+        # main_data_begin, private_bits, scfsi
+        granules_offset = 9 + (5 if header.channels == 1 else 3) + (
+            4 * header.channels)
+        granules, granule_size = 2, 59
+    else:
+        granules_offset = 8 + (1 if header.channels == 1 else 2)
+        granules, granule_size = 1, 63
+    frame = bytearray(frame)
+    side_info = side_info_offset(header) * 8
+    for index in range(granules * header.channels):
+        # global_gain follows part2_3_length and big_values
+        position = (side_info + granules_offset +
+            index * granule_size + 21)
+        gain = read_bits(frame, position, 8)
+        write_bits(frame, position, 8, min(max(gain + steps, 0), 255))
+    return bytes(frame)
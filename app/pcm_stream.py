@@ -0,0 +1,612 @@
+"""
+Streaming audio engine used by the RadioController. Songs are decoded
+    in fixed-size raw PCM blocks through an ffmpeg pipe, only the
+    CROSSFADE_LENGTH overlap window is mixed in memory, and the result
+    is fed to an incremental MP3 encoder, so memory use stays bounded
+    no matter how long a track is.
+"""
+import os
+import subprocess
+import threading
+from collections import deque, namedtuple
+from pydub import AudioSegment
+
+from app import appconfig
+from app.mp3_frames import (iter_frames, main_data_begin, apply_gain,
+    is_vbr, GAIN_STEP_DB)
+
+# Raw PCM passed between decoder and encoder is always signed 16-bit
+# little endian, at the configured stream sample rate and channels
+SAMPLE_WIDTH = 2
+PCM_FORMAT = "s16le"
+
+# Size of reads from the encoder output pipe, in bytes
+ENCODER_CHUNK_SIZE = 8192
+
+# Number of frames decoded ahead of a spliced tail and then discarded,
+# so the tail's first frames can draw on the bit reservoir
+PRIMING_FRAMES = 2
+
+# Precomputed changes applied to a Song as it's rendered. gain: in dB,
+# start and end: trim points in milliseconds, end is None to play
+# through to the end of the file
+SongAdjustments = namedtuple("SongAdjustments", ["gain", "start", "end"])
+NO_ADJUSTMENTS = SongAdjustments(0.0, 0, None)
+
+# A destination for encoded audio. bitrate: in kbps, sink: callable
+# accepting each chunk of encoded bytes
+EncoderOutput = namedtuple("EncoderOutput", ["bitrate", "sink"])
+
+def ms_to_bytes(ms: int) -> int:
+    """
+    Convert a duration in milliseconds to a number of raw PCM bytes,
+        rounded down to a whole number of sample frames.
+    :param ms: duration in milliseconds
+    :return: length of that duration in bytes
+    """
+    frames = appconfig["ICECAST_SAMPLERATE"] * ms // 1000
+    return frames * appconfig["ICECAST_CHANNELS"] * SAMPLE_WIDTH
+
+def samples_to_bytes(samples: int) -> int:
+    """
+    Convert a number of samples (per channel) to raw PCM bytes.
+    :param samples: number of sample frames
+    :return: length in bytes
+    """
+    return samples * appconfig["ICECAST_CHANNELS"] * SAMPLE_WIDTH
+
+def to_segment(pcm: bytes) -> AudioSegment:
+    """
+    Wrap raw PCM bytes in a pydub AudioSegment, for mixing.
+    :param pcm: raw PCM in the stream format
+    :return: AudioSegment over the given bytes
+    """
+    return AudioSegment(
+        data=pcm,
+        sample_width=SAMPLE_WIDTH,
+        frame_rate=appconfig["ICECAST_SAMPLERATE"],
+        channels=appconfig["ICECAST_CHANNELS"]
+    )
+
+def pcm_args() -> list:
+    """
+    ffmpeg arguments describing the raw PCM stream format.
+    :return: list of ffmpeg command line arguments
+    """
+    return [
+        "-f", PCM_FORMAT,
+        "-ar", str(appconfig["ICECAST_SAMPLERATE"]),
+        "-ac", str(appconfig["ICECAST_CHANNELS"])
+    ]
+
+class PCMDecoder():
+    """
+    ffmpeg subprocess decoding an audio file into raw PCM, read
+        incrementally. The pipe applies backpressure, so ffmpeg only
+        decodes as far ahead as the reader has consumed.
+    """
+    def __init__(self, path: str,
+                 adjustments: SongAdjustments = NO_ADJUSTMENTS):
+        """
+        Start the decoding process.
+        :param path: path of the audio file to decode
+        :param adjustments: gain and trim points, applied by ffmpeg
+        """
+        args = []
+        if adjustments.start:
+            args += ["-ss", str(adjustments.start / 1000)]
+        if adjustments.end is not None:
+            args += ["-t", 
+                str((adjustments.end - adjustments.start) / 1000)]
+        args += ["-i", path]
+        if adjustments.gain:
+            args += ["-af", f"volume={adjustments.gain}dB"]
+        self.process = subprocess.Popen(
+            [AudioSegment.converter, "-v", "quiet"] + args +
+                pcm_args() + ["-"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def read(self, size: int) -> bytes:
+        """
+        Read exactly "size" bytes of PCM, or fewer at the end of the
+            file.
+        :param size: number of bytes to read
+        :return: PCM bytes, empty at end of file
+        """
+        return self.process.stdout.read(size)
+
+    def blocks(self, size: int):
+        """
+        Generator over the rest of the decoded file, in blocks.
+        :param size: block size in bytes
+        :return: iterator of PCM byte blocks
+        """
+        block = self.read(size)
+        while block:
+            yield block
+            block = self.read(size)
+
+    def close(self):
+        """
+        Stop the decoding process, whether or not it has finished.
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+
+def decode_mp3(data: bytes) -> bytes:
+    """
+    Decode a run of raw MP3 frames to PCM in a single call. Used for
+        the short, re-encoded edges of spliced Songs.
+    :param data: concatenated MP3 frames
+    :return: PCM bytes
+    """
+    return subprocess.run(
+        [AudioSegment.converter, "-v", "quiet", "-f", "mp3", "-i", "-"] +
+            pcm_args() + ["-"],
+        input=data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    ).stdout
+
+def decode_file(path: str) -> bytes:
+    """
+    Decode a (short) audio file to raw PCM in a single read. Only
+        meant for sound effects, like the "skip" sound byte.
+    :param path: path of the audio file to decode
+    :return: PCM bytes
+    """
+    decoder = PCMDecoder(path)
+    try:
+        return decoder.read(-1)
+    finally:
+        decoder.close()
+
+def adjust_frames(frames, adjustments: SongAdjustments):
+    """
+    Apply a Song's adjustments to its MP3 frames without decoding
+        them: frames outside the trim points are dropped, and the gain
+        is applied losslessly, rounded to GAIN_STEP_DB steps.
+    :param frames: iterator of (FrameHeader, frame bytes) tuples
+    :param adjustments: gain and trim points
+    :return: iterator of adjusted (FrameHeader, frame bytes) tuples
+    """
+    steps = round(adjustments.gain / GAIN_STEP_DB)
+    position = 0
+    for header, frame in frames:
+        start = header.sample_rate * adjustments.start // 1000
+        if position + header.samples <= start:
+            position += header.samples
+            continue
+        if (adjustments.end is not None and 
+                position >= header.sample_rate * adjustments.end // 1000):
+            return
+        position += header.samples
+        yield header, apply_gain(frame, header, steps)
+
+class MP3Encoder():
+    """
+    ffmpeg subprocess encoding raw PCM written to it into MP3. Encoded
+        bytes are handed to the provided sink from a reader thread as
+        soon as ffmpeg emits them.
+    """
+    def __init__(self, sink, bitrate: int = None):
+        """
+        Start the encoding process and its output reader thread.
+        :param sink: callable accepting each chunk of encoded bytes
+        :param bitrate: bitrate in kbps, ICECAST_BITRATE by default
+        """
+        self.sink = sink
+        self.error = None
+        bitrate = bitrate or appconfig["ICECAST_BITRATE"]
+        self.process = subprocess.Popen(
+            [AudioSegment.converter, "-v", "quiet"] + pcm_args() +
+                ["-i", "-", "-f", "mp3", "-b:a", f"{bitrate}k",
+                 # output is concatenated into a live stream, so no
+                 # per-segment ID3 tag or Xing header
+                 "-id3v2_version", "0", "-write_xing", "0", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self.reader_thread = threading.Thread(target=self.read_output)
+        self.reader_thread.start()
+
+    def read_output(self):
+        """
+        Reader thread, passes encoder output to the sink. If the sink
+            raises, the error is kept to be re-raised in the writing
+            thread and the encoder is killed so writes don't block.
+        """
+        try:
+            chunk = self.process.stdout.read1(ENCODER_CHUNK_SIZE)
+            while chunk:
+                self.sink(chunk)
+                chunk = self.process.stdout.read1(ENCODER_CHUNK_SIZE)
+        except Exception as err:
+            self.error = err
+            self.process.kill()
+
+    def write(self, pcm: bytes):
+        """
+        Feed raw PCM to the encoder. Blocks while ffmpeg's input pipe
+            is full.
+        :param pcm: raw PCM in the stream format
+        """
+        try:
+            self.process.stdin.write(pcm)
+        except (BrokenPipeError, ValueError):
+            if self.error:
+                raise self.error
+            raise
+
+    def close(self):
+        """
+        Flush the remaining audio through the encoder and wait for the
+            sink to receive all of it.
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.reader_thread.join()
+        self.process.stdout.close()
+        self.process.wait()
+        if self.error:
+            raise self.error
+
+    def abort(self):
+        """
+        Stop the encoder without flushing, discarding buffered audio.
+        """
+        self.process.kill()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.reader_thread.join()
+        self.process.stdout.close()
+        self.process.wait()
+
+class MultiEncoder():
+    """
+    Fan-out of the same raw PCM to one MP3Encoder per output, e.g.
+        one per Icecast mount. The encoders run in parallel, so each
+        extra output only adds its own encoding cost.
+    """
+    def __init__(self, outputs: list):
+        """
+        Start one encoder per output.
+        :param outputs: list of EncoderOutput
+        """
+        self.encoders = []
+        try:
+            for output in outputs:
+                self.encoders.append(
+                    MP3Encoder(output.sink, output.bitrate))
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, pcm: bytes):
+        """
+        Feed raw PCM to every encoder.
+        :param pcm: raw PCM in the stream format
+        """
+        for encoder in self.encoders:
+            encoder.write(pcm)
+
+    def close(self):
+        """
+        Flush every encoder. All of them are closed even if one fails,
+            then the first error is raised.
+        """
+        error = None
+        for encoder in self.encoders:
+            try:
+                encoder.close()
+            except BaseException as err:
+                error = error or err
+        if error:
+            raise error
+
+    def abort(self):
+        """
+        Stop every encoder without flushing.
+        """
+        for encoder in self.encoders:
+            encoder.abort()
+
+class CrossfadeEngine():
+    """
+    Renders consecutive Songs as crossfaded segments. Holds back the
+        last CROSSFADE_LENGTH * 2 milliseconds of each Song, to be
+        crossfaded with the beginning of the next one.
+
+    In splice mode (RADIO_SPLICE_MODE), MP3 Songs in the stream's
+        sample rate and channel count are not decoded at all except
+        for their edges: the head up to the first self-contained frame
+        after CROSSFADE_LENGTH, and the held-back tail. The frames in
+        between are passed through untouched. Each seam may carry a
+        few tens of milliseconds of encoder padding.
+    """
+    def __init__(self, skip_path: str, catalog=None):
+        """
+        Initialization actions. Preload the "skip" sound effect.
+        :param skip_path: path of the "skip" sound byte
+        :param catalog: optional SongCatalog to look up each Song's
+            precomputed gain and silence in
+        """
+        self.skip_pcm = decode_file(skip_path)
+        self.catalog = catalog
+        self.splice_mode = appconfig["RADIO_SPLICE_MODE"]
+        self.crossfade_samples = (appconfig["ICECAST_SAMPLERATE"] *
+            appconfig["CROSSFADE_LENGTH"] // 1000)
+        self.crossfade_bytes = samples_to_bytes(self.crossfade_samples)
+        self.tail_samples = 2 * self.crossfade_samples
+        self.tail_bytes = 2 * self.crossfade_bytes
+        self.block_bytes = ms_to_bytes(appconfig["RADIO_BLOCK_LENGTH"])
+
+        # if tail is None, the next segment starts with the skip
+        # sound effect instead of a crossfade
+        self.tail = None
+
+    def reset(self):
+        """
+        Drop the held-back tail, so that the next segment is
+            introduced by the "skip" sound effect.
+        """
+        self.tail = None
+
+    def lead_in(self, head: bytes) -> bytes:
+        """
+        Mix the beginning of a Song with the held-back tail of the
+            previous one, or prepend the "skip" sound effect.
+        :param head: first CROSSFADE_LENGTH milliseconds of the Song
+        :return: PCM for the start of the segment
+        """
+        head_segment = to_segment(head)
+        if self.tail:
+            tail_segment = to_segment(self.tail)
+            crossfade = min(appconfig["CROSSFADE_LENGTH"],
+                len(tail_segment), len(head_segment))
+            return tail_segment.append(
+                head_segment, crossfade=crossfade
+            ).raw_data
+        else:
+            return self.skip_pcm + head
+
+    def get_adjustments(self, song_path: str) -> SongAdjustments:
+        """
+        Look up the adjustments of a Song analyzed by the catalog:
+            its gain towards SONG_TARGET_LOUDNESS, and trim points
+            which cut off leading and trailing silence, so the 
+            crossfade overlaps actual audio.
+        :param song_path: path of the Song file
+        :return: SongAdjustments, NO_ADJUSTMENTS if not analyzed
+        """
+        entry = (self.catalog.get(os.path.basename(song_path))
+            if self.catalog else None)
+        if entry is None or entry.gain is None:
+            return NO_ADJUSTMENTS
+        return SongAdjustments(
+            gain=entry.gain,
+            start=entry.lead_silence,
+            end=(entry.duration - entry.trail_silence 
+                if entry.trail_silence else None)
+        )
+
+    def prepare(self, song_path: str) -> "PreparedSong":
+        """
+        Open a Song for rendering and decode its head. This is the
+            part of rendering with the most latency, so it can be done
+            ahead of time, e.g. by the SongPrefetcher.
+        :param song_path: path of the Song file to prepare
+        :return: PreparedSong, which must be rendered or closed
+        """
+        adjustments = self.get_adjustments(song_path)
+        song = PreparedSong(song_path)
+        try:
+            if not (self.splice_mode and
+                    self.prepare_spliced(song, adjustments)):
+                song.decoder = PCMDecoder(song_path, adjustments)
+                song.head = song.decoder.read(self.crossfade_bytes)
+        except BaseException:
+            song.close()
+            raise
+        return song
+
+    def render(self, song, outputs: list):
+        """
+        Render one segment: the crossfade with the previous Song and
+            everything but the last CROSSFADE_LENGTH * 2 milliseconds
+            of the given one, which is kept as the next tail.
+        :param song: PreparedSong, or path of the Song file to render
+        :param outputs: list of EncoderOutput to encode the segment
+            to. Spliced Songs are already encoded at ICECAST_BITRATE,
+            so only the first output gets those
+        """
+        if isinstance(song, str):
+            song = self.prepare(song)
+        try:
+            if song.decoder:
+                self.render_pcm(song, outputs)
+            else:
+                self.render_spliced(song, outputs[0].sink)
+        finally:
+            song.close()
+
+    def write_pcm(self, encoder, pcm: bytes):
+        """
+        Helper method, encode a fully decoded Song (or what's left of
+            one) after its head, keeping its end as the next tail.
+        :param encoder: MP3Encoder or MultiEncoder to write the 
+            segment to
+        :param pcm: decoded Song, starting with its head
+        :return: PCM of the new tail
+        """
+        split = max(len(pcm) - self.tail_bytes, 0)
+        encoder.write(self.lead_in(pcm[:self.crossfade_bytes]) +
+            pcm[self.crossfade_bytes:split])
+        return pcm[max(split, self.crossfade_bytes):]
+
+    def render_pcm(self, song: "PreparedSong", outputs: list):
+        """
+        Render a segment by decoding the whole Song. Only one block
+            plus the tail is ever held in memory, however many outputs
+            it's encoded to.
+        :param song: PreparedSong with a running decoder
+        :param outputs: list of EncoderOutput
+        """
+        encoder = MultiEncoder(outputs)
+        try:
+            encoder.write(self.lead_in(song.head))
+            holdback = bytearray()
+            for block in song.decoder.blocks(self.block_bytes):
+                holdback += block
+                if len(holdback) > self.tail_bytes:
+                    encoder.write(bytes(holdback[:-self.tail_bytes]))
+                    del holdback[:-self.tail_bytes]
+            encoder.close()
+        except BaseException:
+            encoder.abort()
+            raise
+        self.tail = bytes(holdback)
+
+    def spliceable(self, header) -> bool:
+        """
+        Check whether a Song's frame can be passed through as-is. The
+            bitrate has to match too, or the mount would carry more
+            (or less) data than it advertises and buffers for.
+        :param header: FrameHeader of one of the Song's frames
+        :return: True if the frame matches the stream format
+        """
+        return (header.sample_rate == appconfig["ICECAST_SAMPLERATE"]
+            and header.channels == appconfig["ICECAST_CHANNELS"]
+            and header.bitrate == appconfig["ICECAST_BITRATE"])
+
+    def prepare_spliced(self, song: "PreparedSong", 
+                        adjustments: SongAdjustments) -> bool:
+        """
+        Prepare a Song for splicing: read and decode its head, which is
+            at least CROSSFADE_LENGTH long and extends up to a frame
+            which doesn't borrow from the bit reservoir, so that the
+            body can follow the re-encoded head cleanly. Songs tagged
+            as VBR, or with a head frame that doesn't match the stream
+            format, are rendered from PCM instead.
+        :param song: PreparedSong to fill in
+        :param adjustments: gain and trim points, applied to frames
+        :return: False if the Song can't be spliced
+        """
+        song.song_fp = open(song.path, "rb")
+        vbr = is_vbr(song.song_fp)
+        song.song_fp.seek(0)
+        song.frames = adjust_frames(iter_frames(song.song_fp), 
+            adjustments)
+        head = bytearray()
+        head_samples = 0
+        for header, frame in song.frames:
+            if vbr or not self.spliceable(header):
+                head.clear()
+                break
+            if (head_samples >= self.crossfade_samples and 
+                    main_data_begin(frame, header) == 0):
+                song.first_body_frame = (header, frame)
+                break
+            head += frame
+            head_samples += header.samples
+        if not head:
+            song.close()
+            song.song_fp = song.frames = None
+            return False
+        song.head = decode_mp3(head)
+        return True
+
+    def render_spliced(self, song: "PreparedSong", sink):
+        """
+        Render a segment by re-encoding only the edges of the Song,
+            and passing the MP3 frames in between straight through.
+        :param song: PreparedSong with its head read by prepare_spliced
+        :param sink: callable accepting each chunk of encoded bytes
+        """
+        encoder = MP3Encoder(sink)
+        try:
+            if song.first_body_frame is None:
+                # the whole Song fit in the head
+                tail = self.write_pcm(encoder, song.head)
+                encoder.close()
+                self.tail = tail
+                return
+            encoder.write(self.lead_in(song.head))
+            encoder.close()
+        except BaseException:
+            encoder.abort()
+            raise
+
+        # body: pass frames through, holding back enough of them
+        # to decode the tail with some priming frames
+        holdback = deque([song.first_body_frame])
+        held_samples = song.first_body_frame[0].samples
+        for header, frame in song.frames:
+            holdback.append((header, frame))
+            held_samples += header.samples
+            while (held_samples - holdback[0][0].samples >= 
+                    self.tail_samples + 
+                    PRIMING_FRAMES * header.samples):
+                passed_header, passed_frame = holdback.popleft()
+                held_samples -= passed_header.samples
+                sink(passed_frame)
+
+        # tail: the last frames covering CROSSFADE_LENGTH * 2, decoded
+        # along with the frames just before it, which are dropped
+        holdback = list(holdback)
+        split = len(holdback)
+        tail_samples = 0
+        while split > 0 and tail_samples < self.tail_samples:
+            split -= 1
+            tail_samples += holdback[split][0].samples
+        priming = min(split, PRIMING_FRAMES)
+        for _, passed_frame in holdback[:split]:
+            sink(passed_frame)
+        pcm = decode_mp3(b"".join(
+            frame for _, frame in holdback[split - priming:]
+        ))
+        self.tail = pcm[samples_to_bytes(sum(
+            header.samples for header, _ in 
+            holdback[split - priming:split]
+        )):]
+
+class PreparedSong():
+    """
+    A Song opened for rendering, with its head already decoded. The
+        rest is decoded (or spliced) while it's rendered.
+    """
+    def __init__(self, path: str):
+        """
+        Initialization actions.
+        :param path: path of the Song file
+        """
+        self.path = path
+        # decoded PCM of the start of the Song
+        self.head = b""
+        # PCM mode: decoder positioned after the head
+        self.decoder = None
+        # splice mode: open file, frame iterator positioned after the
+        # head, and the first frame after the head (None if the whole
+        # Song fit in the head)
+        self.song_fp = None
+        self.frames = None
+        self.first_body_frame = None
+
+    def close(self):
+        """
+        Release the decoder or file held by this Song.
+        """
+        if self.decoder:
+            self.decoder.close()
+        if self.song_fp:
+            self.song_fp.close()
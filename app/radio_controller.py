@@ -13,13 +13,37 @@ import random
 import shout
 import threading
 import queue
-from io import BytesIO
-from pydub import AudioSegment
+import multiprocessing
+from collections import namedtuple
 from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
 
-from app import flaskapp, db, appconfig, constants
+from app import flaskapp, db, appconfig, constants, songcatalog
+from app import eventserver
 from app.models import Song
+from app.pcm_stream import CrossfadeEngine, EncoderOutput
+from app.radio_mount import Mount
+from app.segment_buffer import SegmentInterrupted
+from app.song_prefetch import SongPrefetcher
+
+# indices of the playing song's vote counters in "song_votes"
+HEARTS = 0
+BROKENHEARTS = 1
+SKIPPED = 2
+# message on "skip_requests" asking for a skip, and the one stopping
+# the "relay_skips" thread
+SKIP_REQUEST = "skip"
+STOP_RELAY = None
+# message on "metadata_queue" stopping the "push_metadata" thread
+STOP_METADATA = None
+# event server channel of song changes, vote tallies and skips
+RADIO_CHANNEL = "radio"
+
+# snapshot of the song "gen_songs" last started, queuer fields are
+# None for Otto picks, started_time is a UNIX timestamp
+NowPlaying = namedtuple("NowPlaying", [
+    "song_id", "uri", "user_id", "username", "started_time"
+])
 
 class RadioController():
     """
@@ -27,132 +51,241 @@ class RadioController():
     """
     def __init__(self): 
         """
-        Initialization actions. Create Shout object with parameters
-            from appconfig.
-        """
-        self.stream_obj = shout.Shout()
-
-        # I could do some eldritch "exec()" calls here to set all
-        # these, but that's too much to avoid a dozen lines of 
-        # longhand. this is a good library, but boo to the dev
-        # for not providing a way to pass all these settings
-        # as a dict or something
-
-        self.stream_obj.host = appconfig["ICECAST_HOST"]
-        self.stream_obj.port = appconfig["ICECAST_PORT"]
-        self.stream_obj.mount = appconfig["ICECAST_MOUNTPOINT"]
-        self.stream_obj.user = appconfig["ICECAST_USERNAME"]
-        self.stream_obj.password = appconfig["ICECAST_PASSWORD"]
-        self.stream_obj.format = appconfig["ICECAST_FORMAT"]
-        self.stream_obj.protocol = appconfig["ICECAST_PROTOCOL"]
-        self.stream_obj.name = appconfig["ICECAST_NAME"]
-        self.stream_obj.genre = appconfig["ICECAST_GENRE"]
-        self.stream_obj.url = appconfig["ICECAST_URL"]
-        self.stream_obj.audioinfo = {
-            shout.SHOUT_AI_BITRATE: str(appconfig["ICECAST_BITRATE"]),
-            shout.SHOUT_AI_SAMPLERATE: str(
-                appconfig["ICECAST_SAMPLERATE"]),
-            shout.SHOUT_AI_CHANNELS: str(appconfig["ICECAST_CHANNELS"])
-        }
-
-        self.stream_thread = None
+        Initialization actions. Create a Mount, with its Shout object,
+            for ICECAST_MOUNTPOINT and each of ICECAST_EXTRA_MOUNTS.
+        """
         self.gen_songs_thread = None
-
-        self.segment_queue = queue.Queue()
-
-        # "gen_songs" will respond to skip_signal, clearing
-        # the queue and generating an uncrossfaded next track
-        # featuring the "skip" sound byte. It'll then set the 
-        # stream_skip_subsignal to signal the "stream" thread
-        # to skip to the next song on the queue
+        self.relay_skips_thread = None
+        self.push_metadata_thread = None
+
+        # the playing song, replaced whole by "iterate_playing_song",
+        # so views can read it without querying for it
+        self.now_playing = None
+
+        # metadata updates, pushed to the mounts off the "gen_songs"
+        # thread since they're round trips to the Icecast server
+        self.metadata_queue = queue.Queue()
+
+        # "gen_songs" will respond to skip_signal, abandoning the
+        # segment it's rendering, dropping everything buffered and
+        # generating an uncrossfaded next track featuring the "skip"
+        # sound byte. The "stream" thread drops any chunk it already
+        # holds from before the skip
         self.skip_signal = threading.Event()
-        self.stream_skip_subsignal = threading.Event()
         self.kill_signal = threading.Event()
 
+        # Hearts and BrokenHearts of the playing song, and whether it
+        # has already been skipped, updated as votes come in. Skips
+        # are requested through a pipe, relayed to "skip_signal" by
+        # the "relay_skips" thread. Both are shared with processes
+        # forked after this one, e.g. the test server, since votes may
+        # be cast there
+        self.song_votes = multiprocessing.Array("i", 3)
+        self.skip_requests = multiprocessing.SimpleQueue()
+
+        # the main mount first. Each has its own segment buffer and
+        # "stream" thread, fed by its own encoder
+        self.mounts = [
+            Mount(mountpoint, bitrate, self.skip_signal, self.kill_signal)
+            for mountpoint, bitrate in [(
+                appconfig["ICECAST_MOUNTPOINT"],
+                appconfig["ICECAST_BITRATE"]
+            )] + [(
+                mount["mountpoint"], mount["bitrate"]
+            ) for mount in appconfig["ICECAST_EXTRA_MOUNTS"]]
+        ]
+
+        # prepares upcoming songs ahead of time, created along with 
+        # the crossfade engine by "gen_songs"
+        self.prefetcher = None
+
     def startup(self):
         """
-        Startup actions. Connects shout object and starts stream 
-            thread.
+        Startup actions. Starts the radio threads. Each mount's 
+            "stream" thread connects its shout object, and keeps
+            reconnecting whenever the connection is lost.
         """
         flaskapp.logger.info("Starting radio controller thread")
-        stream_opened = False
-        stream_connected = False
-        self.gen_songs_thread = self.stream_thread = self.monitor_skip_thread = None
-        tries = 0
-        while not stream_connected:
-            try:
-                if not stream_opened:
-                    err_code = self.stream_obj.open() 
-                    flaskapp.logger.info(f"open resp: {err_code}")
-                    # This method actually returns 1 on success
-                    stream_opened = (
-                        err_code == 1
-                    )
-                if stream_opened:
-                    err_code = self.stream_obj.get_connected()
-                    flaskapp.logger.info(f"connect resp: {err_code}")
-                    stream_connected = (
-                        err_code == shout.SHOUTERR_CONNECTED
-                    )
-            except Exception as e:
-                err_code = f"{type(e).__name__}: {str(e)}"
-            if not stream_connected:
-                tries += 1
-                if tries >= 3:
-                    flaskapp.logger.error(
-                        "Unable to start Shout stream.\nOpened: " +
-                        f"{'true' if stream_opened else 'false'}" +
-                        "\nConnected: " + 
-                        f"{'true' if stream_connected else 'false'}" +
-                        f"\nError Code: {err_code}"
-                    )
-                    return
-                time.sleep(0.5)
+        self.start_threads()
+
+    def start_threads(self):
+        """
+        Start the "gen_songs" and "relay_skips" threads, and each
+            mount's "stream" thread.
+        """
+        for mount in self.mounts:
+            mount.drop_when_disconnected = len(self.mounts) > 1
 
         self.gen_songs_thread = threading.Thread(
             target=self.gen_songs
         )
         self.gen_songs_thread.start()
 
-        self.stream_thread = threading.Thread(
-            target=self.stream
+        for mount in self.mounts:
+            mount.start()
+
+        self.relay_skips_thread = threading.Thread(
+            target=self.relay_skips
         )
-        self.stream_thread.start()
+        self.relay_skips_thread.start()
 
-        self.monitor_skip_thread = threading.Thread(
-            target=self.monitor_skip
+        self.push_metadata_thread = threading.Thread(
+            target=self.push_metadata
         )
-        self.monitor_skip_thread.start()
+        self.push_metadata_thread.start()
 
     def shutdown(self):
         """
         Shutdown actions. Stops running threads.
         """
         self.kill_signal.set()
+        for mount in self.mounts:
+            mount.segment_queue.wake()
         if self.gen_songs_thread:
             self.gen_songs_thread.join()
-        if self.stream_thread:
-            self.stream_thread.join()
-        if self.monitor_skip_thread:
-            self.monitor_skip_thread.join()
-        
-        try:
-            self.stream_obj.close()
-        except shout.ShoutException:
-            pass
+        if self.relay_skips_thread:
+            self.skip_requests.put(STOP_RELAY)
+            self.relay_skips_thread.join()
+        if self.push_metadata_thread:
+            self.metadata_queue.put(STOP_METADATA)
+            self.push_metadata_thread.join()
+        for mount in self.mounts:
+            mount.shutdown()
 
     def skip_song(self):
         """
-        Convenience method to skip song. Sets "skip_signal" Event
-            object.
+        Convenience method to skip song. Asks the "relay_skips" 
+            thread to set the "skip_signal" Event object, so it works
+            from any process.
+        """
+        self.skip_requests.put(SKIP_REQUEST)
+
+    def relay_skips(self):
+        """
+        Thread which waits for skip requests, then sets "skip_signal"
+            and wakes "gen_songs" if it's blocked on a full segment
+            buffer.
         """
-        self.skip_signal.set()
+        while self.skip_requests.get() == SKIP_REQUEST:
+            self.skip_signal.set()
+            eventserver.publish(RADIO_CHANNEL, "skip", {})
+            for mount in self.mounts:
+                mount.segment_queue.wake()
+
+    def push_metadata(self):
+        """
+        Thread which sends metadata updates to every mount. Only the 
+            latest of any pending updates is sent.
+        """
+        metadata = self.metadata_queue.get()
+        while metadata is not STOP_METADATA:
+            while not self.metadata_queue.empty():
+                metadata = self.metadata_queue.get()
+                if metadata is STOP_METADATA:
+                    return
+            for mount in self.mounts:
+                mount.set_metadata(metadata)
+            metadata = self.metadata_queue.get()
+
+    def get_now_playing(self) -> dict:
+        """
+        Get the now-playing snapshot, with the playing song's live
+            vote counts and the next song lined up.
+        :return: dict of NowPlaying fields plus "hearts", 
+            "brokenhearts" and "next_uri", or None if no song is
+            playing or the radio isn't running in this process, e.g.
+            in a forked server process
+        """
+        now_playing = self.now_playing
+        if not (now_playing and self.gen_songs_thread and
+                self.gen_songs_thread.is_alive()):
+            return None
+        with self.song_votes.get_lock():
+            hearts, brokenhearts, _ = self.song_votes[:]
+        return {
+            **now_playing._asdict(),
+            "hearts": hearts,
+            "brokenhearts": brokenhearts,
+            "next_uri": (self.prefetcher.upcoming_uri()
+                if self.prefetcher else None)
+        }
+
+    def record_vote(self, hearts: int, brokenhearts: int):
+        """
+        Update the playing song's vote counters, and skip it once its
+            BrokenHearts outnumber its Hearts by BROKENHEARTS_TO_SKIP.
+            Called by the Song vote views, once the vote is committed.
+        :param hearts: change in the number of Hearts
+        :param brokenhearts: change in the number of BrokenHearts
+        """
+        with self.song_votes.get_lock():
+            self.song_votes[HEARTS] += hearts
+            self.song_votes[BROKENHEARTS] += brokenhearts
+            self.publish_votes()
+            if self.song_votes[SKIPPED] or (
+                    self.song_votes[BROKENHEARTS] - 
+                    self.song_votes[HEARTS] <
+                    appconfig["BROKENHEARTS_TO_SKIP"]):
+                return
+            self.song_votes[SKIPPED] = 1
+        flaskapp.logger.info("Skipping song...")
+        self.skip_song()
+
+    def reset_votes(self):
+        """
+        Helper method, zero the vote counters when a new song starts
+            playing. Songs can only be voted on while playing, so a 
+            new one never has any votes yet.
+        """
+        with self.song_votes.get_lock():
+            self.song_votes[:] = [0, 0, 0]
+            self.publish_votes()
+
+    def publish_votes(self):
+        """
+        Helper method, publish the playing song's vote tally to the 
+            event server. Called with the "song_votes" lock held, so
+            tallies are published in the order they were counted.
+        """
+        eventserver.publish(RADIO_CHANNEL, "votes", {
+            "hearts": self.song_votes[HEARTS],
+            "brokenhearts": self.song_votes[BROKENHEARTS]
+        }, retain=True)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the radio's metrics, e.g. for monitoring.
+        :return: dict with a list of per-mount connection and pacing
+            metrics
+        """
+        return {
+            "mounts": [mount.stats() for mount in self.mounts]
+        }
+
+    def invalidate_prefetch(self):
+        """
+        Convenience method to reconcile prefetched songs with the 
+            queue, e.g. after a song is queued.
+        """
+        if self.prefetcher:
+            self.prefetcher.invalidate()
+
+    def pick_otto_uri(self) -> str:
+        """
+        Helper method, pick a random song from the song catalog to
+            autoplay. Falls back to listing the songs dir if the 
+            catalog hasn't been built yet.
+        :return: name of file in songs directory
+        """
+        return (songcatalog.random_uri() or
+            random.choice(os.listdir(appconfig["SONG_PATH"])))
 
     def get_next_song_file(self):
         """
         Helper method for "gen_songs", queries database for oldest
             queued Song and returns its local filename. If no songs 
-            are queued, returns a random song from the songs dir.
+            are queued, returns a random song from the songs dir,
+            preferring the one already prefetched.
         :return: name of file in songs directory
         """
         with flaskapp.app_context(), Session(db.engine) as session:
@@ -169,8 +302,8 @@ class RadioController():
         if queued_song:
             return queued_song.uri
         else:
-            otto_uri = random.choice(
-                os.listdir(appconfig["SONG_PATH"]))
+            otto_uri = (self.prefetcher.next_otto_uri() 
+                if self.prefetcher else self.pick_otto_uri())
             song_added = False
             tries = 0
             while not song_added:
@@ -198,7 +331,8 @@ class RadioController():
         """
         Helper method for "gen_songs", change the status of any songs
             marked "playing" to "played", then change the oldest 
-            queued song status to "playing"
+            queued song status to "playing", and snapshot it as the
+            now-playing song, which is published to the event server
         """
         try:
             with flaskapp.app_context(), Session(db.engine) as session:
@@ -216,123 +350,92 @@ class RadioController():
                         Song.status_updated_time.asc()
                     )
                 ).first()
+                now_playing = None
                 if next_song:
                     next_song.status = constants.PLAYING_SONG
+                    now_playing = NowPlaying(
+                        song_id=next_song.song_id,
+                        uri=next_song.uri,
+                        user_id=next_song.user_id,
+                        username=(next_song.user.username
+                            if next_song.user else None),
+                        started_time=time.time()
+                    )
                 session.commit()
+            self.reset_votes()
+            self.now_playing = now_playing
+            eventserver.publish(RADIO_CHANNEL, "song", 
+                self.get_now_playing(), retain=True)
         except OperationalError as e:
             flaskapp.logger.error(f"OperationalError in " +
                 f"iterate_playing_song: {str(e)}")
 
     def gen_songs(self):
         """
-        Thread which monitors the segment queue and generates the next
-            song when it's empty. In practice, this means that there
-            will be a one-song buffer between the current song and
-            any newly queued one. Chops off last CROSSFADE_LENGTH * 2
-            seconds of the song to be crossfaded with the next one.
+        Thread which renders songs one after another into the segment
+            buffer. Writes block while the buffer is full, so the next
+            song is only picked (and marked as playing) once the 
+            current one has been almost entirely handed to the stream.
+            Songs are rendered block by block by the CrossfadeEngine,
+            which holds back the last CROSSFADE_LENGTH * 2 
+            milliseconds of each song to be crossfaded with the next
+            one. The mixed PCM is encoded once per mount.
         """
+        # splicing produces audio already encoded at the main mount's
+        # bitrate, so it's only used with a single mount
+        fan_out = len(self.mounts) > 1
+        if fan_out and appconfig["RADIO_SPLICE_MODE"]:
+            flaskapp.logger.warning("Splice mode is disabled while " +
+                "streaming to several mounts")
         try:
-            # split the current track a bit from the end and save
-            # the last bit, to crossfade with the next track
-            curr_song_file = ""
-            curr_song_end = None
-
-            # append new segment files to this, and always
-            # delete all files except the last two (i.e. the 
-            # one currently being played by "stream" and the one that
-            # was just created
-            segment_files = []
-
-            # preload "skip" sound effect
-            skip_segment = AudioSegment.from_file(
-                appconfig["SKIP_MP3_PATH"],
-                format="mp3",
-                sample_width=appconfig["ICECAST_BITRATE"] // 64,
-                frame_rate=appconfig["ICECAST_SAMPLERATE"],
-                channels=appconfig["ICECAST_CHANNELS"]
-            )
+            # the engine holds back the end of each track, to 
+            # crossfade with the next one, and preloads the "skip"
+            # sound effect. Gain and silence trimming come from the
+            # catalog's precomputed analysis
+            engine = CrossfadeEngine(
+                appconfig["SKIP_MP3_PATH"], songcatalog)
+            engine.splice_mode = (appconfig["RADIO_SPLICE_MODE"] and
+                not fan_out)
+            outputs = [EncoderOutput(mount.bitrate, 
+                mount.segment_queue.put) for mount in self.mounts]
+            self.prefetcher = SongPrefetcher(
+                engine.prepare, self.pick_otto_uri)
+            self.prefetcher.invalidate()
 
             while not self.kill_signal.is_set():
-                # queue is empty, generate the next track
-                if self.segment_queue.empty():
-                    # Sleep until the crossfade begins, then iterate
-                    # playing song. I could break that off into a
-                    # separate thread, but I don't really want
-                    # to increase the complexity more than I have to,
-                    # plus it's good to give more CPU time
-                    # to the other thread when it's switching
-
-                    # if curr_song_end is None, indicates a skip
-                    # so no sleep
-                    if curr_song_end:
-                        time.sleep(appconfig["CROSSFADE_LENGTH"] / 1000)
-
-                    next_song_file = self.get_next_song_file()
-                    self.iterate_playing_song()
-                    flaskapp.logger.info(f"Generating segment for " +
-                                        f"{next_song_file}...")
-                    self.stream_obj.set_metadata({
-                        "song": os.path.splitext(
-                            curr_song_file
-                        )[0]
-                    })
-                    next_song = AudioSegment.from_file(
-                        os.path.join(
-                            appconfig["SONG_PATH"],
-                            next_song_file
-                        ),
-                        format="mp3",
-                        # 1 - 64-bit, 2 - 128-byte, etc...
-                        sample_width=appconfig["ICECAST_BITRATE"] // 64,
-                        frame_rate=appconfig["ICECAST_SAMPLERATE"],
-                        channels=appconfig["ICECAST_CHANNELS"]
+                next_song_file = self.get_next_song_file()
+                self.iterate_playing_song()
+                flaskapp.logger.info(f"Generating segment for " +
+                                    f"{next_song_file}...")
+                self.metadata_queue.put({
+                    "song": os.path.splitext(
+                        next_song_file
+                    )[0]
+                })
+
+                # decode, crossfade and encode the track block by
+                # block, straight into the segment buffers. If there
+                # is no held-back tail, a Skip signal has been
+                # recieved (or it's just starting, and imo the skip
+                # sound effect can play then too)
+                for mount in self.mounts:
+                    mount.segment_queue.begin_segment()
+                try:
+                    engine.render(
+                        self.prefetcher.take(next_song_file),
+                        outputs
                     )
-                    next_song_start = next_song[
-                        :-2 * appconfig["CROSSFADE_LENGTH"]]
-                    next_song_end = next_song[
-                        -2 * appconfig["CROSSFADE_LENGTH"]:]
-
-                    segment_file = None
-                    while (not segment_file or 
-                            os.path.exists(segment_file)):
-                        segment_file = os.path.join(
-                            appconfig["TMP_PATH"], uuid.uuid1().hex
-                        )
-                    if curr_song_end:
-                        curr_song_end.append(
-                            next_song_start,
-                            crossfade=appconfig["CROSSFADE_LENGTH"]
-                        ).export(segment_file, format="mp3")
-                    # if curr_song_end is none, a Skip signal has been
-                    # recieved (or it's just starting, and imo the skip
-                    # sound effect can play then too)
-                    else:
-                        skip_segment.append(next_song_start).export(
-                            segment_file, format="mp3")
-                    self.segment_queue.put(segment_file)
-                    
-                    segment_files.append(segment_file)
-                    for played_file in segment_files[:-2]:
-                        try:
-                            os.remove(played_file)
-                        except FileNotFoundError:
-                            pass
-                    segment_files = segment_files[-2:]
-
-                    curr_song_end = next_song_end
-                    curr_song_file = next_song_file
-
-                # on skip, clear the queue and signal the "stream" thread
-                # to skip its current segment
+                except SegmentInterrupted:
+                    pass
+
+                # on skip, drop the rest of the current track and 
+                # everything buffered
                 if self.skip_signal.is_set():
-                    curr_song_end = None
-                    while not self.segment_queue.empty():
-                        try:
-                            self.segment_queue.get_nowait()
-                        except queue.Empty:
-                            pass
-                    self.stream_skip_subsignal.set()
+                    engine.reset()
+                    for mount in self.mounts:
+                        mount.segment_queue.skip()
                     self.skip_signal.clear()
+                    self.prefetcher.invalidate()
 
         except Exception as err:
             _, _, exc_tb = sys.exc_info()
@@ -341,57 +444,6 @@ class RadioController():
                     err.__class__.__name__, 
                     err.__class__.__name__, 
                     str(err), exc_tb.tb_lineno))
-
-    def stream(self):
-        CHUNK_SIZE = 8192
-
-        try:
-            while not self.kill_signal.is_set():
-                try:
-                    segment = self.segment_queue.get_nowait()
-                except queue.Empty:
-                    continue
-                current_seg_fp = open(segment, "rb")
-                byte_chunk = current_seg_fp.read(CHUNK_SIZE)
-                while 1:
-                    next_byte_chunk = current_seg_fp.read(CHUNK_SIZE)
-                    self.stream_obj.send(byte_chunk)
-
-                    # break out of immediate loop when receiving skip
-                    if len(next_byte_chunk) == 0:
-                        break
-
-                    if self.stream_skip_subsignal.is_set():
-                        self.stream_skip_subsignal.clear()
-                        break
-
-                    if self.kill_signal.is_set():
-                        break
-
-                    byte_chunk = next_byte_chunk
-                    self.stream_obj.sync()
-        except Exception as err:
-            _, _, exc_tb = sys.exc_info()
-            flaskapp.logger.error("Error in stream: " +
-                "%s: %s: %s at line %d" % (
-                    err.__class__.__name__, 
-                    err.__class__.__name__, 
-                    str(err), exc_tb.tb_lineno))
-
-    def monitor_skip(self):
-        while not self.kill_signal.is_set():
-            with flaskapp.app_context(), Session(db.engine) as session:
-                try:
-                    playing_song = session.scalars(
-                        db.select(Song).filter_by(
-                            status=constants.PLAYING_SONG
-                        )
-                    ).first()
-                    if playing_song and (
-                            len(playing_song.broken_hearted_users) -
-                            len(playing_song.hearted_users) >=
-                            appconfig["BROKENHEARTS_TO_SKIP"]):
-                        self.skip_song()
-                except OperationalError:
-                    pass
-                time.sleep(appconfig["MONITOR_SKIP_SLEEP"])
+        finally:
+            if self.prefetcher:
+                self.prefetcher.shutdown()
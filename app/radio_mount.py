@@ -0,0 +1,319 @@
+"""
+One Icecast mount of the radio. Every mount gets the same crossfaded
+    PCM from the RadioController's "gen_songs" thread, encoded at its
+    own bitrate, and sends it over its own Shout connection from its
+    own "stream" thread.
+"""
+import sys
+import time
+import queue
+import shout
+import threading
+from collections import deque
+
+from app import flaskapp, appconfig
+from app.segment_buffer import SegmentBuffer
+from app.stream_pacer import StreamPacer
+from app.mp3_frames import FrameSplitter
+
+# Maximum size of chunks buffered for the Icecast server, in bytes
+STREAM_CHUNK_SIZE = 8192
+# Longest time the "stream" thread blocks waiting for a chunk before
+# rechecking its signals, in seconds
+STREAM_WAIT_TIMEOUT = 1
+
+# connection states of a Mount
+MOUNT_CONNECTED = "connected"
+MOUNT_DISCONNECTED = "disconnected"
+
+class Mount():
+    """
+    Object holding a mount's Shout connection, the buffer of encoded
+        audio waiting to be sent to it, and its audio clock.
+    """
+    def __init__(self, mountpoint: str, bitrate: int,
+                 skip_signal: threading.Event,
+                 kill_signal: threading.Event):
+        """
+        Initialization actions. Create Shout object with parameters
+            from appconfig.
+        :param mountpoint: Icecast mountpoint
+        :param bitrate: bitrate of the mount, in kbps
+        :param skip_signal: RadioController's skip signal, which
+            interrupts writes to the buffer
+        :param kill_signal: RadioController's kill signal, which stops
+            the "stream" thread
+        """
+        self.mountpoint = mountpoint
+        self.bitrate = bitrate
+        self.kill_signal = kill_signal
+        self.stream_obj = shout.Shout()
+
+        # I could do some eldritch "exec()" calls here to set all
+        # these, but that's too much to avoid a dozen lines of
+        # longhand. this is a good library, but boo to the dev
+        # for not providing a way to pass all these settings
+        # as a dict or something
+
+        self.stream_obj.host = appconfig["ICECAST_HOST"]
+        self.stream_obj.port = appconfig["ICECAST_PORT"]
+        self.stream_obj.mount = mountpoint
+        self.stream_obj.user = appconfig["ICECAST_USERNAME"]
+        self.stream_obj.password = appconfig["ICECAST_PASSWORD"]
+        self.stream_obj.format = appconfig["ICECAST_FORMAT"]
+        self.stream_obj.protocol = appconfig["ICECAST_PROTOCOL"]
+        self.stream_obj.name = appconfig["ICECAST_NAME"]
+        self.stream_obj.genre = appconfig["ICECAST_GENRE"]
+        self.stream_obj.url = appconfig["ICECAST_URL"]
+        self.stream_obj.audioinfo = {
+            shout.SHOUT_AI_BITRATE: str(bitrate),
+            shout.SHOUT_AI_SAMPLERATE: str(
+                appconfig["ICECAST_SAMPLERATE"]),
+            shout.SHOUT_AI_CHANNELS: str(appconfig["ICECAST_CHANNELS"])
+        }
+
+        # ring of encoded chunks between "gen_songs" and "stream".
+        # Writes block while it's full, and are interrupted on skip
+        # or kill
+        self.segment_queue = SegmentBuffer(
+            # same duration of audio at any bitrate
+            appconfig["RADIO_BUFFER_SIZE"] * bitrate //
+                appconfig["ICECAST_BITRATE"],
+            STREAM_CHUNK_SIZE,
+            [skip_signal, kill_signal]
+        )
+
+        # audio clock of the "stream" thread, with its underrun and
+        # overrun counters
+        self.pacer = StreamPacer(appconfig["RADIO_STREAM_LEAD"] / 1000)
+
+        self.stream_thread = None
+
+        # frames split from chunks taken from the segment buffer, as
+        # (segment_id, FrameHeader, frame) tuples, and a send that
+        # failed. Both are kept across reconnects
+        self.splitter = FrameSplitter()
+        self.splitter_segment = None
+        self.pending = deque()
+        self.unsent = None
+        self.metadata = None
+
+        # connection metrics. Time in outage counts from "start" until
+        # the first connection, and from each failure until the next
+        self.stats_lock = threading.Lock()
+        self.state = MOUNT_DISCONNECTED
+        self.outage_start = None
+        self.outage_seconds = 0.0
+        self.connects = 0
+        self.reconnects = 0
+        self.last_error = None
+        # set by the RadioController when other mounts share the
+        # audio, so that an outage here doesn't hold them back
+        self.drop_when_disconnected = False
+
+    def connect(self) -> bool:
+        """
+        Try to open the Shout connection once. On success, the outage
+            ends and the buffered audio is resumed where it stopped.
+        :return: True if connected
+        """
+        stream_opened = False
+        stream_connected = False
+        try:
+            err_code = self.stream_obj.open()
+            flaskapp.logger.info(f"open resp: {err_code}")
+            # This method actually returns 1 on success
+            stream_opened = (
+                err_code == 1
+            )
+            if stream_opened:
+                err_code = self.stream_obj.get_connected()
+                flaskapp.logger.info(f"connect resp: {err_code}")
+                stream_connected = (
+                    err_code == shout.SHOUTERR_CONNECTED
+                )
+        except Exception as e:
+            err_code = f"{type(e).__name__}: {str(e)}"
+        if not stream_connected:
+            self.last_error = str(err_code)
+            flaskapp.logger.error(
+                f"Unable to start Shout stream {self.mountpoint}." +
+                "\nOpened: " +
+                f"{'true' if stream_opened else 'false'}" +
+                "\nConnected: " +
+                f"{'true' if stream_connected else 'false'}" +
+                f"\nError Code: {err_code}"
+            )
+            self.close()
+            return False
+
+        with self.stats_lock:
+            if self.outage_start is not None:
+                self.outage_seconds += (
+                    time.monotonic() - self.outage_start)
+                self.outage_start = None
+            if self.connects:
+                self.reconnects += 1
+            self.connects += 1
+            self.state = MOUNT_CONNECTED
+        self.segment_queue.set_dropping(False)
+        self.pacer.restart()
+        if self.metadata:
+            self.set_metadata(self.metadata)
+        flaskapp.logger.info(f"Shout stream {self.mountpoint} connected")
+        return True
+
+    def disconnect(self):
+        """
+        Start an outage: close the connection and, if other mounts are
+            still streaming, keep only the most recent RADIO_BUFFER_SIZE
+            of audio instead of holding them back.
+        """
+        with self.stats_lock:
+            self.state = MOUNT_DISCONNECTED
+            self.outage_start = time.monotonic()
+        self.segment_queue.set_dropping(self.drop_when_disconnected)
+        self.close()
+
+    def close(self):
+        """
+        Helper method, close the Shout connection, if it's open.
+        """
+        try:
+            self.stream_obj.close()
+        except shout.ShoutException:
+            pass
+
+    def start(self):
+        """
+        Start the "stream" thread, in an outage until it connects.
+        """
+        with self.stats_lock:
+            self.outage_start = time.monotonic()
+        self.segment_queue.set_dropping(self.drop_when_disconnected)
+        self.stream_thread = threading.Thread(
+            target=self.stream
+        )
+        self.stream_thread.start()
+
+    def shutdown(self):
+        """
+        Stop the "stream" thread, once the kill signal is set, and
+            close the connection.
+        """
+        self.segment_queue.wake()
+        if self.stream_thread:
+            self.stream_thread.join()
+        self.close()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the mount's connection and pacing metrics.
+        :return: dict of metric name to value
+        """
+        buffer_stats = self.segment_queue.stats()
+        with self.stats_lock:
+            outage_seconds = self.outage_seconds
+            if self.outage_start is not None:
+                outage_seconds += time.monotonic() - self.outage_start
+            return {
+                "mountpoint": self.mountpoint,
+                "bitrate": self.bitrate,
+                "state": self.state,
+                "outage_seconds": outage_seconds,
+                "reconnects": self.reconnects,
+                "last_error": self.last_error,
+                **buffer_stats,
+                **self.pacer.stats()
+            }
+
+    def set_metadata(self, metadata: dict):
+        """
+        Update the mount's stream metadata, e.g. the song title. It's
+            applied again after reconnecting.
+        :param metadata: dict of metadata, see shout.Shout.set_metadata
+        """
+        self.metadata = metadata
+        if self.state != MOUNT_CONNECTED:
+            return
+        try:
+            self.stream_obj.set_metadata(metadata)
+        except shout.ShoutException as e:
+            flaskapp.logger.error(f"Unable to set metadata of " +
+                f"{self.mountpoint}: {str(e)}")
+
+    def stream(self):
+        """
+        Thread supervising the mount's connection. Connects, streams
+            until the connection fails, then retries with exponential
+            backoff between RADIO_RECONNECT_MIN_DELAY and
+            RADIO_RECONNECT_MAX_DELAY. Audio left in the segment 
+            buffer, and any send that failed, is resumed after
+            reconnecting.
+        """
+        delay = appconfig["RADIO_RECONNECT_MIN_DELAY"]
+        while not self.kill_signal.is_set():
+            if not self.connect():
+                self.kill_signal.wait(delay)
+                delay = min(delay * 2, 
+                    appconfig["RADIO_RECONNECT_MAX_DELAY"])
+                continue
+            delay = appconfig["RADIO_RECONNECT_MIN_DELAY"]
+            try:
+                self.send_frames()
+            except Exception as err:
+                self.last_error = f"{type(err).__name__}: {str(err)}"
+                _, _, exc_tb = sys.exc_info()
+                flaskapp.logger.error(
+                    f"Error in stream {self.mountpoint}: " +
+                    "%s: %s: %s at line %d" % (
+                        err.__class__.__name__,
+                        err.__class__.__name__,
+                        str(err), exc_tb.tb_lineno))
+                self.disconnect()
+
+    def send_frames(self):
+        """
+        Send buffered audio to the Icecast server until killed, paced
+            frame by frame by the StreamPacer: each send carries every
+            frame due at that moment, so sends are small while on time
+            and larger while catching up. Frames of a skipped segment
+            are dropped right before they would be sent. Sleeps on the
+            segment buffer while it's empty, and on the kill signal
+            until the next frame is due.
+        """
+        starved = False
+        if self.unsent:
+            self.stream_obj.send(self.unsent)
+            self.unsent = None
+        while not self.kill_signal.is_set():
+            if not self.pending:
+                starved = starved or self.pacer.delay() <= 0
+                try:
+                    segment_id, chunk = self.segment_queue.get(
+                        STREAM_WAIT_TIMEOUT, [self.kill_signal])
+                except queue.Empty:
+                    continue
+                if segment_id != self.splitter_segment:
+                    self.splitter.reset()
+                    self.splitter_segment = segment_id
+                self.pending.extend((segment_id, header, frame)
+                    for header, frame in self.splitter.feed(chunk))
+                continue
+            delay = self.pacer.delay()
+            if delay > 0:
+                self.kill_signal.wait(delay)
+                continue
+            batch = bytearray()
+            while self.pending and self.pacer.delay() <= 0:
+                segment_id, header, frame = self.pending.popleft()
+                if self.segment_queue.is_skipped(segment_id):
+                    continue
+                self.pacer.advance(header, starved)
+                starved = False
+                batch += frame
+            if batch:
+                # kept until sent, to be resent after a reconnect
+                self.unsent = bytes(batch)
+                self.stream_obj.send(self.unsent)
+                self.unsent = None
@@ -4,11 +4,13 @@ Scheduled database maintenance tasks, such as the removal of
     in __init__.py.
 """
 import datetime as dt
+import time
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError
 
-from app import flaskapp, scheduler, db, appconfig
-from app.core import promote_or_remove_wisp, expire_song
+from app import flaskapp, scheduler, db, appconfig, songcatalog
+from app import feedsnapshot
+from app.core import promote_or_remove_wisps, remove_songs
 from app.models import *
 
 FILE = "thread_debug.txt"
@@ -22,6 +24,30 @@ def schedule():
         trigger="interval",
         seconds=appconfig["WISP_PURGE_INTERVAL"]
     )
+    scheduler.add_job(
+        purge_songs,
+        trigger="interval",
+        seconds=appconfig["SONG_PURGE_INTERVAL"]
+    )
+    # also run at startup, so counts which drifted before a restart
+    # are corrected right away
+    scheduler.add_job(
+        reconcile_heart_counts,
+        trigger="interval",
+        seconds=appconfig["HEART_COUNT_RECONCILE_INTERVAL"],
+        next_run_time=dt.datetime.now()
+    )
+    scheduler.add_job(
+        refresh_song_catalog,
+        trigger="interval",
+        seconds=appconfig["SONG_CATALOG_REFRESH_INTERVAL"],
+        next_run_time=dt.datetime.now()
+    )
+    scheduler.add_job(
+        analyze_song_catalog,
+        trigger="interval",
+        seconds=appconfig["SONG_ANALYSIS_INTERVAL"]
+    )
     scheduler.start()
 
 def stop():
@@ -31,48 +57,168 @@ def stop():
     if scheduler.running:
         scheduler.shutdown()
 
-def purge_wisps():
+def purge_wisps() -> dict:
     """
     Remove wisps (or classify them as remembrances)
-        after the expiry period has elapsed.
+        after the expiry period has elapsed. Works through them
+        PURGE_CHUNK_SIZE at a time, one short transaction each, so
+        that requests can write between them.
+    :return: {"rows", "chunks", "ms"} dict of Wisps purged, 
+        transactions, and duration
     """
+    start = time.perf_counter()
+    rows = chunks = 0
+    poster_ids = set()
     try:
         with flaskapp.app_context():
             expiry = dt.datetime.now(dt.UTC) - appconfig["WISP_LIFESPAN"]
-            expired_wisps = db.session.scalars(
-                db.select(Wisp).filter_by(
-                    status=constants.LIVE_WISP
-                ).filter(
-                    Wisp.created_time <= expiry
-            )).all()
-            for wisp in expired_wisps:
-                promote_or_remove_wisp(wisp)
-            db.session.commit()
+            while True:
+                expired_wisp_ids = db.session.scalars(
+                    db.select(Wisp.wisp_id).filter_by(
+                        status=constants.LIVE_WISP
+                    ).filter(
+                        Wisp.created_time <= expiry
+                    ).order_by(
+                        Wisp.created_time.asc()
+                    ).limit(appconfig["PURGE_CHUNK_SIZE"])
+                ).all()
+                if not expired_wisp_ids:
+                    break
+                poster_ids |= promote_or_remove_wisps(expired_wisp_ids)
+                db.session.commit()
+                feedsnapshot.removed(expired_wisp_ids)
+                rows += len(expired_wisp_ids)
+                chunks += 1
+                if len(expired_wisp_ids) < appconfig["PURGE_CHUNK_SIZE"]:
+                    break
+                time.sleep(appconfig["PURGE_CHUNK_PAUSE"])
     except OperationalError:
         # because the server fixture is long-lived and the DB one 
         # isn't, occasionally this'll run when the "wisp" table isn't
         # present
         pass
+    finally:
+        if poster_ids:
+            # HeartScores lost the expired Wisps' Hearts, which one 
+            # reload of the snapshot covers for any number of posters
+            feedsnapshot.invalidate()
+    return purge_report("Wisps", rows, chunks, start)
 
-def purge_songs():
+def purge_songs() -> dict:
     """
     Remove Song database entries after their post-queue time
-        has expired.
+        has expired. Works through them PURGE_CHUNK_SIZE at a time,
+        like "purge_wisps".
+    :return: {"rows", "chunks", "ms"} dict of Songs purged,
+        transactions, and duration
     """
+    start = time.perf_counter()
+    rows = chunks = 0
+    queuer_ids = set()
     try:
         with flaskapp.app_context():
             expiry = dt.datetime.now(dt.UTC) - appconfig["SONG_LIFESPAN"]
-            expired_songs = db.session.scalars(
-                db.select(Song).filter_by(
-                    status=constants.PLAYED_SONG
-                ).filter(
-                    Song.created_time <= expiry
-            )).all()
-            for song in expired_songs:
-                expire_song(song) 
-            db.session.commit()
+            while True:
+                expired_song_ids = db.session.scalars(
+                    db.select(Song.song_id).filter_by(
+                        status=constants.PLAYED_SONG
+                    ).filter(
+                        Song.status_updated_time <= expiry
+                    ).order_by(
+                        Song.status_updated_time.asc()
+                    ).limit(appconfig["PURGE_CHUNK_SIZE"])
+                ).all()
+                if not expired_song_ids:
+                    break
+                queuer_ids |= remove_songs(expired_song_ids)
+                db.session.commit()
+                rows += len(expired_song_ids)
+                chunks += 1
+                if len(expired_song_ids) < appconfig["PURGE_CHUNK_SIZE"]:
+                    break
+                time.sleep(appconfig["PURGE_CHUNK_PAUSE"])
     except OperationalError:
         # because the server fixture is long-lived and the DB one 
         # isn't, occasionally this'll run when the "song" table isn't
         # present
         pass
+    finally:
+        if queuer_ids:
+            # HeartScores shown on the queuers' Wisps changed
+            feedsnapshot.invalidate()
+    return purge_report("Songs", rows, chunks, start)
+
+def purge_report(name: str, rows: int, chunks: int, start: float) -> dict:
+    """
+    Helper method, log and return the result of a purge.
+    :param name: name of the purged entities, e.g. "Wisps"
+    :param rows: number of entities purged
+    :param chunks: number of transactions
+    :param start: "time.perf_counter" when the purge started
+    :return: {"rows", "chunks", "ms"} dict
+    """
+    report = {
+        "rows": rows,
+        "chunks": chunks,
+        "ms": (time.perf_counter() - start) * 1000
+    }
+    if rows:
+        flaskapp.logger.info(f"Purged {rows} {name} in {chunks} " +
+            f"transactions, {report['ms']:.1f} ms")
+    return report
+
+def reconcile_heart_counts() -> int:
+    """
+    Correct the Heart and BrokenHeart counts of Wisps and Songs which
+        don't match their Hearts, in one UPDATE per count.
+    :return: number of counts corrected
+    """
+    # (count column, ID column, vote table column referencing the ID)
+    counts = (
+        (Wisp.heart_count, Wisp.wisp_id,
+            wisp_heart_association_table.c.hearted_wisp_id),
+        (Song.heart_count, Song.song_id,
+            song_heart_association_table.c.hearted_song_id),
+        (Song.brokenheart_count, Song.song_id,
+            song_broken_heart_association_table.c.broken_hearted_song_id)
+    )
+    corrected = 0
+    try:
+        with flaskapp.app_context():
+            for count, entity_id, vote_id in counts:
+                # correlated with the updated row
+                actual = db.select(db.func.count()).where(
+                    vote_id == entity_id
+                ).scalar_subquery()
+                corrected += db.session.execute(
+                    db.update(count.class_).where(
+                        count != actual
+                    ).values({count: actual})
+                ).rowcount
+            db.session.commit()
+    except OperationalError:
+        # same as above, the tables might not be present
+        pass
+    if corrected:
+        flaskapp.logger.warning(f"Corrected {corrected} Heart counts")
+    return corrected
+
+def refresh_song_catalog():
+    """
+    Rescan the songs directory for new, changed and removed files.
+    """
+    try:
+        songcatalog.refresh()
+    except OperationalError:
+        # same as above, the "song_file" table might not be present
+        pass
+
+def analyze_song_catalog():
+    """
+    Measure the loudness and silence of a batch of new catalog songs.
+    """
+    try:
+        songcatalog.analyze(appconfig["SONG_ANALYSIS_BATCH"])
+    except OperationalError:
+        # same as above
+        pass
@@ -0,0 +1,186 @@
+"""
+Bounded in-memory ring of encoded audio chunks, shared between the
+    RadioController's "gen_songs" (writer) and "stream" (reader)
+    threads. The writer blocks while the ring is full, so generation
+    never runs more than RADIO_BUFFER_SIZE bytes ahead of the stream.
+"""
+import queue
+import threading
+from collections import deque
+
+class SegmentInterrupted(Exception):
+    """
+    Raised in the writer when one of the buffer's interrupt events is
+        set, e.g. on skip or shutdown.
+    """
+    pass
+
+class SegmentBuffer():
+    """
+    Ring of (segment_id, chunk) tuples. Each rendered song is a
+        segment. Small writes are coalesced into chunks of up to
+        chunk_size bytes.
+    """
+    def __init__(self, max_bytes: int, chunk_size: int,
+                 interrupt_events: list = None):
+        """
+        Initialization actions.
+        :param max_bytes: number of buffered bytes past which writers
+            block
+        :param chunk_size: maximum size of coalesced chunks
+        :param interrupt_events: threading.Event objects which, when
+            set, make blocked and subsequent writes raise
+            SegmentInterrupted, none by default
+        """
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.interrupt_events = (list(interrupt_events)
+            if interrupt_events else [])
+
+        self.chunks = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+
+        # id of the segment currently being written, and of the last
+        # segment dropped by a skip
+        self.segment_id = 0
+        self.skipped_through = 0
+
+        # when set, writes to a full ring drop the oldest chunks
+        # instead of blocking, e.g. while the reader is disconnected
+        self.dropping = False
+        self.dropped_bytes = 0
+
+    def interrupted(self) -> bool:
+        """
+        Check whether any of the interrupt events is set.
+        :return: True if writes should be interrupted
+        """
+        return any(event.is_set() for event in self.interrupt_events)
+
+    def begin_segment(self) -> int:
+        """
+        Start a new segment. Subsequent writes are tagged with its id.
+        :return: id of the new segment
+        """
+        with self.condition:
+            self.segment_id += 1
+            return self.segment_id
+
+    def put(self, data: bytes):
+        """
+        Append encoded bytes to the current segment. Blocks while the
+            ring is full, or drops the oldest chunks if "dropping".
+        :param data: encoded audio bytes
+        """
+        with self.condition:
+            while (self.size >= self.max_bytes and not self.dropping
+                    and not self.interrupted()):
+                self.condition.wait()
+            if self.interrupted():
+                raise SegmentInterrupted()
+            while self.chunks and self.size >= self.max_bytes:
+                _, dropped = self.chunks.popleft()
+                self.size -= len(dropped)
+                self.dropped_bytes += len(dropped)
+            if (self.chunks and self.chunks[-1][0] == self.segment_id and
+                    len(self.chunks[-1][1]) + len(data) <=
+                    self.chunk_size):
+                self.chunks[-1] = (
+                    self.segment_id, self.chunks[-1][1] + data)
+            else:
+                self.chunks.append((self.segment_id, data))
+            self.size += len(data)
+            self.condition.notify_all()
+
+    def get(self, timeout: float = None,
+            wake_events: list = []) -> tuple:
+        """
+        Pop the oldest chunk, blocking until one is written, the
+            timeout elapses, or one of the wake events is set (and
+            the buffer woken).
+        :param timeout: maximum time to block, in seconds. Blocks
+            indefinitely if None
+        :param wake_events: threading.Event objects which stop the
+            wait when set
+        :return: (segment_id, chunk) tuple
+        :raises queue.Empty: if no chunk was written in time
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.chunks or any(
+                    event.is_set() for event in wake_events),
+                timeout
+            )
+            return self.get_nowait()
+
+    def get_nowait(self) -> tuple:
+        """
+        Pop the oldest chunk without blocking.
+        :return: (segment_id, chunk) tuple
+        :raises queue.Empty: if no chunks are buffered
+        """
+        with self.condition:
+            if not self.chunks:
+                raise queue.Empty
+            segment_id, chunk = self.chunks.popleft()
+            self.size -= len(chunk)
+            self.condition.notify_all()
+            return segment_id, chunk
+
+    def empty(self) -> bool:
+        """
+        Check whether any chunks are buffered.
+        :return: True if the ring is empty
+        """
+        with self.condition:
+            return not self.chunks
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the ring's counters, e.g. for monitoring.
+        :return: dict of counter name to value
+        """
+        with self.condition:
+            return {
+                "buffered_bytes": self.size,
+                "dropped_bytes": self.dropped_bytes
+            }
+
+    def skip(self):
+        """
+        Drop every buffered chunk, and mark all segments up to the
+            current one as skipped, so the reader can drop a chunk it
+            already holds.
+        """
+        with self.condition:
+            self.chunks.clear()
+            self.size = 0
+            self.skipped_through = self.segment_id
+            self.condition.notify_all()
+
+    def is_skipped(self, segment_id: int) -> bool:
+        """
+        Check whether a chunk's segment has been dropped by a skip.
+        :param segment_id: segment id the chunk was tagged with
+        :return: True if the chunk shouldn't be played
+        """
+        return segment_id <= self.skipped_through
+
+    def set_dropping(self, dropping: bool):
+        """
+        Switch between blocking and dropping the oldest chunks when
+            the ring is full.
+        :param dropping: True to drop, False to block
+        """
+        with self.condition:
+            self.dropping = dropping
+            self.condition.notify_all()
+
+    def wake(self):
+        """
+        Wake blocked writers and readers, so they can check the
+            interrupt and wake events.
+        """
+        with self.condition:
+            self.condition.notify_all()
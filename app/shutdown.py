@@ -2,7 +2,7 @@
 Server deinitialization actions.
 """
 
-from app import scheduled_tasks, radiocontroller
+from app import scheduled_tasks, radiocontroller, eventserver
 
 def shutdown():
     """
@@ -10,3 +10,4 @@ def shutdown():
     """
     scheduled_tasks.stop()
     radiocontroller.shutdown()
+    eventserver.shutdown()
@@ -0,0 +1,293 @@
+"""
+In-memory index of the songs directory, persisted in the SongFile
+    table. Replaces listing and stat-ing SONG_PATH on every autoplay
+    pick and queue request. Refreshed incrementally: only files whose
+    size or mtime changed are re-read. Each file's loudness and
+    silence is analyzed once, in the background, so the radio can
+    apply them without scanning the audio at play time.
+"""
+import hashlib
+import math
+import os
+import random
+import threading
+from collections import namedtuple
+
+from app import flaskapp, db, appconfig
+from app.models import SongFile
+from app.mp3_frames import iter_frames
+from app.pcm_stream import PCMDecoder, ms_to_bytes, to_segment
+
+# immutable copy of a SongFile row, safe to share between threads
+CatalogEntry = namedtuple("CatalogEntry", [
+    "uri", "duration", "bitrate", "size", "mtime", "sha", "gain",
+    "lead_silence", "trail_silence"
+])
+
+# Length of the windows the level of a Song is measured over, in
+# milliseconds, and the percentile of window levels taken as its
+# loudness, as in ReplayGain
+ANALYSIS_WINDOW = 50
+LOUDNESS_PERCENTILE = 0.95
+
+class HashingReader():
+    """
+    File wrapper hashing everything read through it, so a Song can be
+        hashed and parsed in a single pass.
+    """
+    def __init__(self, fp):
+        """
+        Initialization actions.
+        :param fp: binary file object to wrap
+        """
+        self.fp = fp
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read from the wrapped file, updating the hash.
+        :param size: number of bytes to read
+        :return: bytes read
+        """
+        data = self.fp.read(size)
+        self.hash.update(data)
+        return data
+
+def scan_file(uri: str, stat: os.stat_result) -> CatalogEntry:
+    """
+    Helper method, hash and measure a file in the songs directory.
+    :param uri: file name
+    :param stat: result of stat-ing the file
+    :return: CatalogEntry for the file
+    """
+    with open(os.path.join(appconfig["SONG_PATH"], uri), "rb") as fp:
+        reader = HashingReader(fp)
+        samples = 0
+        sample_rate = 0
+        for header, _ in iter_frames(reader):
+            samples += header.samples
+            sample_rate = header.sample_rate
+        # hash any trailing tags too
+        while reader.read(65536):
+            pass
+    duration = samples * 1000 // sample_rate if sample_rate else 0
+    return CatalogEntry(
+        uri=uri,
+        duration=duration,
+        bitrate=stat.st_size * 8 // duration if duration else 0,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        sha=reader.hash.hexdigest(),
+        gain=None,
+        lead_silence=0,
+        trail_silence=0
+    )
+
+def to_db(amplitude: float, max_amplitude: float) -> float:
+    """
+    Helper method, convert an amplitude to dBFS.
+    :param amplitude: RMS or peak amplitude
+    :param max_amplitude: full scale amplitude
+    :return: level in dBFS, -inf for silence
+    """
+    return (20 * math.log10(amplitude / max_amplitude) if amplitude
+        else -math.inf)
+
+def analyze_file(uri: str) -> tuple:
+    """
+    Helper method, measure the loudness and the leading and trailing
+        silence of a file in the songs directory. The file is decoded
+        block by block, only one level per window is kept.
+    :param uri: file name
+    :return: (gain, lead_silence, trail_silence) tuple, gain in dB
+        and silences in milliseconds
+    """
+    decoder = PCMDecoder(os.path.join(appconfig["SONG_PATH"], uri))
+    levels = []
+    peak = 0
+    try:
+        for window in decoder.blocks(ms_to_bytes(ANALYSIS_WINDOW)):
+            segment = to_segment(window)
+            max_amplitude = segment.max_possible_amplitude
+            levels.append(to_db(segment.rms, max_amplitude))
+            peak = max(peak, segment.max)
+    finally:
+        decoder.close()
+    audible = [index for index, level in enumerate(levels)
+        if level >= appconfig["SONG_SILENCE_THRESHOLD"]]
+    if not audible:
+        # silent or undecodable, leave it alone
+        return 0.0, 0, 0
+    loudness = sorted(levels[audible[0]:audible[-1] + 1])
+    gain = appconfig["SONG_TARGET_LOUDNESS"] - loudness[
+        int(LOUDNESS_PERCENTILE * (len(loudness) - 1))]
+    # never push the peak past full scale
+    gain = min(gain, -to_db(peak, max_amplitude), 
+        appconfig["SONG_MAX_GAIN"])
+    gain = max(gain, -appconfig["SONG_MAX_GAIN"])
+    return (
+        round(gain, 1),
+        audible[0] * ANALYSIS_WINDOW,
+        (len(levels) - 1 - audible[-1]) * ANALYSIS_WINDOW
+    )
+
+class SongCatalog():
+    """
+    Object holding the song catalog. Readers get a consistent snapshot,
+        since refreshes swap in a whole new index.
+    """
+    def __init__(self):
+        """
+        Initialization actions. The catalog is empty until "load" or
+            "refresh" is called.
+        """
+        self.entries = {}
+        self.uris = ()
+        # URIs of Songs with a readable duration, for autoplay picks
+        self.playable_uris = ()
+        self.refresh_lock = threading.Lock()
+
+    def set_entries(self, entries: dict):
+        """
+        Helper method, swap in a new index.
+        :param entries: dict of uri to CatalogEntry
+        """
+        self.uris = tuple(sorted(entries))
+        self.playable_uris = tuple(uri for uri in self.uris
+            if entries[uri].duration)
+        self.entries = entries
+
+    def load(self):
+        """
+        Load the persisted catalog, without touching the songs
+            directory.
+        """
+        with flaskapp.app_context():
+            self.set_entries({
+                song_file.uri: CatalogEntry(
+                    song_file.uri, song_file.duration, 
+                    song_file.bitrate, song_file.size, 
+                    song_file.mtime, song_file.sha, song_file.gain,
+                    song_file.lead_silence, song_file.trail_silence
+                ) for song_file in db.session.scalars(
+                    db.select(SongFile)
+                ).all()
+            })
+
+    def refresh(self):
+        """
+        Rescan the songs directory. Only new files and files whose
+            size or mtime changed are hashed and parsed, and only the
+            differences are written to the database.
+        """
+        with self.refresh_lock, flaskapp.app_context():
+            entries = dict(self.entries)
+            seen = set()
+            changed = []
+            with os.scandir(appconfig["SONG_PATH"]) as dir_entries:
+                for dir_entry in dir_entries:
+                    if not dir_entry.is_file():
+                        continue
+                    seen.add(dir_entry.name)
+                    stat = dir_entry.stat()
+                    entry = entries.get(dir_entry.name)
+                    if (entry and entry.size == stat.st_size and
+                            entry.mtime == stat.st_mtime):
+                        continue
+                    try:
+                        entries[dir_entry.name] = scan_file(
+                            dir_entry.name, stat)
+                    except OSError as e:
+                        flaskapp.logger.error(f"Unable to catalog " +
+                            f"{dir_entry.name}: {str(e)}")
+                        continue
+                    changed.append(entries[dir_entry.name])
+            removed = set(entries) - seen
+            for uri in removed:
+                del entries[uri]
+
+            for entry in changed:
+                db.session.merge(SongFile(**entry._asdict()))
+            if removed:
+                db.session.execute(db.delete(SongFile).where(
+                    SongFile.uri.in_(removed)))
+            db.session.commit()
+            self.set_entries(entries)
+            if changed or removed:
+                flaskapp.logger.info(f"Song catalog refreshed: " +
+                    f"{len(changed)} changed, {len(removed)} removed, " +
+                    f"{len(entries)} total")
+
+    def analyze(self, limit: int):
+        """
+        Analyze the loudness and silence of cataloged Songs which
+            haven't been yet. Decoding happens outside of the refresh
+            lock, results for files which changed in the meantime are
+            dropped.
+        :param limit: maximum number of Songs to analyze
+        """
+        pending = [entry for entry in self.entries.values()
+            if entry.gain is None and entry.duration][:limit]
+        analyzed = []
+        for entry in pending:
+            try:
+                gain, lead_silence, trail_silence = analyze_file(
+                    entry.uri)
+            except OSError as e:
+                flaskapp.logger.error(f"Unable to analyze " +
+                    f"{entry.uri}: {str(e)}")
+                continue
+            analyzed.append(entry._replace(gain=gain, 
+                lead_silence=lead_silence, trail_silence=trail_silence))
+        if not analyzed:
+            return
+        with self.refresh_lock, flaskapp.app_context():
+            entries = dict(self.entries)
+            for entry in analyzed:
+                current = entries.get(entry.uri)
+                if current is None or current.sha != entry.sha:
+                    continue
+                entries[entry.uri] = entry
+                db.session.merge(SongFile(**entry._asdict()))
+            db.session.commit()
+            self.set_entries(entries)
+        flaskapp.logger.info(f"Song catalog analyzed {len(analyzed)} " +
+            f"songs")
+
+    def contains(self, uri: str) -> bool:
+        """
+        Check whether a Song URI refers to a file in the songs
+            directory. Only URIs missing from the catalog, e.g. files
+            added since the last refresh, touch the filesystem.
+        :param uri: Song URI, sanitized
+        :return: True if valid
+        """
+        return bool(uri) and (uri in self.entries or os.path.isfile(
+            os.path.join(appconfig["SONG_PATH"], uri)))
+
+    def get(self, uri: str) -> CatalogEntry:
+        """
+        Get the catalog entry of a Song.
+        :param uri: Song URI
+        :return: CatalogEntry, or None if not cataloged
+        """
+        return self.entries.get(uri)
+
+    def random_uri(self) -> str:
+        """
+        Pick a random cataloged Song. Files whose frames couldn't be
+            read (with a duration of 0) are never picked.
+        :return: Song URI, or None if no Song is playable
+        """
+        uris = self.playable_uris
+        return random.choice(uris) if uris else None
+
+    def search(self, term: str, limit: int = None) -> list:
+        """
+        Case-insensitive substring search over Song URIs.
+        :param term: search string
+        :param limit: maximum number of results
+        :return: list of matching Song URIs, in alphabetical order
+        """
+        term = term.lower()
+        return [uri for uri in self.uris if term in uri.lower()][:limit]
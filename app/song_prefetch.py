@@ -0,0 +1,185 @@
+"""
+Look-ahead prefetching of upcoming radio Songs. Resolves the next
+    RADIO_LOOKAHEAD_SONGS songs (queued ones first, then Otto picks)
+    and prepares them in a background worker pool, so that opening and
+    decoding the head of a big file never delays a crossfade.
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import flaskapp, db, appconfig, constants
+from app.models import Song
+
+# uri: Song file name, otto: whether the uri is a random pick rather
+# than a queued Song, future: Future resolving to a PreparedSong
+PrefetchEntry = namedtuple("PrefetchEntry", ["uri", "otto", "future"])
+
+def close_prepared(future):
+    """
+    Done callback closing the PreparedSong of a discarded entry.
+    :param future: Future resolving to a PreparedSong
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+class SongPrefetcher():
+    """
+    Keeps a list of prepared upcoming Songs in play order. Entries are
+        reconciled against the queue whenever it may have changed, and
+        only the ones which no longer match are discarded.
+    """
+    def __init__(self, prepare, pick_otto_uri):
+        """
+        Initialization actions.
+        :param prepare: function taking a Song path and returning a
+            PreparedSong, e.g. CrossfadeEngine.prepare
+        :param pick_otto_uri: function returning the uri of a random
+            Song to autoplay
+        """
+        self.prepare = prepare
+        self.pick_otto_uri = pick_otto_uri
+        self.lookahead = appconfig["RADIO_LOOKAHEAD_SONGS"]
+        self.executor = ThreadPoolExecutor(
+            max_workers=appconfig["RADIO_PREFETCH_WORKERS"],
+            thread_name_prefix="prefetch"
+        )
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def get_queued_uris(self) -> list:
+        """
+        Helper method, query the URIs of the oldest queued Songs.
+        :return: list of up to RADIO_LOOKAHEAD_SONGS uris, in play order
+        """
+        with flaskapp.app_context(), Session(db.engine) as session:
+            return session.scalars(
+                db.select(Song.uri).filter_by(
+                    status=constants.QUEUED_SONG
+                ).order_by(
+                    Song.status_updated_time.asc()
+                ).limit(self.lookahead)
+            ).all()
+
+    def submit(self, uri: str, otto: bool) -> PrefetchEntry:
+        """
+        Helper method, start preparing a Song in the worker pool.
+        :param uri: Song file name
+        :param otto: whether the Song is an Otto pick
+        :return: new entry
+        """
+        return PrefetchEntry(uri, otto, self.executor.submit(
+            self.prepare, os.path.join(appconfig["SONG_PATH"], uri)))
+
+    def discard(self, entry: PrefetchEntry):
+        """
+        Helper method, cancel or close a stale entry.
+        :param entry: entry to discard
+        """
+        if not entry.future.cancel():
+            entry.future.add_done_callback(close_prepared)
+
+    def refresh(self):
+        """
+        Reconcile the prefetched entries with the current queue. Queued
+            Songs come first, then Otto picks fill the rest of the
+            look-ahead. Entries still in the right place are kept,
+            previous Otto picks are reused, everything else is
+            discarded.
+        """
+        try:
+            queued_uris = self.get_queued_uris()
+        except OperationalError as e:
+            flaskapp.logger.error(f"OperationalError in " +
+                f"SongPrefetcher.refresh: {str(e)}")
+            return
+        with self.lock:
+            kept = []
+            stale = list(self.entries)
+            for uri in queued_uris:
+                if stale and not stale[0].otto and stale[0].uri == uri:
+                    kept.append(stale.pop(0))
+                else:
+                    break
+            for uri in queued_uris[len(kept):]:
+                kept.append(self.submit(uri, False))
+            otto_entries = [entry for entry in stale if entry.otto]
+            for entry in stale:
+                if not entry.otto:
+                    self.discard(entry)
+            while len(kept) < self.lookahead:
+                kept.append(otto_entries.pop(0) if otto_entries else
+                    self.submit(self.pick_otto_uri(), True))
+            for entry in otto_entries:
+                self.discard(entry)
+            self.entries = kept
+
+    def invalidate(self):
+        """
+        Schedule a refresh, e.g. after a Song is queued or skipped.
+        """
+        try:
+            self.executor.submit(self.refresh)
+        except RuntimeError:
+            # executor already shut down
+            pass
+
+    def next_otto_uri(self) -> str:
+        """
+        Get the uri of the first upcoming Otto pick, so that a
+            prefetched one is used when nothing is queued.
+        :return: uri, or a new random pick if none is prefetched
+        """
+        with self.lock:
+            for entry in self.entries:
+                if entry.otto:
+                    return entry.uri
+        return self.pick_otto_uri()
+
+    def upcoming_uri(self) -> str:
+        """
+        Get the uri of the next Song lined up.
+        :return: uri, or None if nothing is prefetched yet
+        """
+        with self.lock:
+            return self.entries[0].uri if self.entries else None
+
+    def take(self, uri: str):
+        """
+        Take the prepared Song for the given uri, discarding any stale
+            entries before it. Schedules a refresh to keep the
+            look-ahead full.
+        :param uri: file name of the Song about to play
+        :return: PreparedSong, or the Song's path if it wasn't
+            prefetched (or failed to prepare)
+        """
+        taken = None
+        with self.lock:
+            for index, entry in enumerate(self.entries):
+                if entry.uri == uri:
+                    taken = entry
+                    for stale in self.entries[:index]:
+                        self.discard(stale)
+                    self.entries = self.entries[index + 1:]
+                    break
+        self.invalidate()
+        if taken:
+            try:
+                return taken.future.result()
+            except Exception as err:
+                flaskapp.logger.error(f"Unable to prefetch {uri}: " +
+                    f"{err.__class__.__name__}: {str(err)}")
+        return os.path.join(appconfig["SONG_PATH"], uri)
+
+    def shutdown(self):
+        """
+        Stop the worker pool and release every prepared Song.
+        """
+        with self.lock:
+            for entry in self.entries:
+                self.discard(entry)
+            self.entries = []
+        self.executor.shutdown(cancel_futures=True)
@@ -8,7 +8,7 @@ from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
 import logging
 
-from app import flaskapp, radiocontroller
+from app import flaskapp, radiocontroller, songcatalog, eventserver
 from app import scheduled_tasks
 
 def startup():
@@ -26,6 +26,12 @@ def startup():
 
     flaskapp.logger.info("Starting server")
 
+    # persisted catalog is available immediately, the first rescan of
+    # the songs directory is run by the scheduler
+    songcatalog.load()
+
     scheduled_tasks.schedule()
 
+    eventserver.startup()
+
     radiocontroller.startup()
@@ -0,0 +1,108 @@
+"""
+Real-time pacing of the MP3 stream sent to Icecast. Keeps an audio
+    clock from the duration of each frame sent, so the "stream" thread
+    knows exactly when the next frame is due, instead of relying on
+    libshout's "sync" after every chunk.
+"""
+import time
+
+# weight of each new sample in the jitter estimate, as in RFC 3550
+JITTER_GAIN = 1 / 16
+
+class StreamPacer():
+    """
+    Audio clock of a stream. Frames are due "lead" seconds before
+        their place in the audio, relative to the moment the clock
+        started. Falling more than a frame behind is counted, and
+        restarts the clock, so the stream only ever bursts up to
+        "lead" seconds of audio to catch up.
+
+    Lateness is counted as an underrun if the stream had nothing to
+        send (i.e. "gen_songs" fell behind), or as an overrun if audio
+        was ready but couldn't be sent in time (i.e. the sender or the
+        connection fell behind).
+    """
+    def __init__(self, lead: float, speed: float = 1.0,
+                 clock=time.monotonic):
+        """
+        Initialization actions.
+        :param lead: how far ahead of real time frames are sent, in
+            seconds
+        :param speed: playback speed relative to real time, only
+            meant for benchmarks
+        :param clock: function returning the current time in seconds
+        """
+        self.lead = lead
+        self.speed = speed
+        self.clock = clock
+        self.start_time = None
+        # seconds of audio sent since the clock started
+        self.position = 0.0
+
+        self.frames_sent = 0
+        self.audio_seconds = 0.0
+        self.underruns = 0
+        self.overruns = 0
+        # smoothed absolute lateness of frames, in seconds
+        self.jitter = 0.0
+
+    def elapsed(self) -> float:
+        """
+        Helper method, audio time elapsed since the clock started.
+        :return: elapsed time in seconds
+        """
+        return (self.clock() - self.start_time) * self.speed
+
+    def restart(self):
+        """
+        Restart the clock, so that the next frame is due immediately.
+        """
+        self.start_time = None
+        self.position = 0.0
+
+    def delay(self) -> float:
+        """
+        Time until the next frame is due.
+        :return: delay in (real time) seconds, 0 or less if the frame
+            is due
+        """
+        if self.start_time is None:
+            return 0.0
+        return (self.position - self.lead - self.elapsed()) / self.speed
+
+    def advance(self, header, starved: bool = False):
+        """
+        Account for a frame about to be sent.
+        :param header: FrameHeader of the frame
+        :param starved: whether the stream had to wait for the frame
+            to be generated
+        """
+        if self.start_time is None:
+            self.start_time = self.clock()
+        duration = header.samples / header.sample_rate
+        # the first "lead" seconds are due as soon as the clock starts
+        lateness = self.elapsed() - max(self.position - self.lead, 0.0)
+        self.jitter += (abs(lateness) - self.jitter) * JITTER_GAIN
+        if lateness > duration:
+            if starved:
+                self.underruns += 1
+            else:
+                self.overruns += 1
+            self.start_time = self.clock()
+            self.position = 0.0
+        self.position += duration
+        self.frames_sent += 1
+        self.audio_seconds += duration
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the pacing counters, e.g. for monitoring.
+        :return: dict of counter name to value
+        """
+        return {
+            "frames_sent": self.frames_sent,
+            "audio_seconds": self.audio_seconds,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "jitter_ms": self.jitter * 1000
+        }
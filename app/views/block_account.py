@@ -6,6 +6,7 @@ import flask_login
 import uuid
 
 from app import flaskapp, appconfig, db, constants, twilio_client
+from app import blockcache, feedsnapshot
 from app.models import *
 from app.core import *
  
@@ -61,7 +62,9 @@ def block_account():
 
     curr_user.blocked_users.append(blocked_user)
     # if number of blocks is above threshold, disable user
-    if len(blocked_user.blocked_by_users) >= appconfig["BLOCKS_TO_BAN"]:
+    banned = (len(blocked_user.blocked_by_users) >= 
+        appconfig["BLOCKS_TO_BAN"])
+    if banned:
         blocked_user.update_status(constants.DISABLED_USER)
         delete_user_content(blocked_user)
         db.session.commit()
@@ -86,5 +89,12 @@ def block_account():
                     )
     else:
         db.session.commit()
+    blockcache.invalidate(curr_user.user_id, blocked_user.user_id)
+    # Hearts between the two were undone
+    feedsnapshot.updated_user(curr_user)
+    if banned:
+        feedsnapshot.removed_user(blocked_user.user_id)
+    else:
+        feedsnapshot.updated_user(blocked_user)
     return {"response": "user blocked"}, 200
 
@@ -6,6 +6,7 @@ import flask_login
 import uuid
 
 from app import flaskapp, appconfig, db, constants, twilio_client
+from app import blockcache, feedsnapshot
 from app.models import *
 from app.core import *
  
@@ -30,8 +31,14 @@ def delete_account():
     if not curr_user.check_password(password):
         return {"error": "invalid password"}, 403
 
+    # the deleted User's blocks go with it
+    user_id = curr_user.user_id
+    block_set = blockcache.get(user_id)
     delete_user_content(curr_user)
+    remove_user_votes(curr_user)
     db.session.delete(curr_user)
     db.session.commit()
+    blockcache.invalidate(user_id, *block_set)
+    feedsnapshot.removed_user(user_id)
 
     return {"response": "user deleted"}, 200
@@ -7,7 +7,10 @@ import sqlalchemy
 import sys
 import linecache
 
-from app import flaskapp, appconfig, db, constants
+from app import flaskapp, appconfig, db, constants, blockcache
+from app import feedsnapshot
+from app.feed_snapshot import decode_cursor, wisp_page_dict
+from app.conditional_get import conditional_get, feed_version
 from app.models import *
 
 def get_wisps_for_user(user: flask_login.UserMixin, 
@@ -16,7 +19,10 @@ def get_wisps_for_user(user: flask_login.UserMixin,
                        **equality_filters) -> sqlalchemy.engine.Result:
     """
     Helper method to get all wisps visible to a given user.
-        Accounts for blocklist and blockerlist.
+        Accounts for blocklist and blockerlist, with an anti-join
+        against the block table if the User's cached block set isn't
+        empty. Runs a constant number of queries, however many Users
+        posted the Wisps.
     :param User: User object for which to get Wisps. Can be
         AnonymousUserMixin for anonymous access
     :param limit: Maximum number of wisps to return.
@@ -26,26 +32,34 @@ def get_wisps_for_user(user: flask_login.UserMixin,
         query. Equality conditions should be passed as keyword 
         arguments
     :param equality_filters: additional filters for equality
-    :return: sqlalchemy.Result object containing Wisps
+    :return: sqlalchemy.Result object containing Wisps, newest 
+        first. Wisps posted at the same instant are ordered by ID
     """
-    if isinstance(user, User):
-        blocklist = [
-            user.user_id for user in user.blocked_users
+    if isinstance(user, User) and blockcache.get(user.user_id):
+        blocks = block_association_table.c
+        complex_filters = [
+            *complex_filters,
+            ~db.exists().where(
+                blocks.blocker_id == user.user_id,
+                blocks.blocked_id == Wisp.user_id
+            ),
+            ~db.exists().where(
+                blocks.blocked_id == user.user_id,
+                blocks.blocker_id == Wisp.user_id
+            )
         ]
-        blockerlist = [
-            user.user_id for user in user.blocked_by_users
-        ]
-    else:
-        blocklist = blockerlist = []
+    # posters are loaded along with their Wisps, so "to_dict" doesn't
+    # query for each one
     return db.session.scalars(
-        db.select(Wisp).filter(
-            Wisp.user_id.not_in(blocklist),
-            Wisp.user_id.not_in(blockerlist),
+        db.select(Wisp).options(
+            db.joinedload(Wisp.user, innerjoin=True)
+        ).filter(
             *complex_filters
         ).filter_by(
             **equality_filters
         ).limit(limit).order_by(
-            Wisp.created_time.desc()
+            Wisp.created_time.desc(),
+            Wisp.wisp_id.desc()
         )
     )
     _ = """wisp_dicts = []
@@ -55,125 +69,98 @@ def get_wisps_for_user(user: flask_login.UserMixin,
         wisp_dicts.append(wisp_dict)
     return wisp_dicts"""
 
-def get_wisp_position(user: flask_login.UserMixin, 
-                      wisp: Wisp) -> 0:
+def get_wisp_for_user(user: flask_login.UserMixin, 
+                      wisp_id: str) -> Wisp:
     """
-    Helper method to get the number of Wisps simultaneous with the 
-        given Wisp, and the position of the given Wisp within that
-        list. Even among identical values, this order will be 
-        deterministic when sorted.
-    :param user: currently authenticated user object. Can be 
-        AnonymousUserMixin for unauthenticated access
-    :param wisp: Wisp to locate
-    :return: (no_simultaneous_wisps, wisp_position) tuple where 
-        "no_simultaneous_wisps" is the total number of wisps at the 
-        given instant and wisp_position is integer index of the given
-        Wisp in that total
+    Helper method to get a Wisp by ID, if it's visible to a given
+        user. Checks the User's cached block set instead of querying
+        the block table.
+    :param user: User object for which to get the Wisp. Can be
+        AnonymousUserMixin for anonymous access
+    :param wisp_id: ID of the Wisp
+    :return: Wisp, or None if not found or not visible
     """
-    simultaneous_wisps = get_wisps_for_user(
-        user,
-        status=constants.LIVE_WISP,
-        created_time=wisp.created_time
-    ).all()
-
-    return (len(simultaneous_wisps), next(
-        index for index, i_wisp in enumerate(
-           simultaneous_wisps
-        ) if wisp.wisp_id == i_wisp.wisp_id))
-
+    wisp = db.session.get(Wisp, wisp_id) if wisp_id else None
+    if (wisp and isinstance(user, User) and 
+            wisp.user_id in blockcache.get(user.user_id)):
+        return None
+    return wisp
 
 @flaskapp.route("/get-wisps", methods=["GET"])
+@conditional_get(feed_version)
 def get_wisps():
     """
-    GET endpoint for getting a page of Wisps. Does not require a
-        valid login session. At most one of (first_wisp_id,
-        last_wisp_id) should be present.
+    GET endpoint for getting a page of Wisps, newest first. Does not
+        require a valid login session. At most one of (newer_than,
+        older_than, newest_wisp_id, oldest_wisp_id) should be present.
+        Pages are keyset-paginated on (created_time, wisp_id), so
+        each page is a single indexed range query, and Wisps posted
+        at the same instant are never skipped or repeated. The
+        newest page, and newer Wisps, are served from the feed
+        snapshot when it covers them. Supports conditional GET.
+    :queryparam newer_than: cursor of newest seen Wisp (to load newer
+        Wisps)
+    :queryparam older_than: cursor of oldest seen Wisp (to load older
+        Wisps)
     :queryparam newest_wisp_id: ID of newest seen Wisp (to load newer
         Wisps)
     :queryparam oldest_wisp_id: ID of oldest seen Wisp (to load older
         Wisps)
-    :return: 200 and {"wisps"} dict if successful, 404 if provided
-        Wisp isn't found (indicating a block, deletion, or removal).
-        In this case, the browser will remove it and submit the 
-        previous/next Wisp depending on load direction.
+    :return: 200 and {"wisps"} dict if successful, where each Wisp
+        has a "cursor". 304 if unchanged since "If-None-Match". 400
+        if a cursor is malformed. 404 if a provided Wisp ID isn't
+        found (indicating a block, deletion, or removal). In this
+        case, the browser will remove it and submit the previous/next
+        Wisp depending on load direction.
     """
-    newest_wisp_id, oldest_wisp_id = (request.args.get(key) for key in (
-        "newest_wisp_id", "oldest_wisp_id"))
+    newer_than, older_than, newest_wisp_id, oldest_wisp_id = (
+        request.args.get(key) for key in (
+            "newer_than", "older_than", "newest_wisp_id",
+            "oldest_wisp_id"))
     
     user = flask_login.current_user
-    wisp_time_filter = None
-    wisp_id = newest_wisp_id or oldest_wisp_id
-
-    if wisp_id:
-        wisp = get_wisps_for_user(user, wisp_id=wisp_id).one()
-        if not wisp:
+    position = None
+    if newer_than or older_than:
+        position = decode_cursor(newer_than or older_than)
+        if position is None:
+            return {"error": "invalid cursor"}, 400
+    elif newest_wisp_id or oldest_wisp_id:
+        wisp = get_wisp_for_user(user, newest_wisp_id or oldest_wisp_id)
+        if not wisp or wisp.status != constants.LIVE_WISP:
             return {"error": "wisp not found"}, 404
+        position = (wisp.created_time, wisp.wisp_id)
 
-        # I have to do something fairly complex here, where I want to
-        # query all Wisps made at the exact timestamp of the 
-        # newest/oldest_wisp_id, and then I have to calculate the 
-        # position of the Wisp itself in that list, and change sign
-        # depending on which direction (newer or older) I'm
-        # querying for. When I sort results by timestamp, the order
-        # for Wisps with identical timestamps is deterministic.
-        # I have to find where the provided Wisp falls in that order.
-        # If I'm looking for all older wisps, it's simple. I get
-        # the position of the given Wisp in the set of simultaneous 
-        # Wisps (ordered from newest to oldest), and then return all 
-        # Wisps past that position in the array of wisps older than
-        # the Wisp's timestamp. So, the expression is just 
-        # API_RESULT[offset + 1:], where the "+ 1" is the given Wisp 
-        # itself. If looking for all the newer Wisps, I'll have to get
-        # both the position of the given Wisp in the set of
-        # simultaneous Wisps, and the total length of that set.
-        # Then, I'll take the difference of the two, and trim that 
-        # number of Wisps off the end, i.e. API_RESULT[:offset - length]
-        # Note that in the overwhelming majority of cases, there's only
-        # one Wisp per timestamp, so offset is 0 and size is one, and 
-        # the list slices are [1:] and [:-1] respectively.
+    if not (older_than or oldest_wisp_id):
+        wisps = feedsnapshot.page(user, position)
+        if wisps is not None:
+            return {"wisps": wisps}, 200
 
-        no_simultaneous_wisps, wisp_position = get_wisp_position(
-            user, wisp
-        )
-        if newest_wisp_id:
-            offset = (wisp_position - no_simultaneous_wisps)
-            wisp_time_filter = Wisp.created_time >= wisp.created_time
+    complex_filters = []
+    if position:
+        wisp_position = db.tuple_(Wisp.created_time, Wisp.wisp_id)
+        if newer_than or newest_wisp_id:
+            complex_filters.append(wisp_position > position)
         else:
-            offset = 1 + wisp_position
-            wisp_time_filter = Wisp.created_time <= wisp.created_time
+            complex_filters.append(wisp_position < position)
 
-        Default: 0
-
-        wisps = get_wisps_for_user(
-            user, limit = appconfig["WISPS_PER_PAGE"] + abs(offset), 
-            complex_filters=[wisp_time_filter],
+    return {"wisps": [
+        wisp_page_dict(wisp) for wisp in get_wisps_for_user(
+            user, complex_filters=complex_filters,
             status=constants.LIVE_WISP
-        ).all() 
-        if offset < 0:
-            wisps = wisps[:offset]
-        else:
-            wisps = wisps[offset:]
-
-        return {
-            "wisps": [wisp.to_dict() for wisp in wisps]
-        }, 200
-
-    else:
-        return {"wisps": [
-            wisp.to_dict() for wisp in get_wisps_for_user(
-                user, status=constants.LIVE_WISP
-            ).all()
-        ]}, 200
+        ).all()
+    ]}, 200
     
 @flaskapp.route("/get-remembrances", methods=["GET"])
+@conditional_get(feed_version)
 def get_remembrances():
     """
     GET endpoint for getting all Remembrances, Wisps with sufficient
         quantities of Hearts to be saved at the time of their
         passing
     :return: 200 and a {"remembrances"} list of all Remembrances
-        visible to the User
+        visible to the User, 304 if unchanged since "If-None-Match"
     """
+    user = flask_login.current_user
     return {"remembrances": [
         remembrance.to_dict() for remembrance in get_wisps_for_user(
             user, limit=appconfig["MAX_REMEMBRANCES"],
@@ -184,17 +171,25 @@ def get_remembrances():
 @flaskapp.route("/check-newest-wisp", methods=["GET"])
 def check_newest_wisp():
     """
-    GET endpoint for checking to see if newer Wisps are present
+    GET endpoint for checking to see if newer Wisps are present.
+        Served from the feed snapshot when it covers the User's
+        newest visible Wisp. Kept for clients which don't listen to
+        the event server's "wisps" channel, which pushes new Wisps.
     :queryparam wisp_id: ID of newest Wisp on browser
     :return: 200 and {"newest": boolean} dict if successful, 404
         if no Wisps are found
     """
     wisp_id = request.args.get("wisp_id")
     user = flask_login.current_user
-    first_wisp = get_wisps_for_user(
-        user, limit=1, status=constants.LIVE_WISP
-    ).first()
-    if first_wisp:
-        return {"newest": first_wisp.wisp_id == wisp_id}, 200
+    wisps = feedsnapshot.page(user)
+    if wisps is not None:
+        first_wisp_id = wisps[0]["wisp_id"] if wisps else None
+    else:
+        first_wisp = get_wisps_for_user(
+            user, limit=1, status=constants.LIVE_WISP
+        ).first()
+        first_wisp_id = first_wisp.wisp_id if first_wisp else None
+    if first_wisp_id:
+        return {"newest": first_wisp_id == wisp_id}, 200
     else:
         return {"error": "no wisps found"}, 404
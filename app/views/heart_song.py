@@ -4,21 +4,41 @@ App views for Hearting and BrokenHearting Songs.
 import flask_login
 
 from app import flaskapp, appconfig, db, constants, radiocontroller
+from app import feedsnapshot
 from app.models import Song
 
 FILE = "thread_debug.txt"
 
 def get_current_song() -> Song:
     """
-    Helper method to get the first song with status PLAYING_SONG.
+    Helper method to get the first song with status PLAYING_SONG. Uses
+        the radio's now-playing snapshot if it's running in this 
+        process, so the Song is fetched by primary key.
     :return: Song object
     """
+    now_playing = radiocontroller.get_now_playing()
+    if now_playing:
+        return db.session.get(Song, now_playing["song_id"])
     return db.session.scalars(
         db.select(Song).filter_by(
             status=constants.PLAYING_SONG
         )
     ).first()
 
+def vote_committed(song: Song, votes: tuple):
+    """
+    Helper method, once a vote is committed: count it towards the
+        radio's live tally and skip check, and show the new HeartScore
+        of the User who queued the given Song on their Wisps.
+    :param song: Song voted on
+    :param votes: (hearts, brokenhearts) tuple returned by the User's
+        vote helper
+    """
+    if any(votes):
+        radiocontroller.record_vote(*votes)
+    if song and song.user:
+        feedsnapshot.updated_user(song.user)
+
 @flaskapp.route("/heart-song", methods=["POST"])
 @flask_login.login_required
 def heart_song():
@@ -31,8 +51,9 @@ def heart_song():
     curr_user = flask_login.current_user
     curr_song = get_current_song()
 
-    curr_user.heart_song(curr_song)
+    votes = curr_user.heart_song(curr_song)
     db.session.commit()
+    vote_committed(curr_song, votes)
     return {"response": "song hearted"}, 200
 
 @flaskapp.route("/unheart-song", methods=["POST"])
@@ -45,8 +66,9 @@ def unheart_song():
     curr_user = flask_login.current_user
     curr_song = get_current_song()
 
-    curr_user.unheart_song(curr_song)
+    votes = curr_user.unheart_song(curr_song)
     db.session.commit()
+    vote_committed(curr_song, votes)
     return {"response": "song unhearted"}, 200
 
 @flaskapp.route("/brokenheart-song", methods=["POST"])
@@ -59,8 +81,9 @@ def brokenheart_song():
     curr_user = flask_login.current_user
     curr_song = get_current_song()
 
-    curr_user.brokenheart_song(curr_song)
+    votes = curr_user.brokenheart_song(curr_song)
     db.session.commit()
+    vote_committed(curr_song, votes)
     return {"response": "song brokenhearted"}, 200
 
 @flaskapp.route("/unbrokenheart-song", methods=["POST"])
@@ -73,6 +96,7 @@ def unbrokenheart_song():
     curr_user = flask_login.current_user
     curr_song = get_current_song()
 
-    curr_user.unbrokenheart_song(curr_song)
+    votes = curr_user.unbrokenheart_song(curr_song)
     db.session.commit()
+    vote_committed(curr_song, votes)
     return {"response": "song unbrokenhearted"}, 200
@@ -4,9 +4,10 @@ App views for Hearting/UnHearting Wisps and accessing Hearted Wisps.
 from flask import request
 import flask_login
 
-from app import flaskapp, appconfig, db, constants
+from app import flaskapp, appconfig, db, constants, feedsnapshot
 from app.models import *
-from app.views.get_wisps import get_wisps_for_user
+from app.views.get_wisps import get_wisp_for_user
+from app.conditional_get import conditional_get, user_feed_version
 
 @flaskapp.route("/heart-wisp", methods=["POST"])
 @flask_login.login_required
@@ -26,12 +27,13 @@ def heart_wisp():
     if not wisp_id:
         return {"error": "wisp id not provided"}, 400
 
-    wisp = get_wisps_for_user(user, wisp_id=wisp_id).one()
+    wisp = get_wisp_for_user(curr_user, wisp_id)
     if not wisp:
         return {"error": "wisp not found"}, 404
 
     curr_user.heart_wisp(wisp)
     db.session.commit()
+    feedsnapshot.updated_user(wisp.user)
     return {"response": "wisp hearted"}, 200
 
 @flaskapp.route("/unheart-wisp", methods=["POST"])
@@ -51,22 +53,25 @@ def unheart_wisp():
     if not wisp_id:
         return {"error": "wisp id not provided"}, 400
 
-    wisp = get_wisps_for_user(curr_user, wisp_id=wisp_id).one()
+    wisp = get_wisp_for_user(curr_user, wisp_id)
     if not wisp:
         return {"error": "wisp not found"}, 404
 
     curr_user.unheart_wisp(wisp)
     db.session.commit()
+    feedsnapshot.updated_user(wisp.user)
     return {"response": "wisp unhearted"}, 200
 
 @flaskapp.route("/hearted-wisps", methods=["GET"])
+@conditional_get(user_feed_version)
 @flask_login.login_required
 def hearted_wisps():
     """
     GET endpoint for recieving a complete list of IDs of Wisps 
         Hearted by the current user. This could return a fairly
         large amount of data (up to MAX_WISPS Wisp IDs)
-    :return: 200 and {"wisp_ids"} list
+    :return: 200 and {"wisp_ids"} list, 304 if unchanged since
+        "If-None-Match"
     """
     curr_user = flask_login.current_user
 
@@ -9,14 +9,17 @@ import uuid
 from sqlalchemy.exc import IntegrityError
 
 from app import flaskapp, appconfig, db, constants
-
+from app.conditional_get import conditional_get, ui_config_version
+from app.conditional_get import ui_changed
 from app.models import *
 
 @flaskapp.route("/get-ui", methods=["GET"])
+@conditional_get(ui_config_version)
 def get_ui():
     """
     GET endpoint for checking the currently set UIConfig values.
-    :return: 200 and {"font", "device", "color_palette"} dict
+    :return: 200 and {"font", "device", "color_palette"} dict, 304 if
+        unchanged since "If-None-Match"
     """
     config = db.session.execute(
         db.select(UIConfig).order_by(
@@ -98,6 +101,7 @@ def set_ui(overriding_config=None):
                     "error": "Unable to update config."
                 }, 500
 
+    ui_changed()
     return {"response": "ui updated"}, 200
 
 @flaskapp.route("/check-heartwizard", methods=["GET"])
@@ -6,6 +6,7 @@ import flask_login
 from werkzeug.security import check_password_hash
 
 from app import flaskapp, appconfig, db, constants, twilio_client
+from app import blockcache
 from app.models import User
 
 @flaskapp.route("/login", methods=["POST"])
@@ -19,7 +20,8 @@ def login():
     :jsonparam auth_code: Twilio auth code for users with 2FA 
         enabled. Is generated if login is valid and 2FA is enabled
     :return: 200 if successful, 202 if auth code generated,
-        403 if unsuccessful, 400 if lacking required fields
+        403 if unsuccessful, 400 if lacking required fields. The
+        User's block set is reloaded on login
     """
     phone_number, password, remember, auth_code = (
         request.json.get(key) for key in (
@@ -73,6 +75,7 @@ def login():
                 flask_login.login_user(
                     user, remember=remember
                 )
+                blockcache.invalidate(user.user_id)
                 flaskapp.logger.info(
                     f"Logged in user {user.username}."
                 )
@@ -97,6 +100,7 @@ def login():
             return {"response": "auth code sent"}, 202
     else:
         flask_login.login_user(user, remember=remember)
+        blockcache.invalidate(user.user_id)
         flaskapp.logger.info(
             f"Logged in user {user.username}."
         )
@@ -8,7 +8,7 @@ import bleach
 from werkzeug.utils import secure_filename
 import uuid
 
-from app import flaskapp, appconfig, db, constants
+from app import flaskapp, appconfig, db, constants, feedsnapshot
 from app.core import remove_excess_wisps
 from app.models import *
 
@@ -53,7 +53,7 @@ def post_wisp():
                 gif_uri=gif_uri 
             )
             db.session.add(wisp)
-            remove_excess_wisps()
+            excess_wisp_ids, poster_ids = remove_excess_wisps()
             db.session.commit()
             wisp_added=True
         except IntegrityError:
@@ -70,6 +70,10 @@ def post_wisp():
                     "error": "Unable to create wisp."
                 }, 500
 
+    feedsnapshot.removed(excess_wisp_ids)
+    for poster_id in poster_ids:
+        feedsnapshot.updated_user(db.session.get(User, poster_id))
+    feedsnapshot.posted(wisp)
     return {"response": "wisp posted"}, 201
 
 @flaskapp.route("/gif-search", methods=["GET"])
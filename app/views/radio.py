@@ -9,7 +9,7 @@ from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError, OperationalError
 import uuid
 
-from app import flaskapp, appconfig, db, constants
+from app import flaskapp, appconfig, db, constants, radiocontroller
 from app.models import Song
 
 @flaskapp.route("/check-queue-status", methods=["GET"])
@@ -89,6 +89,7 @@ def queue_song():
                 return {
                     "error": "Unable to queue song."
                 }, 500
+    radiocontroller.invalidate_prefetch()
     return {"response": "song queued"}, 201
 
 @flaskapp.route("/get-song-queuer", methods=["GET"])
@@ -101,6 +102,15 @@ def get_song_queuer():
         "queueing_user_id"} dict, where "queueing_*" is present only 
         if "user_queued" is true
     """
+    now_playing = radiocontroller.get_now_playing()
+    if now_playing:
+        ret_dict = {"user_queued": now_playing["user_id"] is not None}
+        if ret_dict["user_queued"]:
+            ret_dict["queueing_username"] = now_playing["username"]
+            ret_dict["queueing_user_id"] = now_playing["user_id"]
+        return ret_dict, 200
+
+    # radio isn't running in this process
     curr_song = db.session.scalars(
         db.select(Song).filter_by(
             status=constants.PLAYING_SONG
@@ -114,3 +124,28 @@ def get_song_queuer():
         ret_dict["queueing_username"] = curr_song.user.username
         ret_dict["queueing_user_id"] = curr_song.user.user_id
     return ret_dict, 200
+
+@flaskapp.route("/now-playing", methods=["GET"])
+def now_playing():
+    """
+    GET endpoint for the now-playing snapshot: the playing song, who
+        queued it, when it started, its Hearts and BrokenHearts, and
+        the next song lined up. Served from memory.
+    :return: 200 and {"song_id", "uri", "user_id", "username",
+        "started_time", "hearts", "brokenhearts", "next_uri"} dict,
+        or 404 if no song is playing or the radio isn't running in
+        this process
+    """
+    now_playing = radiocontroller.get_now_playing()
+    if now_playing is None:
+        return {"error": "No song playing."}, 404
+    return now_playing, 200
+
+@flaskapp.route("/radio-stats", methods=["GET"])
+def radio_stats():
+    """
+    GET endpoint for monitoring the radio: each mount's connection
+        state, time spent in outages, reconnects, and pacing counters.
+    :return: 200 and {"mounts"} dict, see RadioController.stats
+    """
+    return radiocontroller.stats(), 200
@@ -11,8 +11,10 @@ import bleach
 import os
 
 from app import flaskapp, appconfig, db, constants, twilio_client
+from app import feedsnapshot
 from app.models import User
 from app.views.create_account import check_username
+from app.conditional_get import conditional_get, profiles_version
 
 @flaskapp.route("/update-number", methods=["POST"])
 @flask_login.login_required
@@ -152,6 +154,7 @@ def update_username():
     
     curr_user.username = new_username
     db.session.commit()
+    feedsnapshot.updated_user(curr_user)
     return {"response": "username updated"}, 200
     
 @flaskapp.route("/update-profile", methods=["POST"])
@@ -188,9 +191,11 @@ def update_profile():
     
     curr_user.profile_uri = new_profile
     db.session.commit()
+    feedsnapshot.updated_user(curr_user)
     return {"response": "profile updated"}, 200
 
 @flaskapp.route("/get-profiles", methods=["GET"])
+@conditional_get(profiles_version)
 @flask_login.login_required
 def get_profiles():
     """
@@ -200,7 +205,8 @@ def get_profiles():
     :queryparam folder: folder for which to return GIF URIs
     :return: 200 and {"folders", "profiles"} dict, where "folders"
         is a list of folders and "profiles" a list of profile URIs,
-        or 400 if folder not found
+        or 400 if folder not found, 304 if unchanged since
+        "If-None-Match"
     """
     folder = secure_filename(
         request.args.get("folder", ""))
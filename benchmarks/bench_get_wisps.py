@@ -0,0 +1,82 @@
+"""
+Benchmark of paging through a full feed of MAX_WISPS Wisps with
+    "/get-wisps", by cursor and by Wisp ID. Wisps are posted in
+    batches sharing a timestamp, so pages often end in the middle of
+    a batch.
+"""
+import datetime as dt
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app import flaskapp, appconfig, db
+from app.models import *
+
+# number of Wisps sharing each timestamp
+COLLISION_BATCH = 7
+
+@pytest.fixture
+def full_feed(db_resource, test_user):
+    """
+    Fixture filling the feed with MAX_WISPS Wisps.
+    """
+    # Setup
+    created_time = dt.datetime.now(dt.UTC)
+    db_resource.session.execute(db.insert(Wisp), [{
+        "wisp_id": uuid.uuid1().hex,
+        "user_id": test_user.user_id,
+        "created_time": created_time - dt.timedelta(
+            seconds=i // COLLISION_BATCH),
+        "text": f"BENCH WISP {i}"
+    } for i in range(appconfig["MAX_WISPS"])])
+    db_resource.session.commit()
+
+    # Resource
+    yield appconfig["MAX_WISPS"]
+
+    # No teardown, db_resource empties the database
+
+def walk_feed(client, param: str, key: str) -> tuple:
+    """
+    Page through the whole feed, newest to oldest.
+    :param client: Flask test client
+    :param param: query parameter asking for older Wisps
+    :param key: field of the oldest Wisp of a page passed as "param"
+    :return: (list of Wisp IDs seen, list of page times in ms) tuple
+    """
+    wisp_ids = []
+    page_ms = []
+    params = {}
+    while True:
+        start = time.perf_counter()
+        response = client.get("/get-wisps", query_string=params)
+        page_ms.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+        wisps = response.get_json()["wisps"]
+        if not wisps:
+            return wisp_ids, page_ms
+        wisp_ids += [wisp["wisp_id"] for wisp in wisps]
+        params = {param: wisps[-1][key]}
+
+def test_get_wisps_pages(full_feed, record_result):
+    client = flaskapp.test_client()
+    for param, key in (("older_than", "cursor"),
+                       ("oldest_wisp_id", "wisp_id")):
+        wisp_ids, page_ms = walk_feed(client, param, key)
+        # every Wisp exactly once
+        assert len(wisp_ids) == len(set(wisp_ids)) == full_feed
+        record_result(
+            pagination=param,
+            wisps=len(wisp_ids),
+            pages=len(page_ms),
+            page_ms_mean=statistics.mean(page_ms),
+            page_ms_p95=statistics.quantiles(page_ms, n=20)[-1],
+            page_ms_max=max(page_ms)
+        )
@@ -0,0 +1,100 @@
+"""
+Benchmark of purging thousands of expired Wisps at once, with a full
+    set of Remembrances to compete with, and some of the expired
+    Wisps Hearted.
+"""
+import datetime as dt
+import os
+import random
+import sys
+import uuid
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+from sqlalchemy import event
+
+from app import appconfig, db, constants, scheduled_tasks
+from app.models import *
+
+# fraction of expired Wisps with Hearts
+HEARTED_FRACTION = 0.2
+
+@pytest.fixture(params=[1000, 5000])
+def expired_feed(request, db_resource, test_user, test_user_2):
+    """
+    Fixture filling the database with MAX_REMEMBRANCES Remembrances,
+        and a number of expired live Wisps.
+    """
+    # Setup
+    random.seed(0)
+    expired_time = (dt.datetime.now(dt.UTC) - appconfig["WISP_LIFESPAN"] -
+        dt.timedelta(hours=1))
+    db_resource.session.execute(db.insert(Wisp), [{
+        "wisp_id": uuid.uuid1().hex,
+        "user_id": test_user.user_id,
+        "status": constants.REMEMBRANCE_WISP,
+        "created_time": expired_time - dt.timedelta(days=1, seconds=i),
+        "heart_count": 1,
+        "text": f"BENCH REMEMBRANCE {i}"
+    } for i in range(appconfig["MAX_REMEMBRANCES"])])
+    wisps = [{
+        "wisp_id": uuid.uuid1().hex,
+        "user_id": test_user.user_id,
+        "created_time": expired_time - dt.timedelta(seconds=i),
+        "heart_count": 0,
+        "text": f"BENCH WISP {i}"
+    } for i in range(request.param)]
+    hearts = []
+    for wisp in random.sample(wisps,
+                              int(request.param * HEARTED_FRACTION)):
+        wisp["heart_count"] = 1
+        hearts.append({
+            "hearted_user_id": test_user_2.user_id,
+            "hearted_wisp_id": wisp["wisp_id"]
+        })
+    db_resource.session.execute(db.insert(Wisp), wisps)
+    db_resource.session.execute(
+        db.insert(wisp_heart_association_table), hearts)
+    db_resource.session.execute(
+        db.update(User).filter_by(
+            user_id=test_user.user_id
+        ).values(heartscore=len(hearts)))
+    db_resource.session.commit()
+
+    # Resource
+    yield request.param
+
+    # No teardown, db_resource empties the database
+
+def test_purge_wisps(expired_feed, test_user, record_result):
+    statements = []
+    def count(conn, cursor, statement, parameters, context,
+              executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        report = scheduled_tasks.purge_wisps()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+    live, remembrances = (db.session.execute(
+        db.select(db.func.count()).select_from(Wisp).filter_by(
+            status=status
+        )).scalar() for status in (constants.LIVE_WISP,
+                                   constants.REMEMBRANCE_WISP))
+    assert live == 0
+    assert remembrances == appconfig["MAX_REMEMBRANCES"]
+    # every expired Heart left the poster's HeartScore
+    assert db.session.execute(
+        db.select(User.heartscore).filter_by(
+            user_id=test_user.user_id
+        )).scalar() == 0
+    assert report["rows"] == expired_feed
+    record_result(
+        expired_wisps=expired_feed,
+        transactions=report["chunks"],
+        statements=len(statements),
+        purge_ms=report["ms"]
+    )
@@ -0,0 +1,180 @@
+"""
+Benchmark of the whole radio pipeline, "gen_songs" through "stream",
+    against a FakeShout instead of an Icecast server. Plays a
+    synthetic song corpus faster than real time, skips once, and
+    records per-track CPU time and peak RSS, delivered bytes/sec,
+    inter-chunk jitter and time-to-first-byte after the skip.
+"""
+import itertools
+import os
+import statistics
+import sys
+import threading
+import time
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+from pydub.generators import Sine
+from pydub import AudioSegment
+
+from app import appconfig
+from app.radio_controller import RadioController
+from benchmarks.fakes import FakeShout, thread_cpu_time, current_rss
+
+# synthetic corpus: one song per frequency, SONG_SECONDS long, with
+# a bit of silence at either end
+FREQUENCIES = (220, 330, 440, 550)
+SONG_SECONDS = 20
+SONG_SILENCE_MS = 500
+# playback speed relative to real time
+PACE = 4.0
+# interval of the RSS sampler, in seconds
+RSS_SAMPLE_INTERVAL = 0.05
+# longest a run may take, in seconds
+RUN_TIMEOUT = 120
+
+@pytest.fixture(scope="module")
+def song_corpus(tmp_path_factory):
+    """
+    Fixture generating the synthetic song corpus as MP3 files.
+    """
+    # Setup
+    song_dir = tmp_path_factory.mktemp("songs")
+    uris = []
+    for frequency in FREQUENCIES:
+        silence = AudioSegment.silent(SONG_SILENCE_MS,
+            frame_rate=appconfig["ICECAST_SAMPLERATE"])
+        song = silence + Sine(
+            frequency, sample_rate=appconfig["ICECAST_SAMPLERATE"]
+        ).to_audio_segment(SONG_SECONDS * 1000, volume=-12) + silence
+        song = song.set_channels(appconfig["ICECAST_CHANNELS"])
+        uri = f"sine_{frequency}.mp3"
+        song.export(os.path.join(song_dir, uri), format="mp3",
+            bitrate=f"{appconfig['ICECAST_BITRATE']}k")
+        uris.append(uri)
+
+    # Resource
+    yield str(song_dir), uris
+
+    # No teardown
+
+class TrackProbe():
+    """
+    Records the start of each segment rendered by "gen_songs", along
+        with its thread CPU time, the CPU time of finished ffmpeg
+        processes and the peak RSS since the previous one, and the
+        moment the segment buffer is skipped.
+    """
+    def __init__(self, controller: RadioController):
+        """
+        Initialization actions. Wraps the controller's segment buffer.
+        :param controller: RadioController about to be started
+        """
+        self.controller = controller
+        self.segment_starts = []
+        self.skip_times = []
+        self.peak_rss = 0
+        self.stop_signal = threading.Event()
+        self.sampler_thread = threading.Thread(target=self.sample_rss)
+
+        segment_queue = controller.mounts[0].segment_queue
+        begin_segment = segment_queue.begin_segment
+        skip = segment_queue.skip
+        def probed_begin_segment() -> int:
+            self.segment_starts.append((
+                time.monotonic(),
+                thread_cpu_time(controller.gen_songs_thread),
+                os.times().children_user + os.times().children_system,
+                self.take_peak_rss()
+            ))
+            return begin_segment()
+        def probed_skip():
+            self.skip_times.append(time.monotonic())
+            skip()
+        segment_queue.begin_segment = probed_begin_segment
+        segment_queue.skip = probed_skip
+
+    def take_peak_rss(self) -> int:
+        """
+        Get the peak RSS since the last call, and start a new period.
+        :return: peak RSS in bytes
+        """
+        peak, self.peak_rss = self.peak_rss, current_rss()
+        return max(peak, self.peak_rss)
+
+    def sample_rss(self):
+        """
+        Thread sampling the RSS of the process.
+        """
+        while not self.stop_signal.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def wait_for_segments(self, count: int):
+        """
+        Block until "count" segments have started.
+        :param count: number of segments
+        """
+        deadline = time.monotonic() + RUN_TIMEOUT
+        while len(self.segment_starts) < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+def test_radio_pipeline(song_corpus, record_result, monkeypatch):
+    song_dir, uris = song_corpus
+    monkeypatch.setitem(appconfig, "SONG_PATH", song_dir)
+    controller = RadioController()
+    fake_shout = FakeShout()
+    controller.mounts[0].stream_obj = fake_shout
+    controller.mounts[0].pacer.speed = PACE
+    corpus_cycle = itertools.cycle(uris)
+    controller.pick_otto_uri = lambda: next(corpus_cycle)
+
+    probe = TrackProbe(controller)
+    probe.sampler_thread.start()
+    controller.start_threads()
+    try:
+        # play the first track through, skip halfway into the second
+        probe.wait_for_segments(2)
+        time.sleep((SONG_SECONDS -
+            appconfig["CROSSFADE_LENGTH"] / 1000) / PACE / 2)
+        skip_time = time.monotonic()
+        controller.skip_song()
+        probe.wait_for_segments(len(uris) + 2)
+    finally:
+        controller.shutdown()
+        probe.stop_signal.set()
+        probe.sampler_thread.join()
+
+    # per-track CPU time and peak RSS, between segment starts
+    for track, (start, end) in enumerate(
+            zip(probe.segment_starts, probe.segment_starts[1:])):
+        record_result(
+            track=track,
+            seconds=end[0] - start[0],
+            gen_songs_cpu_seconds=end[1] - start[1],
+            ffmpeg_cpu_seconds=end[2] - start[2],
+            peak_rss_bytes=end[3]
+        )
+
+    sends = fake_shout.sends
+    assert sends and probe.skip_times
+    seconds = sends[-1][0] - sends[0][0]
+    gaps = [(later[0] - earlier[0]) * 1000
+        for earlier, later in zip(sends, sends[1:])]
+    after_skip = fake_shout.sends_after(probe.skip_times[0])
+    record_result(
+        tracks=len(probe.segment_starts) - 1,
+        pace=PACE,
+        bytes_per_second=sum(size for _, size in sends) / seconds,
+        expected_bytes_per_second=(
+            appconfig["ICECAST_BITRATE"] * 1000 / 8 * PACE),
+        chunk_gap_mean_ms=statistics.mean(gaps),
+        chunk_gap_stdev_ms=statistics.pstdev(gaps),
+        chunk_gap_max_ms=max(gaps),
+        skip_ttfb_ms=(after_skip[0][0] - skip_time) * 1000
+            if after_skip else None,
+        **controller.mounts[0].pacer.stats()
+    )
+    assert after_skip
@@ -0,0 +1,67 @@
+"""
+Benchmark of the CPU time spent by the radio "stream" thread while
+    the segment buffer is empty, e.g. while "gen_songs" is decoding
+    the next song.
+"""
+import os
+import sys
+import queue
+import threading
+import time
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app.radio_controller import RadioController
+from benchmarks.fakes import FakeShout, thread_cpu_time
+
+IDLE_SECONDS = 5
+# idle stream thread may use at most this fraction of a core
+MAX_IDLE_CPU_RATIO = 0.01
+
+def measure_idle(target, stop) -> float:
+    """
+    Run the given loop in a thread for IDLE_SECONDS with nothing to
+        stream, and return the fraction of a core it consumed.
+    :param target: thread function
+    :param stop: function stopping the thread
+    :return: CPU time / wall time ratio
+    """
+    thread = threading.Thread(target=target)
+    thread.start()
+    time.sleep(0.1)
+    cpu_start, wall_start = thread_cpu_time(thread), time.monotonic()
+    time.sleep(IDLE_SECONDS)
+    cpu_ratio = ((thread_cpu_time(thread) - cpu_start) / 
+        (time.monotonic() - wall_start))
+    stop()
+    thread.join()
+    return cpu_ratio
+
+def test_idle_stream_cpu(record_result):
+    controller = RadioController()
+    mount = controller.mounts[0]
+    mount.stream_obj = FakeShout()
+    def stop():
+        controller.kill_signal.set()
+        mount.segment_queue.wake()
+    stream_ratio = measure_idle(mount.stream, stop)
+
+    # previous busy-wait loop, for reference
+    spin_signal = threading.Event()
+    def spin():
+        while not spin_signal.is_set():
+            try:
+                mount.segment_queue.get_nowait()
+            except queue.Empty:
+                continue
+    spin_ratio = measure_idle(spin, spin_signal.set)
+
+    record_result(
+        idle_seconds=IDLE_SECONDS,
+        stream_cpu_ratio=stream_ratio,
+        busy_wait_cpu_ratio=spin_ratio
+    )
+    assert stream_ratio < MAX_IDLE_CPU_RATIO
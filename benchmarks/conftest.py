@@ -0,0 +1,31 @@
+"""
+Defining shared fixtures for benchmarks. Benchmarks are run explicitly,
+    e.g. "python -m pytest benchmarks/bench_stream_idle.py -s", and
+    append their results as JSON lines to BENCH_RESULTS_FILE.
+"""
+import json
+import os
+
+import pytest
+
+pytest_plugins = ["tests.shared_fixtures"]
+
+BENCH_RESULTS_FILE = os.environ.get(
+    "BENCH_RESULTS_FILE", "bench_results.jsonl")
+
+@pytest.fixture
+def record_result(request):
+    """
+    Fixture returning a function which records one benchmark result,
+        tagged with the name of the running benchmark.
+    """
+    def record(**metrics):
+        result = {"benchmark": request.node.name, **metrics}
+        print(json.dumps(result))
+        with open(BENCH_RESULTS_FILE, "a") as results_fp:
+            results_fp.write(json.dumps(result) + "\n")
+
+    # Resource
+    yield record
+
+    # No teardown
@@ -0,0 +1,68 @@
+"""
+Stand-ins and measurement helpers shared between radio benchmarks.
+"""
+import os
+import threading
+import time
+
+import shout
+
+class FakeShout():
+    """
+    Stand-in for shout.Shout which records everything sent to it,
+        instead of connecting to an Icecast server.
+    """
+    def __init__(self):
+        """
+        Initialization actions.
+        """
+        # (monotonic time, number of bytes) of each send
+        self.sends = []
+        self.metadata = []
+        self.lock = threading.Lock()
+
+    def open(self) -> int:
+        # shout.Shout.open returns 1 on success
+        return 1
+
+    def get_connected(self) -> int:
+        return shout.SHOUTERR_CONNECTED
+
+    def send(self, data: bytes):
+        with self.lock:
+            self.sends.append((time.monotonic(), len(data)))
+
+    def sync(self):
+        pass
+
+    def set_metadata(self, metadata: dict):
+        self.metadata.append((time.monotonic(), metadata))
+
+    def close(self):
+        pass
+
+    def sends_after(self, start: float) -> list:
+        """
+        Get the sends recorded after a point in time.
+        :param start: monotonic time
+        :return: list of (monotonic time, number of bytes) tuples
+        """
+        with self.lock:
+            return [send for send in self.sends if send[0] >= start]
+
+def thread_cpu_time(thread: threading.Thread) -> float:
+    """
+    Get the CPU time consumed so far by a running thread.
+    :param thread: started thread
+    :return: CPU time in seconds
+    """
+    return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+
+def current_rss() -> int:
+    """
+    Get the resident set size of this process.
+    :return: RSS in bytes
+    """
+    with open("/proc/self/statm") as statm_fp:
+        pages = int(statm_fp.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE")
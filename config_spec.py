@@ -54,9 +54,69 @@ class Config:
     ICECAST_BITRATE = 128
     ICECAST_SAMPLERATE = 44100
     ICECAST_CHANNELS = 2
+    # additional mounts streaming the same audio at other bitrates,
+    # e.g. [{"mountpoint": "mobile", "bitrate": 48}]. The audio is
+    # decoded and crossfaded once, then encoded once per mount
+    ICECAST_EXTRA_MOUNTS = []
 
     # length of crossfade, in milliseconds
     CROSSFADE_LENGTH = 5000
+    # length of the raw PCM blocks songs are decoded in, in 
+    # milliseconds. Bounds the radio's memory use per song
+    RADIO_BLOCK_LENGTH = 500
+    # pass the MP3 frames of each song through untouched, re-encoding
+    # only the crossfaded edges. Songs which don't match the stream's
+    # sample rate and channels are always fully re-encoded
+    RADIO_SPLICE_MODE = False
+    # size of the in-memory buffer of encoded audio between song 
+    # generation and the stream, in bytes (~16 seconds at 128 kbps)
+    RADIO_BUFFER_SIZE = 262144
+    # how far ahead of real time audio is sent to the Icecast server,
+    # in milliseconds. The stream catches up by at most this much
+    # after falling behind
+    RADIO_STREAM_LEAD = 250
+    # delay before retrying a lost (or never made) Icecast connection,
+    # in seconds, doubling after each failed attempt up to the maximum
+    RADIO_RECONNECT_MIN_DELAY = 0.5
+    RADIO_RECONNECT_MAX_DELAY = 30
+    # number of upcoming songs (queued, then autoplay picks) to open 
+    # and decode the start of ahead of time, and the number of 
+    # background workers doing it
+    RADIO_LOOKAHEAD_SONGS = 2
+    RADIO_PREFETCH_WORKERS = 2
+
+    # Interval for scheduled task to rescan the songs directory for
+    # the song catalog, in seconds
+    SONG_CATALOG_REFRESH_INTERVAL = 300
+    # Interval for scheduled task to analyze the loudness and silence
+    # of new catalog songs, in seconds, and the number of songs
+    # analyzed per run
+    SONG_ANALYSIS_INTERVAL = 60
+    SONG_ANALYSIS_BATCH = 10
+    # loudness songs are normalized to, in dBFS (measured as the 95th
+    # percentile of 50 millisecond RMS windows), and the largest gain
+    # applied either way, in dB
+    SONG_TARGET_LOUDNESS = -18.0
+    SONG_MAX_GAIN = 12.0
+    # level below which the start and end of a song count as silence
+    # and are trimmed, in dBFS
+    SONG_SILENCE_THRESHOLD = -50.0
+    
+    # Event Server Settings
+    # Server-Sent Events are served on their own port, which should be
+    # proxied to EVENT_SERVER_PATH on the site's domain
+    EVENT_SERVER_HOST = "127.0.0.1"
+    EVENT_SERVER_PORT = 5001
+    EVENT_SERVER_PATH = "/events"
+    # interval between heartbeats sent to quiet listeners, in seconds.
+    # Connections which haven't sent a request within it are closed
+    EVENT_HEARTBEAT_INTERVAL = 15
+    # delay before listeners reconnect after losing the connection, in
+    # milliseconds
+    EVENT_RETRY = 3000
+    # most bytes held for a listener which isn't reading its events 
+    # before it's disconnected
+    EVENT_MAX_BACKLOG = 65536
     
     # App Behavior Settings
 
@@ -74,6 +134,17 @@ class Config:
 
     # Interval for scheduled task to purge old Wisps, in seconds
     WISP_PURGE_INTERVAL = 60
+    # Interval for scheduled task to purge played Songs, in seconds,
+    # and how long they're kept after playing
+    SONG_PURGE_INTERVAL = 600
+    SONG_LIFESPAN = timedelta(hours=24)
+    # Most Wisps or Songs purged per transaction, and the pause 
+    # between transactions, in seconds, which lets requests write
+    PURGE_CHUNK_SIZE = 500
+    PURGE_CHUNK_PAUSE = 0.05
+    # Interval for scheduled task to correct Wisp and Song Heart
+    # counts which drifted from their Hearts, in seconds
+    HEART_COUNT_RECONCILE_INTERVAL = 3600
     
     MAX_WISP_LENGTH = 140
     WISP_LIFESPAN = timedelta(hours=24)
@@ -83,6 +154,10 @@ class Config:
 
     # Number of Wisps to load per API request
     WISPS_PER_PAGE = 100
+    # Number of newest Wisps kept serialized in memory for every 
+    # reader. Larger than a page, so readers with blocks can be served
+    # from it too
+    FEED_SNAPSHOT_SIZE = 200
 
     MAX_INVITES = 50
     INVITE_MSG = ("You Have Been Invited To Join Eric's World! " +
@@ -92,6 +167,11 @@ class Config:
     # number of people who must block an account before it's 
     # permabanned
     BLOCKS_TO_BAN = 20
+    # number of Users whose block sets are cached, and how long a 
+    # cached block set is trusted, in seconds. Blocks made through
+    # another server process can take this long to apply
+    BLOCK_CACHE_SIZE = 10000
+    BLOCK_CACHE_TTL = 60
 
     WEBMASTER_EMAIL = "webmaster@ericsworld.net"
 
@@ -172,6 +252,18 @@ class Config:
             Config.GIF_PATH, gif_uri
         ))
 
+    def SONG_URI_CHECK(song_uri: str) -> bool:
+        """
+        Song URI check. Ensures that Song URI refers to an existing
+            song, using the song catalog so that only songs added
+            since its last refresh touch the filesystem. Song URI 
+            should be sanitized before checking
+        :param song_uri: URI to check
+        :return: True if valid
+        """
+        from app import songcatalog
+        return songcatalog.contains(song_uri)
+
     # UI Settings
     # lists of permitted fonts, device uris, and color palettes
     FONTS = ["jgs"]
@@ -31,27 +31,62 @@ class WispScreen extends React.Component {
         // actual screen top scroll percent (goes from 0 to 
         // (scrollHeight - clientHeight) / scrollHeight)
         this.scrollRatio = 1.0;
+
+        // pushes new and removed Wisps, opened on mount
+        this.eventSource = null;
     }
 
     componentDidMount() {
         this.getWisps();
+        this.listenForWisps();
         // The scrollbar has an unfortunate tendency to get
         // stuck, so this should run periodically to make sure the 
         // CSS variable is kept current
         setInterval(this.updateScroll.bind(this), 250);
     }
 
+    componentWillUnmount() {
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
+    }
+
+    // Subscribe to the "wisps" event channel. "new" carries the 
+    // cursor of the newest Wisp (and is replayed on every 
+    // (re)connect), so Wisps newer than the newest loaded one are
+    // only fetched when there are some, and "removed" the IDs of
+    // Wisps no longer live
+    listenForWisps() {
+        this.eventSource = new EventSource(
+            `${Constants.EVENTS_ENDPOINT}?channels=wisps`);
+        this.eventSource.addEventListener("new", event => {
+            let newest = JSON.parse(event.data)["cursor"];
+            if (this.state.wisps.length === 0 ||
+                    this.state.wisps[0]["cursor"] !== newest) {
+                this.getWisps();
+            }
+        });
+        this.eventSource.addEventListener("removed", event => {
+            let wispIDs = JSON.parse(event.data)["wisp_ids"];
+            this.setState({
+                wisps: this.state.wisps.filter(
+                    wisp => !wispIDs.includes(wisp["wisp_id"]))
+            });
+        });
+    }
+
     // Query backend for Wisps and update state object
-    getWisps(newestWispId=null, oldestWispId=null) {
+    // "newerThan" and "olderThan" are the "cursor" of a loaded Wisp
+    getWisps(newerThan=null, olderThan=null) {
         let params = new URLSearchParams();
-        if (newestWispId === null && oldestWispId === null &&
+        if (newerThan === null && olderThan === null &&
                 this.state.wisps.length > 0) {
-            newestWispId = this.state.wisps[0]["wisp_id"];
+            newerThan = this.state.wisps[0]["cursor"];
         }
-        if (newestWispId) {
-            params.append("newest_wisp_id", newestWispId);
-        } else if (oldestWispId) {
-            params.append("oldest_wisp_id", oldestWispId);
+        if (newerThan) {
+            params.append("newer_than", newerThan);
+        } else if (olderThan) {
+            params.append("older_than", olderThan);
         }
 
         if (this.props.accountInfo !== null) {
@@ -70,17 +105,17 @@ class WispScreen extends React.Component {
         .then(response => response.json())
         .then(wispResp => {
             let wisps = wispResp["wisps"];
-            if (newestWispId) {
+            if (newerThan) {
                 this.setState({
                     wisps: wisps.concat(this.state.wisps)
                 });
-            } else if (oldestWispId) {
+            } else if (olderThan) {
                 this.setState({
                     wisps: this.state.wisps.concat(wisps)
                 });
             } else {
                 wisps = wisps.filter(wisp => {
-                    for (var existing_wisp in this.state.wisps) {
+                    for (let existing_wisp of this.state.wisps) {
                         if (wisp["wisp_id"] === 
                                 existing_wisp["wisp_id"]) {
                             return false;
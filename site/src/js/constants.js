@@ -47,6 +47,9 @@ class Constants {
     static GIF_SEARCH_ENDPOINT  = (
         `${Constants.BACKEND_URL}/gif-search`);
 
+    // Server-Sent Events, proxied to the event server
+    static EVENTS_ENDPOINT      = `${Constants.BACKEND_URL}/events`;
+
     // width and height of virtual grid
     static VGRID_DIMENSION = 1000;
     // static VGRID_HEIGHT = 1000; 
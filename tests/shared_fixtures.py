@@ -23,6 +23,7 @@ from test_config import Config
 from tests import constants as testconstants
 
 from app import *
+from app.conditional_get import ui_changed
 
 @pytest.fixture(autouse=True)
 def remove_reset_token():
@@ -77,6 +78,9 @@ def db_resource():
     for tbl in reversed(db.metadata.sorted_tables):
         session.execute(tbl.delete())
     session.commit()
+    # the tables were emptied behind the versions' backs
+    feedsnapshot.invalidate()
+    ui_changed()
     thread = start_server()
 
 
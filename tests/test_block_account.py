@@ -15,7 +15,7 @@ from datetime import datetime
 from sqlalchemy.orm import sessionmaker
 
 from app import constants as appconstants
-from app import appconfig
+from app import appconfig, blockcache
 from app.models import *
 
 from tests.constants import *
@@ -83,6 +83,17 @@ def test_block_wisps(user_sess, user_2_sess):
         print(wisps)
         assert (len(wisps) == NUM_TEST_WISPS)
 
+def test_block_invalidates_other_processes(user_sess, test_user,
+                                          test_user_2, test_wisp_2):
+    # cached in this process, then blocked in the server process
+    assert test_user_2.user_id not in blockcache.get(test_user.user_id)
+    response = user_sess.post(
+        f"{BASE_URL}/block-account",
+        json={"wisp_id": test_wisp_2["wisp_id"]}
+    )
+    assert response.status_code == 200
+    assert test_user_2.user_id in blockcache.get(test_user.user_id)
+
 def test_self_block(user_sess, test_wisp):
     response = user_sess.post(
         f"{BASE_URL}/block-account",
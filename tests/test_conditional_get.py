@@ -0,0 +1,127 @@
+"""
+Test suite for conditional GETs of the feed and read-only endpoints.
+"""
+import os
+import sys
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import flaskapp, appconfig, db, feedsnapshot, blockcache
+from app import conditional_get
+from app.conditional_get import ui_changed
+from app.models import *
+
+from tests.constants import *
+
+ENDPOINTS = ["/get-wisps", "/get-remembrances", "/get-ui",
+    "/get-profiles", "/hearted-wisps"]
+
+@pytest.fixture
+def user_client(test_user):
+    """
+    Fixture providing an in-process client logged in as test_user, so
+        that the queries of its requests can be counted.
+    """
+    # Setup
+    client = flaskapp.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = test_user.login_id
+        session["_fresh"] = True
+
+    # Resource
+    yield client
+
+    # No teardown
+
+def count_statements(run) -> int:
+    """
+    Helper method, count the statements executed while running a
+        function.
+    :param run: function to run
+    :return: number of statements
+    """
+    statements = []
+    def count(conn, cursor, statement, parameters, context,
+              executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return len(statements)
+
+def test_unchanged_polls(user_client):
+    for endpoint in ENDPOINTS:
+        response = user_client.get(endpoint)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        responses = []
+        assert count_statements(lambda: responses.append(
+            user_client.get(endpoint, headers={"If-None-Match": etag})
+        )) == 0
+        assert responses[0].status_code == 304
+        assert responses[0].headers["ETag"] == etag
+        assert not responses[0].data
+
+def test_changed_polls(user_client, test_user, test_user_2):
+    etags = {endpoint: user_client.get(endpoint).headers["ETag"]
+        for endpoint in ENDPOINTS}
+
+    # a Wisp written directly, announced to the snapshot
+    session = Session.object_session(test_user)
+    session.add(Wisp(
+        wisp_id="f" * 32,
+        user=session.merge(test_user_2),
+        text=TEST_WISP["text"]
+    ))
+    session.commit()
+    feedsnapshot.invalidate()
+    ui_changed()
+    for endpoint in ("/get-wisps", "/get-remembrances", "/get-ui",
+                     "/hearted-wisps"):
+        response = user_client.get(endpoint,
+            headers={"If-None-Match": etags[endpoint]})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etags[endpoint]
+    response = user_client.get("/get-wisps")
+    assert [wisp["wisp_id"] for wisp in response.get_json()["wisps"]] == [
+        "f" * 32]
+
+    # other Users' feeds have their own tags
+    client = flaskapp.test_client()
+    response = client.get("/get-wisps")
+    assert response.status_code == 200
+    assert (user_client.get("/get-wisps").headers["ETag"] !=
+        response.headers["ETag"])
+
+    # login is still required
+    response = client.get("/hearted-wisps",
+        headers={"If-None-Match": etags["/hearted-wisps"]})
+    assert response.status_code == 401
+
+def test_restart(user_client, monkeypatch):
+    etags = {endpoint: user_client.get(endpoint).headers["ETag"]
+        for endpoint in ENDPOINTS}
+    # versions are unchanged, but the server restarted
+    monkeypatch.setattr(conditional_get, "boot_id", "restarted")
+    for endpoint in ENDPOINTS:
+        response = user_client.get(endpoint,
+            headers={"If-None-Match": etags[endpoint]})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etags[endpoint]
+
+def test_block_change(user_client, test_user):
+    etag = user_client.get("/get-wisps").headers["ETag"]
+    # block sets changed, in this process or any other
+    blockcache.invalidate(test_user.user_id)
+    response = user_client.get("/get-wisps",
+        headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
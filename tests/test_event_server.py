@@ -0,0 +1,94 @@
+"""
+Test suite for the Server-Sent Events broadcaster.
+"""
+import os
+import socket
+import sys
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app import appconfig
+from app.event_server import EventServer, encode_event
+
+TIMEOUT = 2
+
+@pytest.fixture
+def event_server():
+    """
+    Fixture running an EventServer on a free port.
+    """
+    # Setup
+    server = EventServer("127.0.0.1", 0)
+
+    # Resource
+    yield server
+
+    # Teardown
+    server.shutdown()
+
+def listen(server: EventServer, path: str) -> socket.socket:
+    """
+    Helper method, connect to the server and request a path.
+    :param server: started EventServer
+    :param path: request path, with query string
+    :return: connected socket
+    """
+    sock = socket.create_connection(("127.0.0.1", server.port), TIMEOUT)
+    sock.sendall(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode())
+    return sock
+
+def read_until(sock: socket.socket, data: bytes) -> bytes:
+    """
+    Helper method, read from a socket until some data is received.
+    :param sock: connected socket
+    :param data: bytes to wait for
+    :return: everything read
+    """
+    received = b""
+    while data not in received:
+        chunk = sock.recv(4096)
+        assert chunk
+        received += chunk
+    return received
+
+def test_broadcast(event_server):
+    event_server.startup()
+    radio = listen(event_server,
+        f"{appconfig['EVENT_SERVER_PATH']}?channels=radio")
+    everything = listen(event_server, appconfig["EVENT_SERVER_PATH"])
+    for sock in (radio, everything):
+        head = read_until(sock, b"\n\n")
+        assert b"text/event-stream" in head
+
+    event_server.publish("wisps", "new", {"count": 1})
+    event_server.publish("radio", "skip", {})
+    assert read_until(radio, b"\n\n") == encode_event("skip", {})
+    received = read_until(everything, encode_event("skip", {}))
+    assert received == (encode_event("new", {"count": 1}) +
+        encode_event("skip", {}))
+    radio.close()
+    everything.close()
+
+def test_retained(event_server):
+    # published before the server runs, so they're read in one batch
+    for hearts in range(3):
+        event_server.publish("radio", "votes", {"hearts": hearts},
+            retain=True)
+    event_server.publish("radio", "skip", {})
+    event_server.startup()
+    sock = listen(event_server,
+        f"{appconfig['EVENT_SERVER_PATH']}?channels=radio")
+    received = read_until(sock, encode_event("votes", {"hearts": 2}))
+    # only the latest tally, and not the skip which happened before
+    assert b"event: skip" not in received
+    assert received.count(b"event: votes") == 1
+    sock.close()
+
+def test_not_found(event_server):
+    event_server.startup()
+    sock = listen(event_server, "/get-wisps")
+    assert read_until(sock, b"\r\n").startswith(b"HTTP/1.1 404")
+    sock.close()
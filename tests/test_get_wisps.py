@@ -12,10 +12,15 @@ import time
 import uuid
 import datetime as dt
 
+from flask_login import AnonymousUserMixin
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from app import constants as appconstants
-from app import appconfig
+from app import appconfig, db, blockcache, feedsnapshot
+from app.feed_snapshot import decode_cursor
+from app.core import promote_or_remove_wisps
+from app.views.get_wisps import get_wisps_for_user
 from app.models import *
 
 from tests.constants import *
@@ -96,6 +101,7 @@ def test_simultaneous_wisps(db_resource, test_user, user_sess):
         session = Session.object_session(test_user)
         session.add(wisp)
         session.commit()
+    feedsnapshot.invalidate()
     time.sleep(0.5)
     response = user_sess.get(
         f"{BASE_URL}/get-wisps"
@@ -163,7 +169,130 @@ def test_anonymous_wisp(user_sess, req_sess):
         assert len(older_wisps) == NUM_TEST_WISPS - 1 - i
         if len(older_wisps):
             assert older_wisps[0] == wisps[i + 1]
-        
+
+def test_cursor_pagination(db_resource, test_user, user_sess):
+    # batches of 4 simultaneous Wisps
+    NUM_TEST_WISPS = 10
+    session = Session.object_session(test_user)
+    created_time = dt.datetime.now(dt.UTC)
+    for i in range(NUM_TEST_WISPS):
+        session.add(Wisp(
+            wisp_id=uuid.uuid1().hex,
+            created_time=created_time + dt.timedelta(seconds=i // 4),
+            user=test_user,
+            text=f"TEST WISP {i}"
+        ))
+    session.commit()
+    feedsnapshot.invalidate()
+    response = user_sess.get(
+        f"{BASE_URL}/get-wisps"
+    )
+    assert response.status_code == 200
+    wisps = response.json()["wisps"]
+    assert len(wisps) == NUM_TEST_WISPS
+
+    # walking older pages from each cursor gives the rest of the feed
+    for i in range(NUM_TEST_WISPS):
+        response = user_sess.get(
+            f"{BASE_URL}/get-wisps",
+            params={"older_than": wisps[i]["cursor"]}
+        )
+        assert response.status_code == 200
+        assert response.json()["wisps"] == wisps[i + 1:]
+
+        response = user_sess.get(
+            f"{BASE_URL}/get-wisps",
+            params={"newer_than": wisps[i]["cursor"]}
+        )
+        assert response.status_code == 200
+        assert response.json()["wisps"] == wisps[:i]
+
+    response = user_sess.get(
+        f"{BASE_URL}/get-wisps",
+        params={"older_than": "not a cursor"}
+    )
+    assert response.status_code == 400
+
+def test_feed_query_count(db_resource, test_user, test_user_2, 
+                          test_user_3):
+    # Wisps from several posters, one of them blocked
+    session = Session.object_session(test_user)
+    for user in (test_user_2, test_user_3):
+        user = session.merge(user)
+        for i in range(5):
+            session.add(Wisp(
+                wisp_id=uuid.uuid1().hex,
+                user=user,
+                text=f"TEST WISP {i}"
+            ))
+    test_user.blocked_users.append(session.merge(test_user_3))
+    session.commit()
+    blockcache.invalidate(test_user.user_id)
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, 
+              executemany):
+        statements.append(statement)
+    db.session.remove()
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        wisp_dicts = [wisp.to_dict() for wisp in get_wisps_for_user(
+            test_user, status=appconstants.LIVE_WISP
+        ).all()]
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert len(wisp_dicts) == 5
+    assert {wisp["user_username"] for wisp in wisp_dicts} == {
+        TEST_USER_2["username"]}
+    # block set, then the Wisps along with their posters
+    assert len(statements) == 2
+
+def test_feed_snapshot(db_resource, test_user, test_user_2):
+    session = Session.object_session(test_user)
+    poster = session.merge(test_user_2)
+    wisp_ids = []
+    for i in range(3):
+        wisp_ids.append(uuid.uuid1().hex)
+        session.add(Wisp(
+            wisp_id=wisp_ids[-1],
+            user=poster,
+            text=f"TEST WISP {i}"
+        ))
+    session.commit()
+    feedsnapshot.invalidate()
+    anonymous = AnonymousUserMixin()
+    wisps = feedsnapshot.page(anonymous)
+    assert len(wisps) == 3
+
+    # served from memory once loaded
+    statements = []
+    def count(conn, cursor, statement, parameters, context, 
+              executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        assert feedsnapshot.page(anonymous) == wisps
+        assert feedsnapshot.page(anonymous,
+            decode_cursor(wisps[1]["cursor"])) == wisps[:1]
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert not statements
+
+    # updated in place
+    feedsnapshot.removed(wisp_ids[:1])
+    poster.username = "snapshotuser"
+    session.commit()
+    feedsnapshot.updated_user(poster)
+    wisps = feedsnapshot.page(anonymous)
+    assert len(wisps) == 2
+    assert {wisp["user_username"] for wisp in wisps} == {"snapshotuser"}
+
+    # filtered by the reader's blocks
+    test_user.blocked_users.append(poster)
+    session.commit()
+    blockcache.invalidate(test_user.user_id)
+    assert feedsnapshot.page(test_user) == []
+
 def test_check_newest_wisp(user_sess):
     response = user_sess.get(
         f"{BASE_URL}/check-newest-wisp",
@@ -260,3 +389,42 @@ def test_remembrances(user_sess, user_2_sess):
     assert len(rems) == appconfig["MAX_REMEMBRANCES"]
     print(rems)
     
+
+def test_promote_or_remove_wisps(db_resource, test_user):
+    session = Session.object_session(test_user)
+    created_time = dt.datetime.now(dt.UTC)
+    remembrance_ids = []
+    for i in range(appconfig["MAX_REMEMBRANCES"]):
+        remembrance_ids.append(uuid.uuid1().hex)
+        session.add(Wisp(
+            wisp_id=remembrance_ids[-1],
+            user=test_user,
+            status=appconstants.REMEMBRANCE_WISP,
+            created_time=created_time + dt.timedelta(seconds=i),
+            heart_count=1,
+            text=f"TEST REMEMBRANCE {i}"
+        ))
+    expired_ids = []
+    for hearts in (0, 2, 1):
+        expired_ids.append(uuid.uuid1().hex)
+        session.add(Wisp(
+            wisp_id=expired_ids[-1],
+            user=test_user,
+            heart_count=hearts,
+            text=f"TEST WISP {hearts}"
+        ))
+    test_user.heartscore = 3
+    session.commit()
+
+    assert promote_or_remove_wisps(expired_ids) == {test_user.user_id}
+    db.session.commit()
+    statuses = dict(db.session.execute(
+        db.select(Wisp.wisp_id, Wisp.status)).all())
+    # the Wisp with more Hearts replaces the oldest Remembrance, ties
+    # keep the Remembrances
+    assert statuses == {
+        **{wisp_id: appconstants.REMEMBRANCE_WISP
+            for wisp_id in remembrance_ids[1:]},
+        expired_ids[1]: appconstants.REMEMBRANCE_WISP
+    }
+    assert db.session.get(User, test_user.user_id).heartscore == 0
@@ -15,7 +15,7 @@ from datetime import datetime
 from sqlalchemy.orm import sessionmaker
 
 from app import constants as appconstants
-from app import appconfig
+from app import appconfig, db, scheduled_tasks
 from app.models import *
 
 from tests.constants import *
@@ -97,6 +97,42 @@ def test_unheart_wisp(test_wisp, user_sess, user_2_sess):
     )
     assert response.json()["heartscore"] == 0
 
+def get_heart_count(wisp_id: str) -> int:
+    """
+    Helper method, read a Wisp's Heart count as committed by the
+        server.
+    :param wisp_id: ID of the Wisp
+    :return: heart_count
+    """
+    session = sessionmaker(bind=db.engine)()
+    try:
+        return session.get(Wisp, wisp_id).heart_count
+    finally:
+        session.close()
+
+def test_heart_count(test_wisp, user_sess, user_2_sess, user_3_sess):
+    for sess in (user_2_sess, user_3_sess):
+        response = sess.post(
+            f"{BASE_URL}/heart-wisp",
+            json={"wisp_id": test_wisp["wisp_id"]}
+        )
+        assert response.status_code == 200
+    assert get_heart_count(test_wisp["wisp_id"]) == 2
+
+    response = user_3_sess.post(
+        f"{BASE_URL}/unheart-wisp",
+        json={"wisp_id": test_wisp["wisp_id"]}
+    )
+    assert response.status_code == 200
+    assert get_heart_count(test_wisp["wisp_id"]) == 1
+
+    # drifted counts are corrected by the reconciliation task
+    with db.engine.begin() as conn:
+        conn.execute(db.update(Wisp).values(heart_count=5))
+    assert scheduled_tasks.reconcile_heart_counts() == 1
+    assert get_heart_count(test_wisp["wisp_id"]) == 1
+    assert scheduled_tasks.reconcile_heart_counts() == 0
+
 def test_blocked_user_heart(test_wisp, test_wisp_2, user_sess, user_2_sess):
     response = user_2_sess.post(
         f"{BASE_URL}/heart-wisp",
@@ -0,0 +1,90 @@
+"""
+Test suite for MP3 frame parsing used by radio splicing.
+"""
+import os
+import sys
+from io import BytesIO
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app.mp3_frames import *
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo, no padding
+FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x64])
+FRAME_LENGTH = 417
+
+def make_frame(backpointer: int = 0) -> bytes:
+    side_info = bytes([backpointer >> 1, (backpointer & 1) << 7])
+    return (FRAME_HEADER + side_info + 
+        bytes(FRAME_LENGTH - len(FRAME_HEADER) - len(side_info)))
+
+def test_parse_header():
+    header = parse_header(FRAME_HEADER)
+    assert header.version == MPEG1
+    assert header.bitrate == 128
+    assert header.sample_rate == 44100
+    assert header.channels == 2
+    assert header.samples == 1152
+    assert header.length == FRAME_LENGTH
+
+def test_parse_bad_header():
+    assert parse_header(b"TAG\x00") is None
+    # Layer II
+    assert parse_header(bytes([0xFF, 0xFD, 0x90, 0x64])) is None
+    # free format bitrate
+    assert parse_header(bytes([0xFF, 0xFB, 0x00, 0x64])) is None
+
+def test_main_data_begin():
+    header = parse_header(FRAME_HEADER)
+    assert main_data_begin(make_frame(0), header) == 0
+    assert main_data_begin(make_frame(300), header) == 300
+
+def test_iter_frames():
+    id3_tag = b"ID3\x03\x00\x00\x00\x00\x00\x04" + b"abcd"
+    info_frame = bytearray(make_frame())
+    info_frame[36:40] = b"Info"
+    data = (id3_tag + bytes(info_frame) + make_frame() + b"junk" +
+        make_frame(12) + make_frame()[:100])
+    frames = list(iter_frames(BytesIO(data)))
+    assert len(frames) == 2
+    assert all(len(frame) == FRAME_LENGTH for _, frame in frames)
+    assert main_data_begin(frames[1][1], frames[1][0]) == 12
+
+def test_is_vbr():
+    id3_tag = b"ID3\x03\x00\x00\x00\x00\x00\x04" + b"abcd"
+    for tag, vbr in ((b"Xing", True), (b"Info", False)):
+        tag_frame = bytearray(make_frame())
+        tag_frame[36:40] = tag
+        assert is_vbr(BytesIO(id3_tag + bytes(tag_frame) + 
+            make_frame())) == vbr
+    assert not is_vbr(BytesIO(make_frame() + make_frame()))
+
+def test_apply_gain():
+    header = parse_header(FRAME_HEADER)
+    frame = bytearray(make_frame(300))
+    # global_gain of each granule and channel: side info starts at
+    # bit 32, granules at bit 20 of it, 59 bits each, gain at bit 21
+    positions = [32 + 20 + index * 59 + 21 for index in range(4)]
+    for position, gain in zip(positions, (170, 160, 0, 255)):
+        write_bits(frame, position, 8, gain)
+    adjusted = apply_gain(bytes(frame), header, 2)
+    assert [read_bits(adjusted, position, 8) 
+        for position in positions] == [172, 162, 2, 255]
+    assert main_data_begin(adjusted, header) == 300
+    assert apply_gain(bytes(frame), header, 0) == bytes(frame)
+
+def test_frame_splitter():
+    data = make_frame() + b"junk" + make_frame(12) + make_frame()
+    splitter = FrameSplitter()
+    frames = []
+    for offset in range(0, len(data), 100):
+        frames += splitter.feed(data[offset:offset + 100])
+    assert len(frames) == 3
+    assert all(len(frame) == FRAME_LENGTH for _, frame in frames)
+    assert main_data_begin(frames[1][1], frames[1][0]) == 12
+    assert splitter.feed(make_frame()[:100]) == []
+    splitter.reset()
+    assert splitter.feed(make_frame()[100:]) == []
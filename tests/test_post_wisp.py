@@ -8,10 +8,12 @@ import sys
 sys.path.append(os.getcwd())
 
 import pytest
+import socket
 import time
 
 from app import constants as appconstants
-from app import appconfig
+from app import appconfig, eventserver
+from app.event_server import encode_event
 from app.models import User
 
 from tests.constants import *
@@ -29,6 +31,28 @@ def test_post_wisp(user_sess):
     )
     assert response.status_code == 201
 
+def test_new_wisp_event(user_sess):
+    response = user_sess.post(
+        f"{BASE_URL}/post-wisp",
+        json=TEST_WISP
+    )
+    assert response.status_code == 201
+    response = user_sess.get(f"{BASE_URL}/get-wisps")
+    cursor = response.json()["wisps"][0]["cursor"]
+
+    # the newest Wisp is replayed to listeners as they connect
+    sock = socket.create_connection(
+        (appconfig["EVENT_SERVER_HOST"], eventserver.port), 5)
+    sock.sendall((f"GET {appconfig['EVENT_SERVER_PATH']}" +
+        "?channels=wisps HTTP/1.1\r\n\r\n").encode())
+    event = encode_event("new", {"cursor": cursor})
+    received = b""
+    while event not in received:
+        chunk = sock.recv(4096)
+        assert chunk
+        received += chunk
+    sock.close()
+
 def test_invalid_wisps(user_sess):
     response = user_sess.post(
         f"{BASE_URL}/post-wisp",
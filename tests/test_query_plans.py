@@ -0,0 +1,129 @@
+"""
+Test suite for the query plans of hot Wisp and Song queries. Fails if
+    SQLite would scan a whole table, or sort rows itself, instead of
+    using an index.
+"""
+import os
+import sys
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import datetime as dt
+import uuid
+import pytest
+from flask_login import AnonymousUserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import constants as appconstants
+from app import appconfig, db, scheduled_tasks, blockcache
+from app.core import remove_excess_wisps, promote_or_remove_wisps
+from app.models import *
+from app.views.get_wisps import get_wisps_for_user
+
+def query_plans(run) -> list:
+    """
+    Helper method, run some queries and get the plan SQLite used for
+        each of them.
+    :param run: function running the queries
+    :return: list of query plans, each a list of plan detail strings
+        like "SEARCH wisp USING INDEX ..."
+    """
+    statements = []
+    def capture(conn, cursor, statement, parameters, context,
+                executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert statements
+    with db.engine.connect() as conn:
+        return [[
+            # older SQLite versions say "SEARCH TABLE wisp ..."
+            row[-1].replace(" TABLE ", " ")
+            for row in conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters)
+        ] for statement, parameters in statements]
+
+def assert_indexed(plans: list, table: str):
+    """
+    Helper method, check that every query only reads a table through
+        an index, and never sorts with a temporary B-tree.
+    :param plans: list of query plans from "query_plans"
+    :param table: name of the table
+    """
+    for plan in plans:
+        assert any(detail.split()[1:2] == [table] for detail in plan)
+        for detail in plan:
+            assert "TEMP B-TREE" not in detail, plan
+            if detail.split()[1:2] == [table]:
+                assert detail.startswith("SEARCH"), plan
+
+def test_feed_plan(db_resource):
+    user = AnonymousUserMixin()
+    created_time = dt.datetime.now(dt.UTC)
+    assert_indexed(query_plans(lambda: get_wisps_for_user(
+        user, status=appconstants.LIVE_WISP
+    ).all()), "wisp")
+    assert_indexed(query_plans(lambda: get_wisps_for_user(
+        user, complex_filters=[db.tuple_(
+            Wisp.created_time, Wisp.wisp_id
+        ) < (created_time, "f" * 32)],
+        status=appconstants.LIVE_WISP
+    ).all()), "wisp")
+
+def test_blocked_feed_plan(db_resource, test_user, test_user_2):
+    # anti-join against the block table
+    session = Session.object_session(test_user)
+    test_user.blocked_users.append(session.merge(test_user_2))
+    session.commit()
+    blockcache.invalidate(test_user.user_id)
+    plans = query_plans(lambda: get_wisps_for_user(
+        test_user, status=appconstants.LIVE_WISP
+    ).all())
+    assert_indexed(plans[-1:], "wisp")
+    assert_indexed(plans[-1:], "block_association_table")
+
+def test_remembrances_plan(db_resource):
+    assert_indexed(query_plans(lambda: get_wisps_for_user(
+        AnonymousUserMixin(), limit=appconfig["MAX_REMEMBRANCES"],
+        status=appconstants.REMEMBRANCE_WISP
+    ).all()), "wisp")
+
+def test_promote_or_remove_wisps_plan(db_resource, test_user):
+    session = Session.object_session(test_user)
+    wisp_ids = [uuid.uuid1().hex for _ in range(3)]
+    for wisp_id in wisp_ids:
+        session.add(Wisp(wisp_id=wisp_id, user=test_user, text=wisp_id))
+    session.commit()
+    assert_indexed(query_plans(
+        lambda: promote_or_remove_wisps(wisp_ids)), "wisp")
+    db.session.rollback()
+
+def test_purge_wisps_plan(db_resource):
+    assert_indexed(query_plans(scheduled_tasks.purge_wisps), "wisp")
+
+def test_purge_songs_plan(db_resource):
+    assert_indexed(query_plans(scheduled_tasks.purge_songs), "song")
+
+def test_remove_excess_wisps_plan(db_resource):
+    assert_indexed(query_plans(remove_excess_wisps), "wisp")
+
+def test_song_queue_plan(db_resource):
+    # the queries of "get_next_song_file" and "iterate_playing_song"
+    assert_indexed(query_plans(lambda: db.session.scalars(
+        db.select(Song).filter_by(
+            status=appconstants.QUEUED_SONG
+        ).order_by(
+            Song.status_updated_time.asc()
+        )
+    ).first()), "song")
+    assert_indexed(query_plans(lambda: db.session.scalars(
+        db.select(Song).filter_by(
+            status=appconstants.PLAYING_SONG
+        )
+    ).all()), "song")
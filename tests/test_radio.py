@@ -7,10 +7,13 @@ import time
 
 sys.path.append(os.getcwd())
 
+import datetime as dt
 import pytest
+import uuid
+from sqlalchemy.orm import Session
 
 from app import constants as appconstants
-from app import appconfig
+from app import appconfig, db, scheduled_tasks
 from app.models import *
 
 from tests.constants import *
@@ -97,3 +100,30 @@ def test_skip_song(user_sess, user_2_sess, user_3_sess):
         time.sleep(1)
     # user song not queued
     assert False
+
+def test_purge_songs(db_resource, test_user, test_user_2):
+    session = Session.object_session(test_user)
+    now = dt.datetime.now(dt.UTC)
+    expired, recent = (Song(
+        song_id=uuid.uuid1().hex,
+        user=test_user,
+        uri=SONG_1,
+        status=appconstants.PLAYED_SONG,
+        status_updated_time=updated_time,
+        heart_count=1
+    ) for updated_time in (
+        now - appconfig["SONG_LIFESPAN"] - dt.timedelta(hours=1), now))
+    expired.hearted_users.append(session.merge(test_user_2))
+    test_user.heartscore = 1
+    session.add_all([expired, recent])
+    session.commit()
+    expired_id, recent_id = expired.song_id, recent.song_id
+
+    report = scheduled_tasks.purge_songs()
+    assert report["rows"] == 1 and report["chunks"] == 1
+    db.session.remove()
+    assert db.session.get(Song, expired_id) is None
+    assert db.session.get(Song, recent_id) is not None
+    assert db.session.get(User, test_user.user_id).heartscore == 0
+    assert not db.session.execute(
+        db.select(song_heart_association_table)).all()
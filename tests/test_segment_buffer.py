@@ -0,0 +1,105 @@
+"""
+Test suite for the radio's in-memory segment buffer.
+"""
+import os
+import sys
+import queue
+import threading
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app.segment_buffer import SegmentBuffer, SegmentInterrupted
+
+def test_coalesce_chunks():
+    buffer = SegmentBuffer(1024, 8)
+    buffer.begin_segment()
+    for byte in b"abcdefghij":
+        buffer.put(bytes([byte]))
+    assert buffer.get_nowait() == (1, b"abcdefgh")
+    assert buffer.get_nowait() == (1, b"ij")
+    with pytest.raises(queue.Empty):
+        buffer.get_nowait()
+
+def test_backpressure():
+    buffer = SegmentBuffer(4, 4)
+    buffer.begin_segment()
+    buffer.put(b"abcd")
+    writer = threading.Thread(target=buffer.put, args=(b"efgh",))
+    writer.start()
+    writer.join(0.2)
+    # writer blocks until the reader makes room
+    assert writer.is_alive()
+    assert buffer.get_nowait() == (1, b"abcd")
+    writer.join(1)
+    assert not writer.is_alive()
+    assert buffer.get_nowait() == (1, b"efgh")
+
+def test_interrupt():
+    skip_signal = threading.Event()
+    buffer = SegmentBuffer(4, 4, [skip_signal])
+    buffer.begin_segment()
+    buffer.put(b"abcd")
+    errors = []
+    def write():
+        try:
+            buffer.put(b"efgh")
+        except SegmentInterrupted as err:
+            errors.append(err)
+    writer = threading.Thread(target=write)
+    writer.start()
+    skip_signal.set()
+    buffer.wake()
+    writer.join(1)
+    assert not writer.is_alive() and len(errors) == 1
+
+def test_skip():
+    buffer = SegmentBuffer(1024, 4)
+    first_segment = buffer.begin_segment()
+    buffer.put(b"abcd")
+    buffer.put(b"efgh")
+    segment_id, _ = buffer.get_nowait()
+    buffer.skip()
+    assert buffer.empty()
+    assert buffer.is_skipped(segment_id)
+    second_segment = buffer.begin_segment()
+    buffer.put(b"ijkl")
+    assert buffer.get_nowait() == (second_segment, b"ijkl")
+    assert not buffer.is_skipped(second_segment)
+
+def test_blocking_get():
+    buffer = SegmentBuffer(1024, 4)
+    buffer.begin_segment()
+    with pytest.raises(queue.Empty):
+        buffer.get(0.1)
+    writer = threading.Timer(0.1, buffer.put, args=(b"abcd",))
+    writer.start()
+    assert buffer.get(1) == (1, b"abcd")
+
+def test_get_wake():
+    kill_signal = threading.Event()
+    buffer = SegmentBuffer(1024, 4, [kill_signal])
+    def kill():
+        kill_signal.set()
+        buffer.wake()
+    threading.Timer(0.1, kill).start()
+    with pytest.raises(queue.Empty):
+        # returns well before the timeout once woken
+        buffer.get(10, [kill_signal])
+
+def test_dropping():
+    buffer = SegmentBuffer(4, 4)
+    buffer.begin_segment()
+    buffer.put(b"abcd")
+    writer = threading.Thread(target=buffer.put, args=(b"efgh",))
+    writer.start()
+    writer.join(0.1)
+    assert writer.is_alive()
+    buffer.set_dropping(True)
+    writer.join(1)
+    assert not writer.is_alive()
+    buffer.put(b"ijkl")
+    assert buffer.stats() == {"buffered_bytes": 4, "dropped_bytes": 8}
+    assert buffer.get_nowait() == (1, b"ijkl")
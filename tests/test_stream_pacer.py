@@ -0,0 +1,68 @@
+"""
+Test suite for the radio's real-time stream pacing.
+"""
+import os
+import sys
+
+# allow for relative imports from "app"
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app.mp3_frames import parse_header
+from app.stream_pacer import StreamPacer
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 1152 samples, ~26 ms
+HEADER = parse_header(bytes([0xFF, 0xFB, 0x90, 0x64]))
+FRAME_SECONDS = 1152 / 44100
+
+class FakeClock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_lead():
+    clock = FakeClock()
+    pacer = StreamPacer(0.1, clock=clock)
+    assert pacer.delay() == 0
+    sent = 0
+    while pacer.delay() <= 0:
+        pacer.advance(HEADER)
+        sent += 1
+    # frames covering the lead are due at once, then one per frame
+    assert sent == 4
+    assert pacer.delay() == pytest.approx(4 * FRAME_SECONDS - 0.1)
+    clock.now += pacer.delay()
+    assert pacer.delay() <= 0
+    pacer.advance(HEADER)
+    assert pacer.delay() == pytest.approx(FRAME_SECONDS)
+    assert pacer.underruns == pacer.overruns == 0
+
+def test_underrun_and_overrun():
+    clock = FakeClock()
+    pacer = StreamPacer(0.0, clock=clock)
+    pacer.advance(HEADER)
+    clock.now += 1.0
+    pacer.advance(HEADER, starved=True)
+    assert pacer.underruns == 1
+    # clock restarted at the late frame
+    assert pacer.delay() == pytest.approx(FRAME_SECONDS)
+    clock.now += 1.0
+    pacer.advance(HEADER)
+    assert pacer.overruns == 1
+    assert pacer.stats()["frames_sent"] == 3
+
+def test_jitter():
+    clock = FakeClock()
+    pacer = StreamPacer(0.0, clock=clock)
+    start = clock.now
+    pacer.advance(HEADER)
+    # frames alternately 5 ms early and 5 ms late
+    for frame in range(1, 200):
+        clock.now = (start + frame * FRAME_SECONDS +
+            (0.005 if frame % 2 else -0.005))
+        pacer.advance(HEADER)
+    assert pacer.stats()["jitter_ms"] == pytest.approx(5, rel=1e-3)
+    assert pacer.underruns == pacer.overruns == 0